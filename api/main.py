@@ -1,16 +1,25 @@
 import os
+import json
+import asyncio
 from typing import List, Optional, Any, Dict
 from fastapi import FastAPI, UploadFile, File, Form, HTTPException, Request
-from fastapi.responses import JSONResponse, HTMLResponse
+from fastapi.responses import JSONResponse, HTMLResponse, PlainTextResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
+from starlette.concurrency import run_in_threadpool
 from pathlib import Path
 from src.data_ingestion.data_ingestion import DocHandler,DocumentComparator,ChatIngestor
 from src.document_analyzer.document_analysis import DocumentAnalyzer
 from src.document_compare.document_comparator import DocumentComparatorLLM
 from src.document_chat.retreival import ConversationalRAG
 from utils.documents_ops import FastAPIFileAdaptor,read_pdf_via_handler
+from utils.model_loader import get_model_registry
+from utils.parsing_service import get_parsing_service
+from utils.job_queue import get_job_queue, JobLimitExceeded
+from utils.chat_memory import get_chat_session_store
+from utils.result_cache import RESULT_CACHE_ENABLED, get_result_cache, result_key
+from utils.metrics import CONTENT_TYPE, RequestContextMiddleware, render_metrics
 from logger.custom_logger import CustomLogger
 from exception.custom_exception import DocumentPortalException
 import shutil
@@ -21,6 +30,12 @@ FAISS_BASE = os.getenv("FAISS_BASE", "faiss_index")
 UPLOAD_BASE = os.getenv("UPLOAD_BASE", "data")
 FAISS_INDEX_NAME = os.getenv("FAISS_INDEX_NAME", "index")
 
+# per-endpoint caps on concurrently running requests; extra requests wait their turn
+ANALYZE_LIMIT = asyncio.Semaphore(int(os.getenv("ANALYZE_CONCURRENCY", "8")))
+COMPARE_LIMIT = asyncio.Semaphore(int(os.getenv("COMPARE_CONCURRENCY", "8")))
+INDEX_LIMIT = asyncio.Semaphore(int(os.getenv("INDEX_CONCURRENCY", "8")))
+QUERY_LIMIT = asyncio.Semaphore(int(os.getenv("QUERY_CONCURRENCY", "32")))
+
 
 app = FastAPI(title = "Document Portal",version= "0.1")
 
@@ -30,12 +45,47 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Request-ID"],
 )
+# request id for every log line of a request, plus per-request latency and stage timings
+app.add_middleware(RequestContextMiddleware)
 
 app.mount("/static", StaticFiles(directory="./static"), name="static")
 templates = Jinja2Templates(directory="./templates")
 
 
+@app.on_event("startup")
+async def warmup_models():
+    "build shared model clients before the first request arrives"
+    try:
+        await run_in_threadpool(get_model_registry().warmup)
+    except Exception as e:
+        log.error("model warmup failed", error=str(e))
+
+
+def run_index_job(payload: Dict[str, Any], report) -> Dict[str, Any]:
+    "background worker for /chat/index: parse, split, embed and save already-uploaded files"
+    ci = ChatIngestor(temp_base=UPLOAD_BASE,faiss_base=FAISS_BASE,use_session_dirs=payload["use_session_dirs"],
+                      session_id=payload["session_id"])
+    ci.index_paths([Path(p) for p in payload["paths"]],chunk_size=payload["chunk_size"],
+                   chunk_overlap=payload["chunk_overlap"],progress=report)
+    return {"session_id": ci.session_id,"k":payload["k"],"use_session_dirs":payload["use_session_dirs"]}
+
+
+@app.on_event("startup")
+async def start_job_queue():
+    queue = get_job_queue()
+    queue.register("chat_index", run_index_job)
+    queue.start()
+
+
+@app.on_event("shutdown")
+async def stop_background_services():
+    get_job_queue().stop(wait=False)
+    get_parsing_service().shutdown()
+    await get_model_registry().aclose()
+
+
 @app.get("/", response_class=HTMLResponse)
 async def serve_ui(request: Request):
     log.info("Serving UI homepage.")
@@ -45,58 +95,142 @@ async def serve_ui(request: Request):
 
 @app.get("/health")
 async def health_check() -> Dict[str,str]:
-    lof.info("Health check passed.")
+    log.info("Health check passed.")
     return {"status": "ok","service":"document portal"}
 
+@app.get("/metrics")
+async def metrics() -> PlainTextResponse:
+    "stage latency histograms, LLM token and cache counters of this worker in the Prometheus text format"
+    return PlainTextResponse(render_metrics(), media_type=CONTENT_TYPE)
+
 @app.post("/analyze")
-async def analyze_document(file: UploadFile = (...)) -> Any:
+async def analyze_document(file: UploadFile = File(...)) -> Any:
     try:
         log.info(f"received file for analysis :{file.filename}")
-        dh = DocHandler()
-        saved_path = dh.save_files(FastAPIFileAdaptor(file))
-        text = read_pdf_via_handler(dh,saved_path)
+        upload = FastAPIFileAdaptor(file)
         analyzer = DocumentAnalyzer()
-        result = analyzer.analyze_document(text)
-        log.info("document analysis completed", result=result)
-        return JSONResponse(content=result)
-    
+        key = None
+        if RESULT_CACHE_ENABLED:
+            # same bytes + prompt + model -> same analysis; hits skip parsing and the LLM entirely
+            key = result_key("analyze", [await run_in_threadpool(upload.sha256)], analyzer.cache_identity())
+            cached = await run_in_threadpool(get_result_cache().get, key)
+            if cached is not None:
+                log.info("document analysis served from cache", filename=file.filename)
+                return JSONResponse(content={**cached, "cache": "hit"})
+        async with ANALYZE_LIMIT:
+            dh = DocHandler()
+            saved_path = await run_in_threadpool(dh.save_files, upload)
+            text = await run_in_threadpool(read_pdf_via_handler, dh, saved_path)
+            result = await analyzer.aanalyze_document(text)
+            log.info("document analysis completed", keys=list(result), title=result.get("Title"))
+        if key is not None:
+            await run_in_threadpool(get_result_cache().put, key, "analyze", result)
+        return JSONResponse(content={**result, "cache": "miss" if key else "disabled"})
     except HTTPException:
         raise
-    except HTTPException as e:
-        raise HTTPException(status_code=500, detail=str(e))
+    except Exception as e:
+        log.exception("Document analysis failed")
+        raise HTTPException(status_code=500, detail=f"Analysis failed: {e}")
     
 @app.post("/compare")
 async def compare_documents(reference: UploadFile = File(...),actual: UploadFile=File(...)) -> Any:
     try:
         log.info("received files for comparison", reference=reference.filename, actual=actual.filename)
-        dc = DocumentComparator()
-        ref_path,actual_path =dc.save_uploaded_files(FastAPIFileAdaptor(reference),FastAPIFileAdaptor(actual))
-        _ =ref_path,actual_path
-        combined_text = dc.combine_files()
+        reference_upload, actual_upload = FastAPIFileAdaptor(reference), FastAPIFileAdaptor(actual)
         comp = DocumentComparatorLLM()
-        df  = comp.compare_documents(combined_text)
-        log.info("document comparison completed", result=df)
-        return {"rows":df.to_dict(orient="records"),"session_id": dc.session_id}
+        key = None
+        if RESULT_CACHE_ENABLED:
+            hashes = [await run_in_threadpool(reference_upload.sha256), await run_in_threadpool(actual_upload.sha256)]
+            key = result_key("compare", hashes, comp.cache_identity())
+            cached = await run_in_threadpool(get_result_cache().get, key)
+            if cached is not None:
+                # only the rows are shared between requests; the uploads still get this request's own session
+                dc = DocumentComparator()
+                await run_in_threadpool(dc.save_uploaded_files,reference_upload,actual_upload)
+                log.info("document comparison served from cache", rows=len(cached["rows"]), session_id=dc.session_id)
+                return {"rows": cached["rows"], "session_id": dc.session_id, "cache": "hit"}
+        async with COMPARE_LIMIT:
+            dc = DocumentComparator()
+            reference_path, actual_path = await run_in_threadpool(dc.save_uploaded_files,reference_upload,actual_upload)
+            reference_pages = await run_in_threadpool(dc.read_pages, reference_path)
+            actual_pages = await run_in_threadpool(dc.read_pages, actual_path)
+            # identical pages are resolved locally; only changed page pairs reach the LLM
+            df  = await comp.acompare_pages(reference_pages, actual_pages)
+            log.info("document comparison completed", rows=len(df))
+        rows = df.to_dict(orient="records")
+        if key is not None:
+            await run_in_threadpool(get_result_cache().put, key, "compare", {"rows": rows})
+        return {"rows": rows, "session_id": dc.session_id, "cache": "miss" if key else "disabled"}
     except HTTPException:
         raise
-    except HTTPException as e:
-        raise HTTPException(status_code=500, detail=str(e))
+    except Exception as e:
+        log.exception("Document comparison failed")
+        raise HTTPException(status_code=500, detail=f"Comparison failed: {e}")
     
 @app.post("/chat/index")
 async def chat_build_index(files: List[UploadFile] = File(...), session_id: Optional[str] = Form(None),use_session_dirs: bool = Form(True),
                         chunk_size: int = Form(1000),chunk_overlap: int = Form(200),k: int = Form(3)) -> Any:
     try:
-        log.info("received files for indexing", files=[file.filename for file in files])
-        wrapped = [FastAPIFileAdaptor(f) for f in files]
-        ci = ChatIngestor(temp_base= UPLOAD_BASE,faiss_base=FAISS_BASE,use_session_dirs=use_session_dirs,
-                        session_id=session_id or None)
-        ci.build_retriever(wrapped,chunk_size=chunk_size,chunk_overlap=chunk_overlap,k=k)
-        log.info("document indexing completed", session_id=ci.session_id)
-        return {"session_id": ci.session_id,"k":k,"use_session_dirs":use_session_dirs}
+        async with INDEX_LIMIT:
+            log.info("received files for indexing", files=[file.filename for file in files])
+            wrapped = [FastAPIFileAdaptor(f) for f in files]
+            ci = await run_in_threadpool(ChatIngestor,temp_base= UPLOAD_BASE,faiss_base=FAISS_BASE,
+                                         use_session_dirs=use_session_dirs,session_id=session_id or None)
+            paths = await run_in_threadpool(ci.save_files,wrapped)
+            if not paths:
+                raise HTTPException(status_code=400, detail="No supported files uploaded")
+            # parse, split, embed and FAISS save run as a background job; jobs on the shared index serialize
+            payload = {"paths":[str(p) for p in paths],"session_id":ci.session_id,"use_session_dirs":use_session_dirs,
+                       "chunk_size":chunk_size,"chunk_overlap":chunk_overlap,"k":k}
+            job_key = ci.session_id if use_session_dirs else "__shared__"
+            job_id = await run_in_threadpool(get_job_queue().submit,"chat_index",job_key,payload)
+            log.info("document indexing queued", session_id=ci.session_id, job_id=job_id)
+            return {"job_id": job_id,"status": "queued","status_url": f"/chat/index/{job_id}",
+                    "session_id": ci.session_id,"k":k,"use_session_dirs":use_session_dirs}
+    except JobLimitExceeded as e:
+        raise HTTPException(status_code=429, detail=str(e))
     except HTTPException:
         raise
-    except HTTPException as e:
-        raise HTTPException(status_code=500, detail=str(e))
+    except Exception as e:
+        log.exception("Document indexing failed")
+        raise HTTPException(status_code=500, detail=f"Indexing failed: {e}")
+
+@app.get("/chat/index/{job_id}")
+async def chat_index_status(job_id: str) -> Any:
+    job = await run_in_threadpool(get_job_queue().get, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Indexing job not found: {job_id}")
+    return job
+
+@app.delete("/chat/session/{session_id}")
+async def chat_session_clear(session_id: str) -> Any:
+    "forget the server-side conversation history of a session (its index is kept)"
+    await run_in_threadpool(get_chat_session_store().clear, session_id)
+    return {"session_id": session_id, "cleared": True}
+
+def sse_event(event: str, data: Dict[str, Any]) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+
+async def stream_chat_query(question: str, session_id: Optional[str], index_dir: str, k: int):
+    "Server-Sent Events for /chat/query?stream=true: retrieval, token..., done (or error)"
+    async with QUERY_LIMIT:
+        try:
+            rag = ConversationalRAG(session_id=session_id)
+            await run_in_threadpool(rag.load_retriever_from_faiss, index_dir, k=k, index_name=FAISS_INDEX_NAME)
+            sessions = get_chat_session_store()
+            chat_history = await run_in_threadpool(sessions.history, session_id) if session_id else []
+            async for item in rag.astream(question, chat_history=chat_history):
+                event = item.pop("event")
+                if event == "retrieval":
+                    item.update(session_id=session_id, k=k, history_messages=len(chat_history))
+                if event == "done" and session_id:
+                    await sessions.aappend(session_id, question, item["answer"], wait=False)
+                yield sse_event(event, item)
+        except Exception as e:
+            # headers are already sent, so failures are reported in-band
+            log.exception("Chat query stream failed")
+            yield sse_event("error", {"detail": f"Query failed: {e}"})
 
 @app.post("/chat/query")
 async def chat_query(
@@ -104,6 +238,7 @@ async def chat_query(
     session_id: Optional[str] = Form(None),
     use_session_dirs: bool = Form(True),
     k: int = Form(5),
+    stream: bool = Form(False),
 ) -> Any:
     try:
         log.info(f"Received chat query: '{question}' | session: {session_id}")
@@ -113,20 +248,36 @@ async def chat_query(
         index_dir = os.path.join(FAISS_BASE, session_id) if use_session_dirs else FAISS_BASE  # type: ignore
         if not os.path.isdir(index_dir):
             raise HTTPException(status_code=404, detail=f"FAISS index not found at: {index_dir}")
+        if not os.path.exists(os.path.join(index_dir, f"{FAISS_INDEX_NAME}.faiss")):
+            # /chat/index creates the directory up front; the index file appears when its job finishes
+            raise HTTPException(status_code=409, detail=f"FAISS index at {index_dir} is still being built")
+
+        if stream:
+            return StreamingResponse(stream_chat_query(question, session_id, index_dir, k),
+                                     media_type="text/event-stream",
+                                     headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
 
-        rag = ConversationalRAG(session_id=session_id)
-        rag.load_retriever_from_faiss(index_dir, k=k, index_name=FAISS_INDEX_NAME)  
-        response = rag.invoke(question, chat_history=[])
+        async with QUERY_LIMIT:
+            rag = ConversationalRAG(session_id=session_id)
+            await run_in_threadpool(rag.load_retriever_from_faiss, index_dir, k=k, index_name=FAISS_INDEX_NAME)
+            # history lives server-side per session_id; without one each query stands alone
+            sessions = get_chat_session_store()
+            chat_history = await run_in_threadpool(sessions.history, session_id) if session_id else []
+            response = await rag.ainvoke(question, chat_history=chat_history)
+            if session_id:
+                await sessions.aappend(session_id, question, response, wait=False)
         log.info("Chat query handled successfully.")
 
         return {
             "answer": response,
             "session_id": session_id,
             "k": k,
-            "engine": "LCEL-RAG"
+            "engine": "LCEL-RAG",
+            "timings": rag.last_timings,
+            "history_messages": len(chat_history),
         }
     except HTTPException:
         raise
     except Exception as e:
         log.exception("Chat query failed")
-        raise HTTPException(status_code=500, detail=f"Query failed: {e}")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"Query failed: {e}")
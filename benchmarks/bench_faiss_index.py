@@ -0,0 +1,88 @@
+"""Recall versus latency of the configurable FAISS index types against exact (flat) search.
+
+Generates clustered random vectors (closer to real embeddings than uniform
+noise), builds each index type through ``utils.faiss_store.build_index`` and
+reports build time, per-query latency and recall@k relative to IndexFlatL2.
+
+    python -m benchmarks.bench_faiss_index --vectors 100000 --dim 384 --k 10
+"""
+from __future__ import annotations
+import argparse
+import json
+import time
+from pathlib import Path
+from typing import Dict, List
+
+import numpy as np
+
+from utils.faiss_store import INDEX_TYPES, build_index, index_settings
+
+
+def clustered_vectors(n: int, dim: int, clusters: int, seed: int) -> np.ndarray:
+    rnd = np.random.default_rng(seed)
+    centers = rnd.normal(size=(clusters, dim)).astype(np.float32)
+    labels = rnd.integers(0, clusters, size=n)
+    return (centers[labels] + 0.3 * rnd.normal(size=(n, dim))).astype(np.float32)
+
+
+def recall_at_k(truth: np.ndarray, found: np.ndarray) -> float:
+    k = truth.shape[1]
+    return float(np.mean([len(set(t) & set(f)) / k for t, f in zip(truth, found)]))
+
+
+def run(args) -> Dict:
+    data = clustered_vectors(args.vectors, args.dim, args.clusters, args.seed)
+    queries = clustered_vectors(args.queries, args.dim, args.clusters, args.seed + 1)
+    config = index_settings({"nlist": args.nlist, "nprobe": args.nprobe, "pq_m": args.pq_m,
+                             "hnsw_m": args.hnsw_m, "ef_search": args.ef_search})
+
+    results: List[Dict] = []
+    truth = None
+    for index_type in args.types:
+        started = time.perf_counter()
+        index = build_index(data, index_type, config)
+        build_s = time.perf_counter() - started
+
+        started = time.perf_counter()
+        for q in queries:
+            index.search(q[None, :], args.k)
+        per_query = (time.perf_counter() - started) / len(queries)
+        _, found = index.search(queries, args.k)
+        if index_type == "flat":
+            truth = found
+        results.append({
+            "type": index_type,
+            "build_s": round(build_s, 3),
+            "query_ms": round(per_query * 1000, 3),
+            "recall_at_k": round(recall_at_k(truth, found), 4) if truth is not None else None,
+        })
+    return {"vectors": args.vectors, "dim": args.dim, "k": args.k, "config": config, "results": results}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--vectors", type=int, default=50_000)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--clusters", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--nlist", type=int, default=0)
+    parser.add_argument("--nprobe", type=int, default=16)
+    parser.add_argument("--pq-m", type=int, default=16)
+    parser.add_argument("--hnsw-m", type=int, default=32)
+    parser.add_argument("--ef-search", type=int, default=64)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--types", nargs="+", default=list(INDEX_TYPES), choices=INDEX_TYPES,
+                        help="flat is always measured first as the ground truth")
+    parser.add_argument("--out", type=str, default=None, help="write JSON results to this file")
+    args = parser.parse_args()
+    args.types = ["flat"] + [t for t in args.types if t != "flat"]
+
+    results = run(args)
+    print(json.dumps(results, indent=2))
+    if args.out:
+        Path(args.out).write_text(json.dumps(results, indent=2), encoding="utf-8")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""Recall and latency of dense, BM25 and hybrid (RRF) retrieval on a synthetic corpus.
+
+Each chunk carries a clause number and a SKU, boilerplate from a small shared
+vocabulary and Zipf-distributed topical words, the shape that makes
+exact-term lookups hard for dense retrieval. Two query sets are measured
+against the chunk that generated them:
+
+* exact: "clause 12.3 obligations" / "SKU-000-0042 delivery"
+* topical: a run of words lifted from the chunk's prose
+
+    python -m benchmarks.bench_hybrid_retrieval --chunks 5000 --queries 300
+"""
+from __future__ import annotations
+import argparse
+import json
+import random
+import statistics
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Tuple
+
+from langchain_community.vectorstores import FAISS
+
+from benchmarks.corpus import make_paragraphs
+from benchmarks.stubs import HashingEmbeddings
+from utils.faiss_store import SegmentedFaissStore, load_faiss_index
+from utils.hybrid_retriever import HybridRetriever
+
+
+def make_vocabulary(size: int, seed: int) -> List[str]:
+    rnd = random.Random(seed)
+    syllables = ["ka", "lo", "mi", "ter", "san", "vo", "ri", "den", "pa", "lu", "qua", "bex", "nor", "til"]
+    return list(dict.fromkeys("".join(rnd.choice(syllables) for _ in range(rnd.randint(2, 4))) for _ in range(size)))
+
+
+def make_corpus(chunks: int, seed: int, vocab_size: int = 5000, words: int = 80) -> List[str]:
+    "boilerplate from the shared contract vocabulary plus Zipf-distributed topical words"
+    rnd = random.Random(seed)
+    vocab = make_vocabulary(vocab_size, seed)
+    weights = [1.0 / (r + 1) for r in range(len(vocab))]
+    corpus = []
+    for i in range(chunks):
+        topical = " ".join(rnd.choices(vocab, weights, k=words))
+        corpus.append(f"Clause {i // 10}.{i % 10} reference SKU-{seed:03d}-{i:04d}. "
+                      f"{make_paragraphs(seed * 7919 + i, 1, words=20)[0]} {topical}.")
+    return corpus
+
+
+def make_queries(corpus: List[str], n: int, seed: int) -> List[Tuple[str, str, int]]:
+    rnd = random.Random(seed)
+    queries = []
+    for q in range(n):
+        i = rnd.randrange(len(corpus))
+        if q % 2 == 0:
+            term = f"clause {i // 10}.{i % 10}" if q % 4 == 0 else corpus[i].split()[3].rstrip(".")
+            queries.append(("exact", f"{term} {rnd.choice(['obligations', 'delivery', 'terms'])}", i))
+        else:
+            words = corpus[i].split()[25:]
+            start = rnd.randrange(max(1, len(words) - 12))
+            queries.append(("topical", " ".join(words[start:start + 12]), i))
+    return queries
+
+
+def evaluate(name: str, search: Callable[[str], List[int]], queries, k: int) -> Dict:
+    latencies, hits = [], {"exact": [], "topical": []}
+    for kind, text, target in queries:
+        started = time.perf_counter()
+        found = search(text)[:k]
+        latencies.append(time.perf_counter() - started)
+        hits[kind].append(target in found)
+    return {
+        "retriever": name,
+        "recall_exact": round(statistics.fmean(hits["exact"]), 4),
+        "recall_topical": round(statistics.fmean(hits["topical"]), 4),
+        "p50_ms": round(statistics.median(latencies) * 1000, 3),
+        "mean_ms": round(statistics.fmean(latencies) * 1000, 3),
+    }
+
+
+def run(args) -> Dict:
+    corpus = make_corpus(args.chunks, args.seed)
+    queries = make_queries(corpus, args.queries, args.seed + 1)
+    embeddings = HashingEmbeddings(size=args.dim)
+    index_dir = tempfile.mkdtemp(prefix="docportal_hybrid_")
+
+    started = time.perf_counter()
+    vs = FAISS.from_texts(corpus, embeddings, metadatas=[{"row": i} for i in range(len(corpus))])
+    SegmentedFaissStore(index_dir).create(vs)
+    build_s = time.perf_counter() - started
+    vs = load_faiss_index(index_dir, embeddings)
+    chunks = vs.docstore.store
+
+    results = []
+    for k in args.k:
+        dense = vs.as_retriever(search_kwargs={"k": k})
+        hybrid = HybridRetriever.from_vectorstore(vs, k=k)
+        results += [
+            {"k": k, **evaluate("dense", lambda q: [d.metadata["row"] for d in dense.invoke(q)], queries, k)},
+            {"k": k, **evaluate("bm25", lambda q: [p for p, _ in chunks.search_text(q, k)], queries, k)},
+            {"k": k, **evaluate("hybrid", lambda q: [d.metadata["row"] for d in hybrid.invoke(q)], queries, k)},
+        ]
+    return {"chunks": args.chunks, "queries": args.queries, "dim": args.dim, "build_s": round(build_s, 3),
+            "results": results}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chunks", type=int, default=5000)
+    parser.add_argument("--queries", type=int, default=300)
+    parser.add_argument("--dim", type=int, default=256)
+    parser.add_argument("--k", type=int, nargs="+", default=[1, 3, 5, 10])
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", type=str, default=None, help="write JSON results to this file")
+    args = parser.parse_args()
+
+    results = run(args)
+    print(json.dumps(results, indent=2))
+    if args.out:
+        Path(args.out).write_text(json.dumps(results, indent=2), encoding="utf-8")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+"""Throughput and chunk stability of the layout token splitter vs the recursive character splitter.
+
+Pages are synthetic paragraphs separated by blank lines, the shape the PDF
+parser produces from PyMuPDF blocks. For each splitter it reports:
+
+* mb_per_s: input bytes split per second (best of --repeats)
+* chunks / token stats: chunk count, p50/max tokens per chunk, chunks over the token budget
+* unchanged_after_edit: share of chunks that come out byte-identical after one
+  sentence is inserted into every fifth page, i.e. how much an edit ripples
+  through chunk boundaries (this is what lets dedup and caches keep working)
+
+The recursive splitter is built once per call, as ChatIngestor used it.
+
+    python -m benchmarks.bench_splitter --pages 2000
+"""
+from __future__ import annotations
+import argparse
+import json
+import statistics
+import time
+from pathlib import Path
+from typing import Callable, Dict, List
+
+from langchain.schema import Document
+from langchain.text_splitter import RecursiveCharacterTextSplitter
+
+from benchmarks.corpus import make_paragraphs
+from utils.text_splitter import LayoutTokenSplitter
+from utils.token_counter import count_tokens_batch
+
+
+def make_pages(pages: int, seed: int) -> List[Document]:
+    docs = []
+    for i in range(pages):
+        paragraphs = [f"Section {i + 1}. Terms and conditions"] + make_paragraphs(seed * 100_003 + i, 6, words=45 + i % 40)
+        docs.append(Document(page_content="\n\n".join(paragraphs), metadata={"source": "bench.pdf", "page": i}))
+    return docs
+
+
+def edit_pages(docs: List[Document]) -> List[Document]:
+    "insert one sentence at the start of the second paragraph of every fifth page"
+    edited = []
+    for i, doc in enumerate(docs):
+        text = doc.page_content
+        if i % 5 == 0:
+            head, _, tail = text.partition("\n\n")
+            text = f"{head}\n\nThis clause was amended by the parties. {tail}"
+        edited.append(Document(page_content=text, metadata=dict(doc.metadata)))
+    return edited
+
+
+def recursive_split(chunk_size: int, chunk_overlap: int) -> Callable[[List[Document]], List[Document]]:
+    def split(docs: List[Document]) -> List[Document]:
+        out: List[Document] = []
+        for doc in docs:
+            out.extend(RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+                       .split_documents([doc]))
+        return out
+    return split
+
+
+def measure(split: Callable[[List[Document]], List[Document]], docs: List[Document], edited: List[Document],
+            repeats: int, token_budget: int) -> Dict[str, float]:
+    size_mb = sum(len(d.page_content.encode("utf-8")) for d in docs) / 1e6
+    timings = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        chunks = split(docs)
+        timings.append(time.perf_counter() - started)
+    tokens = count_tokens_batch([c.page_content for c in chunks])
+    before = {c.page_content for c in chunks}
+    after = [c.page_content for c in split(edited)]
+    return {
+        "mb_per_s": round(size_mb / min(timings), 2),
+        "chunks": len(chunks),
+        "p50_tokens": int(statistics.median(tokens)),
+        "max_tokens": max(tokens),
+        "over_budget": sum(1 for t in tokens if t > token_budget),
+        "chunks_after_edit": len(after),
+        "unchanged_after_edit": round(sum(1 for c in after if c in before) / len(after), 4),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, default=2000)
+    parser.add_argument("--chunk-size", type=int, default=1000, help="characters, as the API takes it")
+    parser.add_argument("--chunk-overlap", type=int, default=200)
+    parser.add_argument("--chars-per-token", type=float, default=4)
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", type=str, default=None, help="write JSON results to this file")
+    args = parser.parse_args()
+
+    docs = make_pages(args.pages, args.seed)
+    edited = edit_pages(docs)
+    chunk_tokens = int(args.chunk_size / args.chars_per_token)
+    layout = LayoutTokenSplitter(chunk_tokens, int(args.chunk_overlap / args.chars_per_token))
+    layout.split_documents(docs[:10])  # load the tiktoken encoding outside the timed runs
+
+    results = {
+        "pages": args.pages,
+        "input_mb": round(sum(len(d.page_content.encode("utf-8")) for d in docs) / 1e6, 2),
+        "token_budget": chunk_tokens,
+        "recursive": measure(recursive_split(args.chunk_size, args.chunk_overlap), docs, edited, args.repeats,
+                             chunk_tokens),
+        "layout": measure(layout.split_documents, docs, edited, args.repeats, chunk_tokens),
+    }
+    print(json.dumps(results, indent=2))
+    if args.out:
+        Path(args.out).write_text(json.dumps(results, indent=2), encoding="utf-8")
+
+
+if __name__ == "__main__":
+    main()
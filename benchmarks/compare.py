@@ -0,0 +1,87 @@
+"""Diff two result files written by benchmarks.suite.
+
+Prints one row per scenario metric with the relative change. A change
+beyond --threshold in the bad direction (throughput down, latency or
+memory up) is flagged as a regression and makes the exit status 1, so the
+script can gate CI. Files recorded with different parameters are still
+compared, after a warning listing the differences.
+
+    python -m benchmarks.compare results/base.json results/head.json --threshold 0.1
+"""
+from __future__ import annotations
+import argparse
+import json
+import sys
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+# (label, path into the scenario result, True when higher is better)
+METRICS: Tuple[Tuple[str, Tuple[str, ...], bool], ...] = (
+    ("throughput", ("throughput", "value"), True),
+    ("p50_ms", ("latency_ms", "p50"), False),
+    ("p95_ms", ("latency_ms", "p95"), False),
+    ("peak_rss_mb", ("peak_rss_mb",), False),
+    ("children_peak_rss_mb", ("children_peak_rss_mb",), False),
+)
+
+
+def _lookup(result: Dict[str, Any], path: Tuple[str, ...]) -> Optional[float]:
+    value: Any = result
+    for key in path:
+        if not isinstance(value, dict):
+            return None
+        value = value.get(key)
+    return value if isinstance(value, (int, float)) else None
+
+
+def compare(base: Dict[str, Any], head: Dict[str, Any], threshold: float) -> List[Dict[str, Any]]:
+    "one row per metric present in both files; ``regression`` marks changes beyond threshold in the bad direction"
+    rows = []
+    for scenario in sorted(set(base["scenarios"]) & set(head["scenarios"])):
+        for label, path, higher_is_better in METRICS:
+            old, new = _lookup(base["scenarios"][scenario], path), _lookup(head["scenarios"][scenario], path)
+            if old is None or new is None:
+                continue
+            change = (new - old) / old if old else 0.0
+            worse = -change if higher_is_better else change
+            rows.append({"scenario": scenario, "metric": label, "base": old, "head": new,
+                         "change": round(change, 4), "regression": worse > threshold})
+    return rows
+
+
+def param_differences(base: Dict[str, Any], head: Dict[str, Any]) -> Dict[str, Tuple[Any, Any]]:
+    keys = set(base.get("params", {})) | set(head.get("params", {}))
+    return {k: (base["params"].get(k), head["params"].get(k)) for k in sorted(keys)
+            if base["params"].get(k) != head["params"].get(k)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("base", type=str)
+    parser.add_argument("head", type=str)
+    parser.add_argument("--threshold", type=float, default=0.1, help="relative change that counts as a regression")
+    parser.add_argument("--json", action="store_true", help="print the rows as JSON instead of a table")
+    args = parser.parse_args()
+
+    base = json.loads(Path(args.base).read_text(encoding="utf-8"))
+    head = json.loads(Path(args.head).read_text(encoding="utf-8"))
+    differences = param_differences(base, head)
+    if differences:
+        print(f"warning: runs used different parameters: {differences}", file=sys.stderr)
+    rows = compare(base, head, args.threshold)
+
+    if args.json:
+        print(json.dumps(rows, indent=2))
+    else:
+        commits = [(r.get("environment") or {}).get("commit") or "?" for r in (base, head)]
+        print(f"base {commits[0][:12]}  head {commits[1][:12]}  threshold {args.threshold:.0%}")
+        print(f"{'scenario':<10} {'metric':<22} {'base':>12} {'head':>12} {'change':>9}")
+        for row in rows:
+            flag = "  REGRESSION" if row["regression"] else ""
+            print(f"{row['scenario']:<10} {row['metric']:<22} {row['base']:>12.2f} {row['head']:>12.2f} "
+                  f"{row['change']:>+9.1%}{flag}")
+    sys.exit(1 if any(row["regression"] for row in rows) else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"Synthetic document generators for benchmarks"
+from __future__ import annotations
+import random
+import zipfile
+from pathlib import Path
+from typing import List, Sequence
+from xml.sax.saxutils import escape
+
+import fitz
+
+_VOCAB = (
+    "agreement party clause payment invoice delivery term notice liability warranty policy "
+    "employee customer supplier schedule annex section amendment confidential data service "
+    "report revenue quarter product order shipment region contract renewal audit compliance"
+).split()
+
+
+def make_paragraphs(seed: int, paragraphs: int = 4, words: int = 60) -> List[str]:
+    rnd = random.Random(seed)
+    return [" ".join(rnd.choice(_VOCAB) for _ in range(words)).capitalize() + "." for _ in range(paragraphs)]
+
+
+def _page_texts(pages: int, seed: int, paragraphs_per_page: int) -> List[List[str]]:
+    return [[f"Page {i + 1} reference SKU-{seed:03d}-{i:04d}"] + make_paragraphs(seed * 100_003 + i, paragraphs_per_page)
+            for i in range(pages)]
+
+
+def make_pdf(path, pages: int = 10, seed: int = 0, paragraphs_per_page: int = 4) -> Path:
+    "write a PDF whose page i carries deterministic pseudo-text seeded by (seed, i)"
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    doc = fitz.open()
+    for paragraphs in _page_texts(pages, seed, paragraphs_per_page):
+        page = doc.new_page()
+        page.insert_textbox(fitz.Rect(50, 50, 545, 800), "\n\n".join(paragraphs), fontsize=9)
+    doc.save(str(path))
+    doc.close()
+    return path
+
+
+def make_txt(path, pages: int = 10, seed: int = 0, paragraphs_per_page: int = 4) -> Path:
+    "write a plain-text file with the same page content as make_pdf, pages separated by form feeds"
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text("\n\f\n".join("\n\n".join(page) for page in _page_texts(pages, seed, paragraphs_per_page)),
+                    encoding="utf-8")
+    return path
+
+
+_DOCX_CONTENT_TYPES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+    '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+    '<Default Extension="xml" ContentType="application/xml"/>'
+    '<Override PartName="/word/document.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.wordprocessingml.document.main+xml"/>'
+    '</Types>')
+_DOCX_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+    'Target="word/document.xml"/>'
+    '</Relationships>')
+
+
+def make_docx(path, pages: int = 10, seed: int = 0, paragraphs_per_page: int = 4) -> Path:
+    "write a minimal WordprocessingML package (no python-docx needed) with a page break after each page"
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    body = []
+    for i, page in enumerate(_page_texts(pages, seed, paragraphs_per_page)):
+        body.extend(f"<w:p><w:r><w:t>{escape(text)}</w:t></w:r></w:p>" for text in page)
+        if i < pages - 1:
+            body.append('<w:p><w:r><w:br w:type="page"/></w:r></w:p>')
+    document = ('<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+                '<w:document xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main">'
+                f'<w:body>{"".join(body)}</w:body></w:document>')
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as zf:
+        zf.writestr("[Content_Types].xml", _DOCX_CONTENT_TYPES)
+        zf.writestr("_rels/.rels", _DOCX_RELS)
+        zf.writestr("word/document.xml", document)
+    return path
+
+
+_MAKERS = {"pdf": make_pdf, "docx": make_docx, "txt": make_txt}
+
+
+def make_corpus(directory, files: int = 6, pages: int = 10, kinds: Sequence[str] = ("pdf", "docx", "txt"),
+                seed: int = 0) -> List[Path]:
+    "write ``files`` documents of ``pages`` pages each, cycling through ``kinds``; file i is seeded by seed + i"
+    directory = Path(directory)
+    unknown = set(kinds) - set(_MAKERS)
+    if unknown:
+        raise ValueError(f"unknown document kinds: {sorted(unknown)}")
+    return [_MAKERS[kinds[i % len(kinds)]](directory / f"doc_{i:03d}.{kinds[i % len(kinds)]}", pages=pages, seed=seed + i)
+            for i in range(files)]
@@ -0,0 +1,147 @@
+"""Load test for the FastAPI endpoints against stubbed models.
+
+Fires a mixed stream of /chat/query, /analyze, /compare and /health requests
+at a bounded concurrency through an in-process ASGI transport and reports
+p50/p99 latency per endpoint. /health latency is a direct read of event
+loop blocking: it does no work of its own.
+
+    python -m benchmarks.load_test --requests 200 --concurrency 50 --llm-latency 0.2
+"""
+from __future__ import annotations
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import tempfile
+import time
+from collections import defaultdict
+from pathlib import Path
+from typing import Dict, List
+
+
+def percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    idx = min(len(ordered) - 1, max(0, int(round(pct / 100 * (len(ordered) - 1)))))
+    return ordered[idx]
+
+
+def summarize(latencies: Dict[str, List[float]]) -> Dict[str, Dict[str, float]]:
+    out = {}
+    for name, values in sorted(latencies.items()):
+        out[name] = {
+            "count": len(values),
+            "p50_ms": round(percentile(values, 50) * 1000, 2),
+            "p99_ms": round(percentile(values, 99) * 1000, 2),
+            "mean_ms": round(statistics.fmean(values) * 1000, 2) if values else 0.0,
+        }
+    return out
+
+
+async def run(args) -> Dict:
+    import httpx
+    from benchmarks.corpus import make_pdf
+    from api.main import app
+
+    work = Path(os.environ["BENCH_WORKDIR"])
+    ref_pdf = make_pdf(work / "ref.pdf", pages=args.pages, seed=1)
+    act_pdf = make_pdf(work / "act.pdf", pages=args.pages, seed=2)
+    ref_bytes, act_bytes = ref_pdf.read_bytes(), act_pdf.read_bytes()
+
+    transport = httpx.ASGITransport(app=app)
+    await app.router.startup()
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=600) as client:
+        resp = await client.post("/chat/index", files=[("files", ("ref.pdf", ref_bytes, "application/pdf"))])
+        resp.raise_for_status()
+        session_id = resp.json()["session_id"]
+        status_url = resp.json()["status_url"]
+        while (job := (await client.get(status_url)).json())["status"] in ("queued", "running"):
+            await asyncio.sleep(0.1)
+        if job["status"] != "succeeded":
+            raise RuntimeError(f"indexing failed: {job['error']}")
+
+        def request(kind: str):
+            if kind == "query":
+                return client.post("/chat/query", data={"question": "what are the payment terms?",
+                                                        "session_id": session_id, "k": "4"})
+            if kind == "analyze":
+                return client.post("/analyze", files={"file": ("ref.pdf", ref_bytes, "application/pdf")})
+            if kind == "compare":
+                return client.post("/compare", files={"reference": ("ref.pdf", ref_bytes, "application/pdf"),
+                                                      "actual": ("act.pdf", act_bytes, "application/pdf")})
+            return client.get("/health")
+
+        mix = ["query", "query", "query", "analyze", "compare", "health", "health"]
+        sem = asyncio.Semaphore(args.concurrency)
+        latencies: Dict[str, List[float]] = defaultdict(list)
+        errors: Dict[str, int] = defaultdict(int)
+
+        async def one(i: int):
+            kind = mix[i % len(mix)]
+            async with sem:
+                started = time.perf_counter()
+                resp = await request(kind)
+                elapsed = time.perf_counter() - started
+            if resp.status_code >= 400:
+                errors[kind] += 1
+            latencies[kind].append(elapsed)
+            latencies["all"].append(elapsed)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(one(i) for i in range(args.requests)))
+        wall = time.perf_counter() - started
+    await app.router.shutdown()
+
+    return {
+        "requests": args.requests,
+        "concurrency": args.concurrency,
+        "llm_latency_s": args.llm_latency,
+        "embed_latency_s": args.embed_latency,
+        "pages": args.pages,
+        "wall_s": round(wall, 3),
+        "throughput_rps": round(args.requests / wall, 2),
+        "errors": dict(errors),
+        "latency": summarize(latencies),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--llm-latency", type=float, default=0.2)
+    parser.add_argument("--embed-latency", type=float, default=0.02)
+    parser.add_argument("--pages", type=int, default=20)
+    parser.add_argument("--result-cache", action="store_true",
+                        help="serve repeated /analyze and /compare uploads from the result cache (off: measure the pipeline)")
+    parser.add_argument("--out", type=str, default=None, help="write JSON results to this file")
+    args = parser.parse_args()
+
+    work = tempfile.mkdtemp(prefix="docportal_load_")
+    os.environ.update({
+        "BENCH_WORKDIR": work,
+        "FAISS_BASE": os.path.join(work, "faiss_index"),
+        "UPLOAD_BASE": os.path.join(work, "data"),
+        "DATA_STORAGE_PATH": os.path.join(work, "document_analysis"),
+        "DATA_COMPARE_PATH": os.path.join(work, "document_compare"),
+        "EMBEDDING_CACHE_DIR": os.path.join(work, "embedding_cache"),
+        "JOB_DB_PATH": os.path.join(work, "jobs", "jobs.sqlite"),
+        "CHAT_SESSION_DB": os.path.join(work, "chat_sessions", "sessions.sqlite"),
+        "RESULT_CACHE": "true" if args.result_cache else "false",
+        "RESULT_CACHE_DB": os.path.join(work, "result_cache", "results.sqlite"),
+    })
+    from logger.custom_logger import CustomLogger
+    CustomLogger(log_dir=os.path.join(work, "logs"))
+    from benchmarks.stubs import install_stub_models
+    install_stub_models(llm_latency=args.llm_latency, embed_latency=args.embed_latency)
+
+    results = asyncio.run(run(args))
+    print(json.dumps(results, indent=2))
+    if args.out:
+        Path(args.out).write_text(json.dumps(results, indent=2), encoding="utf-8")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""Deterministic local stand-ins for the LLM and embedding providers.
+
+They let benchmarks exercise the real pipeline (parsing, splitting, FAISS,
+LCEL chains, FastAPI) without network calls. Latency is simulated with
+sleeps, so results reflect our own overhead plus a fixed provider delay.
+"""
+from __future__ import annotations
+import asyncio
+import hashlib
+import json
+import os
+import re
+import time
+from typing import Any, AsyncIterator, List, Optional
+
+import numpy as np
+from langchain_core.callbacks import CallbackManagerForLLMRun, AsyncCallbackManagerForLLMRun
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+_WORD = re.compile(r"\w+")
+
+
+class StubChatModel(BaseChatModel):
+    "Chat model that answers each prompt in the repo with a canned, well-formed response"
+    latency: float = 0.0
+
+    @property
+    def _llm_type(self) -> str:
+        return "stub-chat"
+
+    @staticmethod
+    def respond(messages: List[BaseMessage]) -> str:
+        text = "\n".join(str(m.content) for m in messages)
+        if "SentimentTone" in text:
+            pages = re.findall(r"---Page (\d+)---", text)
+            return json.dumps({
+                "summary": ["Stub summary of the document."],
+                "Title": "Stub Title", "Author": "Stub Author",
+                "DateCreated": "2024-01-01", "LastModifiedDate": "2024-01-02",
+                "Publisher": "Stub Publisher", "Language": "English",
+                "PageCount": len(set(pages)) or 1, "SentimentTone": "Neutral",
+            })
+        if "compare the content of documents" in text:
+            pages = sorted({int(p) for p in re.findall(r"---Page (\d+)---", text)}) or [1]
+            return json.dumps([{"page": str(p), "changes": "Stub summary of changes."} for p in pages])
+        if "rewrite the query as a standalone question" in text:
+            return str(messages[-1].content)
+        digest = hashlib.sha256(text.encode("utf-8")).hexdigest()[:12]
+        return f"Stub answer {digest} based on the retrieved context."
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                  run_manager: Optional[CallbackManagerForLLMRun] = None, **kwargs: Any) -> ChatResult:
+        if self.latency:
+            time.sleep(self.latency)
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=self.respond(messages)))])
+
+    async def _agenerate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                         run_manager: Optional[AsyncCallbackManagerForLLMRun] = None, **kwargs: Any) -> ChatResult:
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=self.respond(messages)))])
+
+    async def _astream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                       run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+                       **kwargs: Any) -> AsyncIterator[ChatGenerationChunk]:
+        "first token after half the latency, the rest spread over the other half"
+        words = re.findall(r"\S+\s*", self.respond(messages)) or [""]
+        if self.latency:
+            await asyncio.sleep(self.latency / 2)
+        for word in words:
+            yield ChatGenerationChunk(message=AIMessageChunk(content=word))
+            if self.latency:
+                await asyncio.sleep(self.latency / 2 / len(words))
+
+
+class HashingEmbeddings(Embeddings):
+    "Bag-of-words feature hashing: deterministic, and similar texts get similar vectors"
+    def __init__(self, size: int = 256, latency: float = 0.0):
+        self.size = size
+        self.latency = latency
+        self.model = f"stub-hashing-{size}"
+        self.calls = 0
+
+    def _vector(self, text: str) -> List[float]:
+        vec = np.zeros(self.size, dtype=np.float32)
+        for word in _WORD.findall(text.lower()):
+            h = int.from_bytes(hashlib.md5(word.encode("utf-8")).digest()[:8], "little")
+            vec[h % self.size] += 1.0 if (h >> 63) & 1 else -1.0
+        norm = float(np.linalg.norm(vec))
+        return (vec / norm if norm else vec).tolist()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+        return [self._vector(t) for t in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        self.calls += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return [self._vector(t) for t in texts]
+
+    async def aembed_query(self, text: str) -> List[float]:
+        return (await self.aembed_documents([text]))[0]
+
+
+def install_stub_models(llm_latency: float = 0.0, embed_latency: float = 0.0, embed_size: int = 256):
+    "register stub clients in the process-wide ModelRegistry in place of the real providers"
+    for key in ("OPENAI_API_KEY", "GOOGLE_API_KEY", "GROQ_API_KEY"):
+        os.environ.setdefault(key, "stub")
+    from utils.model_loader import get_model_registry
+    registry = get_model_registry()
+    llm = StubChatModel(latency=llm_latency)
+    embeddings = HashingEmbeddings(size=embed_size, latency=embed_latency)
+    registry.register_llm(llm)
+    registry.register_embedding_model(embeddings)
+    return llm, embeddings
@@ -0,0 +1,330 @@
+"""Offline benchmark suite for the ingest, chat, analysis and comparison paths.
+
+Models are the deterministic stubs from benchmarks.stubs with a fixed
+simulated latency, documents come from benchmarks.corpus, and the answer,
+result and embedding caches are off, so every run of a commit does the same
+work. Scenarios:
+
+* ingest:  ChatIngestor.build_retriever over a mixed PDF/DOCX/TXT corpus, into a fresh index per run
+* query:   ConversationalRAG.invoke with distinct questions against an index of that corpus
+* analyze: POST /analyze of one PDF through the FastAPI app (in-process ASGI transport)
+* compare: POST /compare of two PDFs whose pages all differ
+
+Each scenario runs in a fresh interpreter, so its peak RSS is its own:
+``peak_rss_mb`` is the scenario process, ``children_peak_rss_mb`` the
+largest PDF parsing worker. Results are written as JSON together with the
+git commit and the run parameters; benchmarks.compare diffs two such files.
+
+    python -m benchmarks.suite --out results/head.json
+    python -m benchmarks.suite --scenarios ingest,query --files 12 --pages 40 --repeats 5
+    python -m benchmarks.compare results/base.json results/head.json
+"""
+from __future__ import annotations
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+try:
+    import resource
+except ImportError:  # windows: peak RSS is not reported
+    resource = None
+
+from benchmarks.load_test import percentile
+
+SUITE_VERSION = 1
+SCENARIOS = ("ingest", "query", "analyze", "compare")
+REPO_ROOT = Path(__file__).resolve().parent.parent
+
+
+def latency_stats(values: List[float]) -> Dict[str, float]:
+    return {
+        "count": len(values),
+        "p50": round(percentile(values, 50) * 1000, 2),
+        "p95": round(percentile(values, 95) * 1000, 2),
+        "p99": round(percentile(values, 99) * 1000, 2),
+        "mean": round(sum(values) / len(values) * 1000, 2) if values else 0.0,
+        "min": round(min(values) * 1000, 2) if values else 0.0,
+    }
+
+
+def peak_rss_mb(who: int) -> Optional[float]:
+    if resource is None:
+        return None
+    peak = resource.getrusage(who).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+class _Upload:
+    "a corpus file shaped like an upload (name + read), the way build_retriever takes them"
+    def __init__(self, path: Path):
+        self.path = path
+        self.name = path.name
+
+    def read(self) -> bytes:
+        return self.path.read_bytes()
+
+
+# ----------------------------- #
+# scenarios (worker process)    #
+# ----------------------------- #
+def _corpus(params: Dict[str, Any], work: Path) -> List[Path]:
+    from benchmarks.corpus import make_corpus
+    return make_corpus(work / "corpus", params["files"], params["pages"], params["kinds"], params["seed"])
+
+
+def _build_index(params: Dict[str, Any], work: Path, paths: List[Path], name: str):
+    from src.data_ingestion.data_ingestion import ChatIngestor
+    ci = ChatIngestor(temp_base=str(work / "data"), faiss_base=str(work / name), use_session_dirs=False)
+    ci.build_retriever([_Upload(p) for p in paths], chunk_size=params["chunk_size"],
+                       chunk_overlap=params["chunk_overlap"], k=params["k"])
+    return ci
+
+
+def scenario_ingest(params: Dict[str, Any], work: Path) -> Dict[str, Any]:
+    from utils.faiss_store import SegmentedFaissStore
+    from utils.model_loader import get_model_registry
+
+    paths = _corpus(params, work)
+    timings = []
+    for run in range(params["warmup"] + params["repeats"]):
+        started = time.perf_counter()
+        ci = _build_index(params, work, paths, f"faiss_{run}")
+        if run >= params["warmup"]:
+            timings.append(time.perf_counter() - started)
+    chunks = SegmentedFaissStore(ci.faiss_base).load(get_model_registry().load_embedding_model()).index.ntotal
+    pages = params["files"] * params["pages"]
+    megabytes = sum(p.stat().st_size for p in paths) / 1e6
+    best = min(timings)
+    return {
+        "throughput": {"value": round(pages / best, 2), "unit": "pages/s"},
+        "latency_ms": latency_stats(timings),
+        "mb_per_s": round(megabytes / best, 2),
+        "chunks_per_s": round(chunks / best, 2),
+        "chunks": chunks,
+        "corpus_mb": round(megabytes, 2),
+    }
+
+
+def _questions(n: int, offset: int = 0) -> List[str]:
+    "distinct, deterministic questions in the corpus vocabulary"
+    from benchmarks.corpus import make_paragraphs
+    return [f"what does the contract say about {make_paragraphs(offset + i, 1, words=3)[0].rstrip('.').lower()}?"
+            for i in range(n)]
+
+
+def scenario_query(params: Dict[str, Any], work: Path) -> Dict[str, Any]:
+    from src.document_chat.retreival import ConversationalRAG
+
+    ci = _build_index(params, work, _corpus(params, work), "faiss")
+    rag = ConversationalRAG(session_id=None)
+    rag.load_retriever_from_faiss(ci.faiss_base, k=params["k"])
+    for question in _questions(params["warmup"], offset=1_000_000):
+        rag.invoke(question)
+
+    def one(question: str) -> float:
+        started = time.perf_counter()
+        rag.invoke(question)
+        return time.perf_counter() - started
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=params["concurrency"]) as pool:
+        timings = list(pool.map(one, _questions(params["queries"])))
+    wall = time.perf_counter() - started
+    return {
+        "throughput": {"value": round(len(timings) / wall, 2), "unit": "queries/s"},
+        "latency_ms": latency_stats(timings),
+        "wall_s": round(wall, 3),
+    }
+
+
+def _http_scenario(params: Dict[str, Any], work: Path, send: Callable[[Any], Any]) -> Dict[str, Any]:
+    import httpx
+    from api.main import app
+
+    async def run():
+        await app.router.startup()
+        try:
+            async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench",
+                                         timeout=600) as client:
+                for _ in range(params["warmup"]):
+                    (await send(client)).raise_for_status()
+                sem = asyncio.Semaphore(params["concurrency"])
+
+                async def one() -> float:
+                    async with sem:
+                        started = time.perf_counter()
+                        resp = await send(client)
+                        elapsed = time.perf_counter() - started
+                    resp.raise_for_status()
+                    return elapsed
+
+                started = time.perf_counter()
+                timings = await asyncio.gather(*(one() for _ in range(params["requests"])))
+                return list(timings), time.perf_counter() - started
+        finally:
+            await app.router.shutdown()
+
+    timings, wall = asyncio.run(run())
+    return {
+        "throughput": {"value": round(len(timings) / wall, 2), "unit": "requests/s"},
+        "latency_ms": latency_stats(timings),
+        "wall_s": round(wall, 3),
+    }
+
+
+def scenario_analyze(params: Dict[str, Any], work: Path) -> Dict[str, Any]:
+    from benchmarks.corpus import make_pdf
+    data = make_pdf(work / "analyze.pdf", pages=params["pages"], seed=params["seed"]).read_bytes()
+    return _http_scenario(params, work, lambda client: client.post(
+        "/analyze", files={"file": ("analyze.pdf", data, "application/pdf")}))
+
+
+def scenario_compare(params: Dict[str, Any], work: Path) -> Dict[str, Any]:
+    from benchmarks.corpus import make_pdf
+    reference = make_pdf(work / "reference.pdf", pages=params["pages"], seed=params["seed"]).read_bytes()
+    actual = make_pdf(work / "actual.pdf", pages=params["pages"], seed=params["seed"] + 1).read_bytes()
+    return _http_scenario(params, work, lambda client: client.post(
+        "/compare", files={"reference": ("reference.pdf", reference, "application/pdf"),
+                           "actual": ("actual.pdf", actual, "application/pdf")}))
+
+
+def run_worker(name: str, params: Dict[str, Any], out: Path):
+    "entry point of the per-scenario process"
+    work = out.parent
+    os.environ.update({
+        "FAISS_BASE": str(work / "faiss_index"),
+        "UPLOAD_BASE": str(work / "data"),
+        "DATA_STORAGE_PATH": str(work / "document_analysis"),
+        "DATA_COMPARE_PATH": str(work / "document_compare"),
+        "EMBEDDING_CACHE": "false",
+        "EMBEDDING_CACHE_DIR": str(work / "embedding_cache"),
+        "ANSWER_CACHE": "false",
+        "RESULT_CACHE": "false",
+        "RESULT_CACHE_DB": str(work / "result_cache" / "results.sqlite"),
+        "JOB_DB_PATH": str(work / "jobs" / "jobs.sqlite"),
+        "CHAT_SESSION_DB": str(work / "chat_sessions" / "sessions.sqlite"),
+    })
+    from logger.custom_logger import CustomLogger
+    CustomLogger(log_dir=str(work / "logs"))
+    from benchmarks.stubs import install_stub_models
+    install_stub_models(llm_latency=params["llm_latency"], embed_latency=params["embed_latency"])
+
+    result = globals()[f"scenario_{name}"](params, work)
+    from utils.parsing_service import get_parsing_service
+    # parsing workers must exit (and be reaped) before RUSAGE_CHILDREN covers them; app shutdown does not wait
+    get_parsing_service().shutdown(wait=True)
+    deadline = time.monotonic() + 30
+    while multiprocessing.active_children() and time.monotonic() < deadline:
+        time.sleep(0.05)
+    result["peak_rss_mb"] = peak_rss_mb(resource.RUSAGE_SELF) if resource else None
+    result["children_peak_rss_mb"] = peak_rss_mb(resource.RUSAGE_CHILDREN) if resource else None
+    out.write_text(json.dumps(result), encoding="utf-8")
+
+
+# ----------------------------- #
+# driver                        #
+# ----------------------------- #
+def run_scenario(name: str, params: Dict[str, Any]) -> Dict[str, Any]:
+    with tempfile.TemporaryDirectory(prefix=f"docportal_bench_{name}_") as work:
+        out = Path(work) / "result.json"
+        log_path = Path(work) / "worker.log"
+        with open(log_path, "wb") as log_file:
+            proc = subprocess.run([sys.executable, "-m", "benchmarks.suite", "--worker", name,
+                                   "--params", json.dumps(params), "--worker-out", str(out)],
+                                  cwd=REPO_ROOT, stdout=log_file, stderr=subprocess.STDOUT)
+        if proc.returncode != 0 or not out.exists():
+            tail = log_path.read_text(encoding="utf-8", errors="replace").splitlines()[-20:]
+            raise RuntimeError(f"benchmark scenario {name} failed (exit {proc.returncode}):\n" + "\n".join(tail))
+        return json.loads(out.read_text(encoding="utf-8"))
+
+
+def environment() -> Dict[str, Any]:
+    "what the numbers depend on besides the parameters: code version and machine"
+    def git(*cmd: str) -> Optional[str]:
+        try:
+            return subprocess.run(["git", *cmd], cwd=REPO_ROOT, capture_output=True, text=True,
+                                  check=True).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
+
+    status = git("status", "--porcelain", "--untracked-files=no")
+    return {
+        "commit": git("rev-parse", "HEAD"),
+        "dirty": bool(status) if status is not None else None,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "cpu_count": os.cpu_count(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenarios", type=str, default=",".join(SCENARIOS))
+    parser.add_argument("--files", type=int, default=6, help="corpus documents for ingest/query")
+    parser.add_argument("--pages", type=int, default=20, help="pages per document")
+    parser.add_argument("--kinds", type=str, default="pdf,docx,txt", help="document formats the corpus cycles through")
+    parser.add_argument("--chunk-size", type=int, default=1000)
+    parser.add_argument("--chunk-overlap", type=int, default=200)
+    parser.add_argument("-k", type=int, default=5, help="retrieved chunks per query")
+    parser.add_argument("--repeats", type=int, default=3, help="timed ingest runs")
+    parser.add_argument("--warmup", type=int, default=1, help="untimed runs/queries/requests before measuring")
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--requests", type=int, default=20, help="requests per HTTP scenario")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--llm-latency", type=float, default=0.05)
+    parser.add_argument("--embed-latency", type=float, default=0.01)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", type=str, default=None, help="write JSON results to this file")
+    parser.add_argument("--worker", type=str, default=None, help=argparse.SUPPRESS)
+    parser.add_argument("--params", type=str, default=None, help=argparse.SUPPRESS)
+    parser.add_argument("--worker-out", type=str, default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        run_worker(args.worker, json.loads(args.params), Path(args.worker_out))
+        return
+
+    scenarios = [s.strip() for s in args.scenarios.split(",") if s.strip()]
+    unknown = set(scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenarios: {sorted(unknown)}")
+    params = {
+        "files": args.files, "pages": args.pages, "kinds": [k.strip() for k in args.kinds.split(",") if k.strip()],
+        "chunk_size": args.chunk_size, "chunk_overlap": args.chunk_overlap, "k": args.k,
+        "repeats": max(1, args.repeats), "warmup": max(0, args.warmup), "queries": args.queries,
+        "requests": args.requests, "concurrency": max(1, args.concurrency),
+        "llm_latency": args.llm_latency, "embed_latency": args.embed_latency, "seed": args.seed,
+    }
+    results = {
+        "suite_version": SUITE_VERSION,
+        "created_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "environment": environment(),
+        "params": params,
+        "scenarios": {},
+    }
+    for name in scenarios:
+        started = time.perf_counter()
+        results["scenarios"][name] = run_scenario(name, params)
+        print(f"{name}: {results['scenarios'][name]['throughput']} in {time.perf_counter() - started:.1f}s",
+              file=sys.stderr)
+    print(json.dumps(results, indent=2))
+    if args.out:
+        Path(args.out).parent.mkdir(parents=True, exist_ok=True)
+        Path(args.out).write_text(json.dumps(results, indent=2), encoding="utf-8")
+
+
+if __name__ == "__main__":
+    main()
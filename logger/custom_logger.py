@@ -1,52 +1,178 @@
 #import libraries
+import atexit
 import logging
-from datetime import datetime
+import logging.handlers
 import os
+import queue
+import random
+import threading
+from datetime import datetime
+from typing import Optional
 import structlog
 
-class CustomLogger:
-    def __init__(self,log_dir='logs'):
-        #Ensure the the directory exist
-        self.log_dir=os.path.join(os.getcwd(),log_dir)
-        os.makedirs(self.log_dir,exist_ok=True)
-        
-        #create timestamp log file name
-        log_file=f"{datetime.now().strftime('%m_%d_%Y_%H_%M_%S')}.log"
-        self.log_file_path=os.path.join(self.log_dir,log_file)
-        
-        
-    def get_logger(self,name=__file__):
-        logger_name=os.path.join(name) 
-        #logger=logging.getLogger(logger_name)
-        #logger.setLevel(logging.INFO)
-        
-        #configure file handler
-        file_handler=logging.FileHandler(self.log_file_path)
-        file_handler.setLevel(logging.INFO)
-        file_handler.setFormatter(logging.Formatter("%(message)s"))
-        
-        #configure console handler
-        console_handler=logging.StreamHandler()
-        console_handler.setLevel(logging.INFO)
-        console_handler.setFormatter(logging.Formatter("%(message)s"))
-        
-        
-        logging.basicConfig(
-            level=logging.INFO,
-            format="%(message)s",
-            handlers=[file_handler,console_handler]
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+# longest string kept per log field, and most items kept per list/dict field
+LOG_MAX_FIELD_CHARS = int(os.getenv("LOG_MAX_FIELD_CHARS", "2000"))
+LOG_MAX_FIELD_ITEMS = int(os.getenv("LOG_MAX_FIELD_ITEMS", "50"))
+# share of debug events that are kept; the rest are dropped before any formatting
+LOG_DEBUG_SAMPLE_RATE = float(os.getenv("LOG_DEBUG_SAMPLE_RATE", "0.1"))
+# records waiting for the writer thread; when full, info/debug records are dropped rather than blocking requests
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+
+_configure_lock = threading.Lock()
+_state = {"configured": False, "log_file_path": None, "listener": None, "handler": None}
+
+
+def _compact(value, depth: int = 0):
+    "bounded copy of a log field: long strings are cut, large containers and frames are summarized"
+    if value is None or isinstance(value, (bool, int, float)):
+        return value
+    if isinstance(value, str):
+        if len(value) <= LOG_MAX_FIELD_CHARS:
+            return value
+        return f"{value[:LOG_MAX_FIELD_CHARS]}... (+{len(value) - LOG_MAX_FIELD_CHARS} chars)"
+    if hasattr(value, "shape") and hasattr(value, "dtypes"):  # pandas DataFrame / Series
+        return f"<{type(value).__name__} shape={tuple(value.shape)}>"
+    if depth < 3 and isinstance(value, dict):
+        items = list(value.items())
+        out = {str(k): _compact(v, depth + 1) for k, v in items[:LOG_MAX_FIELD_ITEMS]}
+        if len(items) > LOG_MAX_FIELD_ITEMS:
+            out["..."] = f"+{len(items) - LOG_MAX_FIELD_ITEMS} more"
+        return out
+    if depth < 3 and isinstance(value, (list, tuple, set, frozenset)):
+        items = list(value)
+        out = [_compact(v, depth + 1) for v in items[:LOG_MAX_FIELD_ITEMS]]
+        if len(items) > LOG_MAX_FIELD_ITEMS:
+            out.append(f"... (+{len(items) - LOG_MAX_FIELD_ITEMS} more)")
+        return out
+    return _compact(str(value), depth)
+
+
+def limit_field_size(logger, method_name, event_dict):
+    for key, value in event_dict.items():
+        if key != "exception":
+            event_dict[key] = _compact(value)
+    return event_dict
+
+
+def sample_debug_events(logger, method_name, event_dict):
+    if method_name == "debug" and random.random() >= LOG_DEBUG_SAMPLE_RATE:
+        raise structlog.DropEvent
+    return event_dict
+
+
+class _NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """Hands records to the writer thread untouched.
+
+    The stock QueueHandler formats each record on the calling thread; here
+    rendering happens in the QueueListener, so a request thread only pays for
+    building the event dict and one queue put.
+    """
+    def __init__(self, q):
+        super().__init__(q)
+        self.dropped = 0
+
+    def prepare(self, record):
+        return record
+
+    def enqueue(self, record):
+        if record.levelno >= logging.WARNING:
+            self.queue.put(record)  # warnings and errors wait for room instead of being lost
+            return
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class _RenderOnceFormatter(structlog.stdlib.ProcessorFormatter):
+    "renders a record once and reuses the text for the file and the console handler"
+    def format(self, record):
+        rendered = getattr(record, "_rendered", None)
+        if rendered is None:
+            rendered = record._rendered = super().format(record)
+        return rendered
+
+
+def _configure(log_dir: Optional[str]) -> Optional[str]:
+    "set up handlers and structlog once per process; returns the log file path (None in pool workers)"
+    with _configure_lock:
+        if _state["configured"]:
+            return _state["log_file_path"]
+
+        # rendering to JSON happens here, on the listener thread
+        formatter = _RenderOnceFormatter(
+            processors=[structlog.stdlib.ProcessorFormatter.remove_processors_meta, structlog.processors.JSONRenderer()],
+            # records from the stdlib loggers of libraries keep their tracebacks too
+            foreign_pre_chain=[structlog.processors.TimeStamper(fmt='iso', utc=True, key='timestamp'),
+                               structlog.processors.add_log_level,
+                               structlog.processors.format_exc_info],
         )
+        console_handler = logging.StreamHandler()
+        console_handler.setFormatter(formatter)
+
+        if log_dir is None:
+            # pool worker: write straight to stderr, the parent process owns the log file and the writer thread
+            log_file_path, listener, handler = None, None, None
+            root_handler = console_handler
+        else:
+            os.makedirs(log_dir, exist_ok=True)
+            log_file_path = os.path.join(log_dir, f"{datetime.now().strftime('%m_%d_%Y_%H_%M_%S')}.log")
+            file_handler = logging.FileHandler(log_file_path)
+            file_handler.setFormatter(formatter)
+
+            handler = _NonBlockingQueueHandler(queue.Queue(maxsize=LOG_QUEUE_SIZE))
+            listener = logging.handlers.QueueListener(handler.queue, file_handler, console_handler,
+                                                      respect_handler_level=False)
+            listener.start()
+            atexit.register(listener.stop)
+            root_handler = handler
+
+        root = logging.getLogger()
+        root.handlers = [root_handler]
+        root.setLevel(LOG_LEVEL)
+
         structlog.configure(
             processors=[
+                structlog.stdlib.filter_by_level,
+                sample_debug_events,
+                # request_id and anything else bound for the current request (see utils.metrics)
+                structlog.contextvars.merge_contextvars,
                 structlog.processors.TimeStamper(fmt='iso',utc=True,key='timestamp'),
                 structlog.processors.add_log_level,
                 structlog.processors.EventRenamer(to='event'),
-                structlog.processors.JSONRenderer()
+                # tracebacks must be captured on the thread that is handling the exception
+                structlog.processors.format_exc_info,
+                limit_field_size,
+                structlog.stdlib.ProcessorFormatter.wrap_for_formatter,
             ],
             logger_factory=structlog.stdlib.LoggerFactory(),
+            wrapper_class=structlog.stdlib.BoundLogger,
             cache_logger_on_first_use=True
         )
-        
+        _state.update(configured=True, log_file_path=log_file_path, listener=listener, handler=handler)
+        return log_file_path
+
+
+def configure_worker_logging():
+    "ProcessPoolExecutor initializer: console-only logging, without a log file or writer thread of its own"
+    _configure(None)
+
+
+def dropped_log_records() -> int:
+    "records dropped because the writer thread fell behind"
+    handler = _state["handler"]
+    return handler.dropped if handler is not None else 0
+
+
+class CustomLogger:
+    def __init__(self,log_dir='logs'):
+        #handlers, the log file and structlog are set up by the first instance in the process
+        self.log_dir=os.path.join(os.getcwd(),log_dir)
+        self.log_file_path=_configure(self.log_dir)
+
+    def get_logger(self,name=__file__):
+        logger_name=os.path.join(name)
         return structlog.get_logger(logger_name)
 
 #if __name__=="__main__":
@@ -54,4 +180,3 @@ class CustomLogger:
   #  logger=log.get_logger(__file__)
   #  logger.info("User uploaded a file", user_id=123, filename="report.pdf")
   #  logger.error("Failed to process PDF", error="File not found", user_id=123)
-    
\ No newline at end of file
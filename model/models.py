@@ -25,4 +25,5 @@ class PromptType(str, Enum):
     document_comparison = "document_comparison"
     contextualize_question = "contextualize_question"
     context_qa = "context_qa"
+    summarize_history = "summarize_history"
     
@@ -51,9 +51,20 @@ context_qa_prompt = ChatPromptTemplate.from_messages([
     ("human", "{input}"),
 ])
 
+# Prompt for folding older conversation turns into a running summary
+summarize_history_prompt = ChatPromptTemplate.from_messages([
+    ("system", (
+        "You maintain a running summary of a conversation about a set of documents. Extend the existing summary "
+        "with the new messages, keeping names, numbers, document references and open questions. Reply with the "
+        "updated summary only, in at most {max_words} words.\n\nExisting summary:\n{summary}"
+    )),
+    MessagesPlaceholder("messages"),
+])
+
 PROMPT_REGISTRY = {
     "document_analysis": document_analysis_prompt,
     "document_comparison": document_comparison_prompt,
     "contextualize_question": contextualize_question_prompt,
     "context_qa": context_qa_prompt,
+    "summarize_history": summarize_history_prompt,
 }
\ No newline at end of file
@@ -13,7 +13,7 @@ setup(
     name="document_portal",
     author="@mit redhu",
     version="0.1",
-    packages=find_packages(exclude=["tests*", "examples*"]),
+    packages=find_packages(exclude=["tests*", "examples*", "benchmarks*"]),
     include_package_data=True,
     install_requires=parse_requirements("requirements.txt"),
     extras_require={
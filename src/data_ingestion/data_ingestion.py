@@ -6,44 +6,54 @@ import uuid
 import hashlib
 from pathlib import Path
 from datetime import datetime,timezone
-from typing import List, Dict,Optional,Iterable,Any
+from typing import List, Dict,Optional,Iterable,Any,Callable
 
 import fitz
+import numpy as np
 from langchain.schema import Document
-from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain_community.document_loaders import PyPDFLoader, Docx2txtLoader, TextLoader
 from langchain_community.vectorstores import FAISS
 
-from utils.model_loader import ModelLoader
+from utils.model_loader import ModelLoader, get_model_registry
+from utils.vectorstore_cache import VECTORSTORE_CACHE
+from utils.answer_cache import ANSWER_CACHE
+from utils.faiss_store import SegmentedFaissStore
+from utils.embedding_cache import CachedEmbeddings
+from utils.embedding_pipeline import BatchedEmbeddings
+from utils.near_dup import NEAR_DUP_ENABLED, NearDuplicateFilter
+from utils.text_splitter import get_text_splitter
+from utils.metrics import timed, timed_iter
 from logger.custom_logger import CustomLogger
 from exception.custom_exception import DocumentPortalException
 import json
 from utils.file_io import generate_session_id, save_uploaded_files
-from utils.documents_ops import load_documents, concat_for_analysis, concat_for_comparison
+from utils.documents_ops import iter_documents, iter_pdf_pages, batched, concat_for_analysis, concat_for_comparison
 from os import mkdir
 
 SUPPORTED_EXTENSIONS = {".pdf",".docx",".txt"}
+INGEST_WINDOW_CHUNKS = int(os.getenv("INGEST_WINDOW_CHUNKS", "512"))
+
+log = CustomLogger().get_logger(__name__)
 
 class FaissManager:
     def __init__(self,index_dir:str,model_loader: Optional[ModelLoader]= None):
         self.index_dir = Path(index_dir)
         self.index_dir.mkdir(parents=True, exist_ok=True)
         
-        self.meta_path = self.index_dir / "ingested_meta.json"
-        self._meta: Dict[str,Any] = {"rows":{}}
-        
-        if self.meta_path.exists():
-            try:
-                self._meta = json.load(self.meta_path.read_text(encode="utf-8")) or {"rows":{}}
-            except Exception:
-                self._meta = {"rows":{}}
+        self.model_loader = model_loader or get_model_registry()
+        self.store = SegmentedFaissStore(self.index_dir, index_config=self.model_loader.config.get("faiss_index"))
+        self._meta: Dict[str,Any] = {"rows": dict.fromkeys(self.store.read_fingerprints(), True)}
                 
-        self.model_loader = model_loader or ModelLoader()
-        self.emd_model = self.model_loader.load_embedding_model()
+        self.emd_model = BatchedEmbeddings.from_config(self.model_loader.load_embedding_model(),
+                                                       self.model_loader.config.get("embedding_pipeline"))
+        if os.getenv("EMBEDDING_CACHE", "true").lower() == "true":
+            self.emd_model = CachedEmbeddings(self.emd_model)
         self.vs: Optional[FAISS] = None
+        self.near_dup = NearDuplicateFilter(self.store.chunks) if NEAR_DUP_ENABLED else None
+        self.last_skipped: Dict[str,int] = {"exact_duplicates": 0, "near_duplicates": 0}
         
     def _exist(self) -> bool:
-        return (self.index_dir/"index.faiss").exists() or (self.index_dir/"index.pkl").exists()
+        return self.store.exists()
     
     @staticmethod
     def _fingerprint(text: str,md: dict[str,Any]) -> str:
@@ -53,41 +63,69 @@ class FaissManager:
             return f"{src}::{'' if rid is None else rid}"
         return hashlib.sha256(text.encode("utf-8")).hexdigest()
     
-    def _save_meta(self):
-        self.meta_path.write_text(json.dumps(self._meta,ensure_ascii=False,indent=2),encoding="utf-8")
+    def embedding_cache_stats(self) -> Dict[str,Any]:
+        if isinstance(self.emd_model, CachedEmbeddings):
+            return self.emd_model.stats()
+        return {}
     
     def add_documents(self,docs: List[Document]):
-        if self.vs is None:
-            raise RuntimeError("VectorStore is not initialized")
-        
+        "embed unseen documents and persist them as a delta, returning how many; creates the index on first use"
         new_docs: List[Document] = []
+        keys: List[str] = []
         for doc in docs:
             key = self._fingerprint(doc.page_content, doc.metadata)
             if key in self._meta["rows"]:
                 continue
             self._meta["rows"][key] = True
+            keys.append(key)
             new_docs.append(doc)
+        minhashes = []
+        self.last_skipped = {"exact_duplicates": 0, "near_duplicates": 0}
+        if new_docs and self.near_dup is not None:
+            # re-uploads get fresh file names, so also drop chunks whose content is already indexed
+            with timed("dedup"):
+                keep, content_keys, minhashes, self.last_skipped = self.near_dup.filter(
+                    [d.page_content for d in new_docs], self._meta["rows"])
+            keys = [keys[i] for i in keep] + content_keys
+            new_docs = [new_docs[i] for i in keep]
+            if any(self.last_skipped.values()):
+                log.info("duplicate chunks skipped", **self.last_skipped, kept=len(new_docs))
         if new_docs:
-            self.vs.add_documents(new_docs)
-            self.vs.save_local(str(self.index_dir))
-            self._save_meta()
+            texts = [d.page_content for d in new_docs]
+            metas = [d.metadata for d in new_docs]
+            with timed("embed"):
+                vectors = self.emd_model.embed_documents(texts)
+            if not self._exist():
+                self.vs = FAISS.from_embeddings(list(zip(texts, vectors)), self.emd_model, metadatas=metas)
+                self.store.create(self.vs, keys, minhashes)
+            else:
+                # only the delta is written; the base index.faiss is left untouched
+                self.store.append(vectors, new_docs, fingerprints=keys, minhashes=minhashes)
+                if self.vs is not None:
+                    # documents are already in the chunk store the loaded vectorstore reads from
+                    self.vs.index.add(np.asarray(vectors, dtype=np.float32))
+                self.store.maybe_schedule_compaction(self.emd_model)
+            VECTORSTORE_CACHE.invalidate(self.index_dir)
+            ANSWER_CACHE.invalidate(self.index_dir)
+            log.info("documents added to vectorstore", added=len(new_docs), embedding_cache=self.embedding_cache_stats())
         return len(new_docs)
     
     def load_or_create(self,texts: Optional[List[str]]= None,metadatas: Optional[List[Dict]]= None):
         if self._exist():
-            self.vs= FAISS.load_local(str(self.index_dir),embeddings=self.emd_model,allow_dangerous_deserialization=True)
+            # add_documents grows this index in memory, so it must not be a read-only mmap
+            self.vs = self.store.load(self.emd_model, writable=True)
             return self.vs
         if not texts:
             raise DocumentPortalException("no text provided for vectorstore creation", sys)
-        self.vs = FAISS.from_texts(texts=texts, embedding=self.emd_model, metadatas=metadatas or [])
-        self.vs.save_local(str(self.index_dir))
+        self.add_documents([Document(page_content=t, metadata=m) for t, m in zip(texts, metadatas or [{}] * len(texts))])
+        log.info("vectorstore created", texts=len(texts), embedding_cache=self.embedding_cache_stats())
         return self.vs
 class ChatIngestor:
     def __init__(self,temp_base: str ='data',faiss_base: str = 'faiss_index',use_session_dirs: bool=True,
                 session_id: Optional[str]= None):
         try:
             self.log = CustomLogger().get_logger(__name__)
-            self.model_loader = ModelLoader()
+            self.model_loader = get_model_registry()
             
             self.use_session = use_session_dirs
             self.session_id = session_id or generate_session_id() # type: ignore
@@ -113,38 +151,73 @@ class ChatIngestor:
             return d
         return base
     
+    def _text_splitter(self, chunk_size: int, chunk_overlap: int):
+        return get_text_splitter(chunk_size, chunk_overlap, self.model_loader.config.get("text_splitter"))
+    
+    def _iter_chunks(self, docs: Iterable[Document], chunk_size: int = 1000, chunk_overlap: int = 100):
+        "split documents in page batches, tagging each chunk with a per-source row_id"
+        rows: Dict[str,int] = {}
+        for chunk in self._text_splitter(chunk_size, chunk_overlap).iter_split(docs):
+            src = chunk.metadata.get("source") or chunk.metadata.get("file_path") or ""
+            chunk.metadata["row_id"] = rows.get(src, 0)
+            rows[src] = chunk.metadata["row_id"] + 1
+            yield chunk
+    
     def _split(self, docs: List[Document], chunk_size: int = 1000, chunk_overlap: int = 100) -> List[Document]:
         try:
-            text_splitter = RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
-            chunks = text_splitter.split_documents(docs)
+            chunks = self._text_splitter(chunk_size, chunk_overlap).split_documents(docs)
             self.log.info("text split successfully", chunks=len(chunks))
             return  chunks
         except Exception as e:
             self.log.error("Error splitting text", error=str(e))
             raise DocumentPortalException("text splitting failed", sys)
     
+    def save_files(self,uploaded_files: Iterable) -> List[Path]:
+        "save uploads into this session's upload directory"
+        return save_uploaded_files(uploaded_files,self.temp_base)
+    
     def build_retriever(self,uploaded_files: Iterable,*,chunk_size: int =1000,chunk_overlap: int = 100,
-                        k: int = 5):
+                        k: int = 5,window_size: int = INGEST_WINDOW_CHUNKS,search_type: str = "hybrid"):
         try:
-            paths = save_uploaded_files(uploaded_files,self.temp_base)
-            docs = load_documents(paths)
-            if not docs:
-                raise ValueError("No valid documents uploaded")
-            
-            chunks  = self._split(docs,chunk_size=chunk_size,chunk_overlap=chunk_overlap)
-            fm = FaissManager(self.faiss_base,self.model_loader)
+            paths = self.save_files(uploaded_files)
+            self.index_paths(paths,chunk_size=chunk_size,chunk_overlap=chunk_overlap,window_size=window_size)
+            return VECTORSTORE_CACHE.get_retriever(self.faiss_base,self.model_loader.load_embedding_model(),
+                                                   search_type=search_type,search_kwargs={"k":k})
+        except Exception as e:
+            self.log.error("error in building retriever", error=str(e))
+            raise DocumentPortalException("error in building retriever", sys)
+    
+    def index_paths(self,paths: Iterable[Path],*,chunk_size: int =1000,chunk_overlap: int = 100,
+                    window_size: int = INGEST_WINDOW_CHUNKS,progress: Optional[Callable[..., None]] = None) -> int:
+        "index already-saved files and return the number of chunks added; progress(**counters) runs per window"
+        try:
+            report = progress or (lambda **_: None)
+            counters = {"pages_parsed": 0, "chunks_embedded": 0, "vectors_written": 0,
+                        "duplicates_skipped": 0, "near_duplicates_skipped": 0}
             
-            texts = [c.page_content for c in chunks]
-            metas = [c.metadata for c in chunks]
+            def counted(docs):
+                for doc in docs:
+                    counters["pages_parsed"] += 1
+                    yield doc
             
-            try:
-                vs = fm.load_or_create(texts=texts,metadatas=metas)
-            except Exception as e:
-                vs = fm.load_or_create(texts=texts, metadatas=metas)
+            fm = FaissManager(self.faiss_base,self.model_loader)
             
-            added =  fm.add_documents(chunks)
-            self.log.info("retriever built successfully", added=added)
-            return vs.as_retriever(search_type= 'similarity',search_kwargs={"k":k})
+            # page -> chunk -> embedding window -> FAISS delta; only one window of chunks is held at a time
+            added = 0
+            pages = counted(timed_iter("parse", iter_documents(paths)))
+            for window in batched(self._iter_chunks(pages,chunk_size=chunk_size,
+                                                    chunk_overlap=chunk_overlap), window_size):
+                written = fm.add_documents(window)
+                added += written
+                counters["chunks_embedded"] += written
+                counters["vectors_written"] += written
+                counters["duplicates_skipped"] += fm.last_skipped["exact_duplicates"]
+                counters["near_duplicates_skipped"] += fm.last_skipped["near_duplicates"]
+                report(**counters)
+            if not fm._exist():
+                raise ValueError("No valid documents uploaded")
+            self.log.info("documents indexed successfully", **counters)
+            return added
         except Exception as e:
             self.log.error("error in building retriever", error=str(e))
             raise DocumentPortalException("error in building retriever", sys)
@@ -183,21 +256,20 @@ class DocHandler:
     def read_files(self,pdf_path:str):
         try:
             text_chunks = []
-            with fitz.open(pdf_path) as doc:
-                for page_num in range(doc.page_count):
-                    page = doc.load_page(page_num)
-                    text_chunks.append(f"\n---Page {page_num + 1}---\n{page.get_text()}")
-                text = "".join(text_chunks)
-                self.log.info("PDF read successfully", pdf_path=pdf_path, pages=doc.page_count)
-                return text
+            with timed("parse"):
+                for page_num, page_text in iter_pdf_pages(pdf_path):
+                    text_chunks.append(f"\n---Page {page_num}---\n{page_text}")
+            text = "".join(text_chunks)
+            self.log.info("PDF read successfully", pdf_path=pdf_path, pages=len(text_chunks))
+            return text
         except Exception as e:
             self.log.error(f"error in reading PDF: {e}")
             raise DocumentPortalException("error in reading document", e) from e
         
 class DocumentComparator:
-    def __init__(self,data_dir= "data/data_compare",session_id: Optional[str] = None):
+    def __init__(self,data_dir: Optional[str] = None,session_id: Optional[str] = None):
         self.log  =  CustomLogger().get_logger(__name__)
-        self.base_dir  =  Path(data_dir)
+        self.base_dir  =  Path(data_dir or os.getenv("DATA_COMPARE_PATH",os.path.join("data","data_compare")))
         self.session_id = session_id or generate_session_id()
         self.session_path = self.base_dir / self.session_id
         self.session_path.mkdir(parents=True, exist_ok=True)
@@ -217,27 +289,24 @@ class DocumentComparator:
                     else:
                         f.write(fobj.getbuffer())
                 self.log.info("file saved successfully", filename=fobj.name)
-                return reference_path,actual_path
+            return reference_path,actual_path
         except Exception as e:
             self.log.error("Error saving file", error=str(e))
             raise DocumentPortalException("file saving failed", sys)
       
-    def read_files(self,pdf_path:str):
+    def read_pages(self,pdf_path:str):
+        "(page number, text) for every non-empty page"
         try:
-            with fitz.open(pdf_path) as docs:
-                if docs.is_encrypted:
-                    raise ValueError("Encrypted PDFs are not supported")
-                parts = []
-                for page_num in range(docs.page_count):
-                    page = docs.load_page(page_num)
-                    text = page.get_text()
-                    if text.strip():
-                        parts.append(f"\n---Page {page_num + 1}---\n{text}")
-            self.log.info("PDF read successfully", pdf_path=pdf_path, pages=len(parts))
-            return "\n".join(parts)
+            with timed("parse"):
+                pages = list(iter_pdf_pages(pdf_path, skip_empty=True))
+            self.log.info("PDF read successfully", pdf_path=str(pdf_path), pages=len(pages))
+            return pages
         except Exception as e:
             self.log.error(f"error in reading PDF: {e}")
             raise DocumentPortalException("error in reading document", e) from e
+
+    def read_files(self,pdf_path:str):
+        return "\n".join(f"\n---Page {page_num}---\n{text}" for page_num, text in self.read_pages(pdf_path))
     
     def combine_files(self):
         try:
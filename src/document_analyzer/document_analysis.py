@@ -1,5 +1,12 @@
 import os
-from utils.model_loader import ModelLoader
+import re
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Any, Dict, List
+from utils.model_loader import get_model_registry, model_identity
+from utils.result_cache import prompt_version
+from utils.metrics import timed_runnable
+from utils.token_counter import count_tokens, count_tokens_batch, pack_by_tokens
 from logger.custom_logger import CustomLogger
 from exception.custom_exception import DocumentPortalException
 from model.models import *
@@ -8,13 +15,83 @@ from langchain.output_parsers import OutputFixingParser
 from prompt.prompt_library import PROMPT_REGISTRY
 import sys
 
+# page separators written by DocHandler.read_files
+_PAGE_MARKER = re.compile(r"\n---Page (\d+)---\n")
+_UNKNOWN = {"", "unknown", "n/a", "na", "none", "not available", "not specified", "null"}
+
+
+@dataclass
+class AnalysisPlan:
+    "single: one prompt with the whole text; map_reduce: one prompt per window, then merge_metadata"
+    mode: str
+    total_tokens: int
+    page_count: int
+    windows: List[str] = field(default_factory=list)
+
+
+def split_page_sections(document_text: str) -> List[str]:
+    "page sections of read_files output, each still carrying its ---Page N--- marker"
+    starts = [m.start() for m in _PAGE_MARKER.finditer(document_text)]
+    if not starts:
+        return [document_text] if document_text else []
+    head = [document_text[:starts[0]]] if document_text[:starts[0]].strip() else []
+    return head + [document_text[a:b] for a, b in zip(starts, starts[1:] + [len(document_text)])]
+
+
+def plan_analysis(document_text: str, max_input_tokens: int, window_tokens: int, overhead_tokens: int = 0) -> AnalysisPlan:
+    "pick single-shot or map-reduce by token count, and pack whole pages into windows for the latter"
+    sections = split_page_sections(document_text)
+    counts = count_tokens_batch(sections)
+    total = sum(counts)
+    page_count = len(_PAGE_MARKER.findall(document_text)) or 1
+    if total + overhead_tokens <= max_input_tokens:
+        return AnalysisPlan("single", total, page_count, [document_text])
+    budget = max(1, window_tokens - overhead_tokens)
+    pieces: List[str] = []
+    piece_counts: List[int] = []
+    for text, n in zip(sections, counts):
+        if n <= budget:
+            pieces.append(text)
+            piece_counts.append(n)
+            continue
+        # a single page over budget is cut into character slices of roughly budget tokens
+        step = max(1, len(text) * budget // n)
+        for i in range(0, len(text), step):
+            pieces.append(text[i:i + step])
+            piece_counts.append(budget)
+    windows = ["".join(pieces[i] for i in group) for group in pack_by_tokens(piece_counts, budget)]
+    return AnalysisPlan("map_reduce", total, page_count, windows)
+
+
+def _known(value: Any) -> bool:
+    return str(value).strip().lower() not in _UNKNOWN
+
+
+def merge_metadata(partials: List[Dict[str, Any]], page_count: int) -> Dict[str, Any]:
+    """Deterministic reduce of per-window Metadata: summaries concatenated in page order without
+    duplicates, descriptive fields from the first window that knows them (the title page comes
+    first), Language and SentimentTone by majority vote with ties going to the earliest window,
+    and PageCount from the parsed document rather than any one window."""
+    merged: Dict[str, Any] = {"summary": []}
+    for part in partials:
+        for line in part.get("summary") or []:
+            if line not in merged["summary"]:
+                merged["summary"].append(line)
+    for key in ("Title", "Author", "DateCreated", "LastModifiedDate", "Publisher"):
+        merged[key] = next((p[key] for p in partials if _known(p.get(key, ""))), "Not Available")
+    for key in ("Language", "SentimentTone"):
+        votes = [str(p[key]).strip() for p in partials if _known(p.get(key, ""))]
+        # Counter keeps first-seen order, so most_common breaks ties by window order
+        merged[key] = Counter(votes).most_common(1)[0][0] if votes else "Not Available"
+    merged["PageCount"] = page_count
+    return merged
 
 
 class DocumentAnalyzer:
     "Analyzes documents using pretrained model"
     def __init__(self):
         try:
-            self.loader = ModelLoader()
+            self.loader = get_model_registry()
             self.log = CustomLogger().get_logger(__name__)
             self.llm = self.loader.load_llm()
             #define parser
@@ -22,24 +99,61 @@ class DocumentAnalyzer:
             self.fixing_parser = OutputFixingParser.from_llm(parser=self.parser,llm=self.llm)
 
             self.prompt = PROMPT_REGISTRY["document_analysis"]
+            # parsing (and any fix-up LLM call it needs) is timed as its own stage
+            self.chain = self.prompt | self.llm | timed_runnable("output_parse", self.fixing_parser)
+
+            settings = self.loader.config.get("analysis") or {}
+            self.max_input_tokens = int(settings.get("max_input_tokens", 60000))
+            self.window_tokens = int(settings.get("window_tokens", 12000))
+            self.max_concurrency = int(settings.get("max_concurrency", 4))
 
             self.log.info("DocumentAnalyzer initialized Successfully")
         except Exception as e:
             self.log.info("error initializing DocumentAnalyzer:{e}")
             raise DocumentPortalException("error in DocumentAnalyzer initialization",sys)
 
+    def cache_identity(self) -> Dict[str, Any]:
+        "everything besides the file bytes that shapes the result, for the /analyze result cache"
+        return {"model": model_identity(self.llm), "prompt": prompt_version(self.prompt),
+                "max_input_tokens": self.max_input_tokens, "window_tokens": self.window_tokens}
+
+    def plan(self, document_text: str) -> AnalysisPlan:
+        format_instructions = self.parser.get_format_instructions()
+        overhead = count_tokens(self.prompt.format(format_instructions=format_instructions, document_text=""))
+        plan = plan_analysis(document_text, self.max_input_tokens, self.window_tokens, overhead)
+        self.log.info("analysis planned", mode=plan.mode, tokens=plan.total_tokens, windows=len(plan.windows),
+                      pages=plan.page_count)
+        return plan
+
+    def _inputs(self, plan: AnalysisPlan) -> List[Dict[str, str]]:
+        format_instructions = self.parser.get_format_instructions()
+        return [{"format_instructions": format_instructions, "document_text": text} for text in plan.windows]
+
+    def _reduce(self, plan: AnalysisPlan, responses: List[Dict[str, Any]]) -> Dict[str, Any]:
+        if plan.mode == "single":
+            return responses[0]
+        return merge_metadata(responses, plan.page_count)
+
     def analyze_document(self,document_text:str):
         try:
-            chain = self.prompt | self.llm | self.fixing_parser
-            self.log.info("Metadata chain initialized")
+            plan = self.plan(document_text)
+            responses = self.chain.batch(self._inputs(plan), config={"max_concurrency": self.max_concurrency})
+            response = self._reduce(plan, responses)
 
-            response = chain.invoke({
-                "format_instructions":self.parser.get_format_instructions(),
-                "document_text":document_text
-            })
+            self.log.info("Metadata extraction successful",keys=list(response.keys()), mode=plan.mode)
+            return response
+        except Exception as e:
+            self.log.error("Metadata analysis failed",error=str(e))
+            raise DocumentPortalException("Metadata extraction failed",sys) from e
 
-            self.log.info("Metadata extraction successful",keys=list(response.keys()))
+    async def aanalyze_document(self,document_text:str):
+        "async variant of analyze_document; map-reduce windows are extracted concurrently"
+        try:
+            plan = self.plan(document_text)
+            responses = await self.chain.abatch(self._inputs(plan), config={"max_concurrency": self.max_concurrency})
+            response = self._reduce(plan, responses)
+            self.log.info("Metadata extraction successful",keys=list(response.keys()), mode=plan.mode)
             return response
         except Exception as e:
             self.log.error("Metadata analysis failed",error=str(e))
-            raise DocumentPortalException("Metadata extraction failed") from e
+            raise DocumentPortalException("Metadata extraction failed",sys) from e
@@ -1,20 +1,87 @@
 import os
+import re
+import asyncio
 import sys
-from typing import List,Optional,Dict,Any
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import List,Optional,Dict,Any,Tuple,AsyncIterator
 from dotenv import load_dotenv
 from operator import itemgetter
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.messages import BaseMessage
 from langchain_core.output_parsers import StrOutputParser
-from langchain_core.runnables import RunnablePassthrough
+from langchain_core.runnables import RunnableConfig, RunnableLambda
 from langchain_community.vectorstores import FAISS
 
-from utils.model_loader import ModelLoader
+from utils.model_loader import get_model_registry, model_identity
+from utils.vectorstore_cache import VECTORSTORE_CACHE, retrieve_by_vector
+from utils.answer_cache import ANSWER_CACHE, ANSWER_CACHE_ENABLED
+from utils.metrics import observe_stage, record_cache
 from logger.custom_logger import CustomLogger
 from exception.custom_exception import DocumentPortalException
 from prompt.prompt_library import PROMPT_REGISTRY
 from model.models import PromptType
 
+# "hybrid" fuses BM25 and dense results; "similarity" / "mmr" use the plain FAISS retriever
+RETRIEVAL_SEARCH_TYPE = os.getenv("RETRIEVAL_SEARCH_TYPE", "hybrid")
+# also skip the rewrite when the question reads as standalone even though there is history
+REWRITE_STANDALONE_HEURISTIC = os.getenv("REWRITE_STANDALONE_HEURISTIC", "false").lower() == "true"
+
+# words that usually point back into the conversation ("what about its term?", "and the second one?")
+_CONTEXT_REFERENCE = re.compile(
+    r"\b(it|its|they|them|their|this|that|these|those|he|she|him|her|his|there|above|same|former|latter|"
+    r"previous|earlier|one|ones|also|else)\b|^(and|or|but|so|what about|how about)\b", re.IGNORECASE)
+
+
+def looks_standalone(question: str) -> bool:
+    "cheap check that a question does not lean on earlier turns"
+    return len(question.split()) >= 4 and not _CONTEXT_REFERENCE.search(question.strip())
+
+
+class RewriteCache:
+    "process-wide LRU of rewritten questions keyed by (model, history hash, question)"
+    def __init__(self, max_size: int = 1024):
+        self.max_size = max(1, max_size)
+        self._entries: "OrderedDict[Tuple[str, str, str], str]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(model: str, chat_history: List[BaseMessage], question: str) -> Tuple[str, str, str]:
+        digest = hashlib.sha256()
+        for message in chat_history:
+            digest.update(f"{message.type}\x00{message.content}\x00".encode("utf-8"))
+        return (model, digest.hexdigest(), question.strip())
+
+    def get(self, key) -> Optional[str]:
+        with self._lock:
+            value = self._entries.get(key)
+            if value is None:
+                self.misses += 1
+                record_cache("rewrite", misses=1)
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            record_cache("rewrite", hits=1)
+            return value
+
+    def put(self, key, value: str):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+
+REWRITE_CACHE = RewriteCache(max_size=int(os.getenv("REWRITE_CACHE_SIZE", "1024")))
+
+async def _single(text: str) -> AsyncIterator[str]:
+    yield text
+
+
 class ConversationalRAG:
     def __init__(self,session_id: Optional[str],retriever = None):
         try:
@@ -25,6 +92,11 @@ class ConversationalRAG:
             self.qa_prompt: ChatPromptTemplate = PROMPT_REGISTRY[PromptType.context_qa.value]
             self.retriever = retriever
             self.chain = None
+            self.last_timings: Dict[str, Any] = {}
+            # answers are cached per (index directory, retrieval settings); set by load_retriever_from_faiss
+            self.answer_cache = ANSWER_CACHE if ANSWER_CACHE_ENABLED else None
+            self.cache_scope: Optional[Tuple[str, str]] = None
+            self.cache_index_name = "index"
             if self.retriever:
                 self._build_chain()
             self.log.info("ConversationalRAG initialized successfully")
@@ -32,23 +104,25 @@ class ConversationalRAG:
             self.log.error("ConversationalRAG initialization failed", error=str(e))
             raise DocumentPortalException("error in initializing ConversationalRAG",sys)
         
-    def load_retriever_from_faiss(self,index_path,k: int = 5,index_name: str = "index", search_type: str = 'similarity',
+    def load_retriever_from_faiss(self,index_path,k: int = 5,index_name: str = "index", search_type: str = RETRIEVAL_SEARCH_TYPE,
                                 search_kwargs: Optional[Dict[str, Any]] = None):
         "load vectorstore form disk and convert into retriever"
         try:
-            model_loader =ModelLoader()
-            embedding = model_loader.load_embedding_model()
+            embedding = get_model_registry().load_embedding_model()
             if not os.path.isdir(index_path):
                 raise FileNotFoundError(f"FAISS index path not found:{index_path}")
-            vectorstore = FAISS.load_local(index_path,embedding,index_name,allow_dangerous_deserialization=True)
             if search_kwargs is None:
                 search_kwargs = {"k": k}
-            self.retriever = vectorstore.as_retriever(search_type=search_type, search_kwargs=search_kwargs)
-            self.log.info("retriever loaded from FAISS successfully", faiss_path=index_path)
+            self.retriever = VECTORSTORE_CACHE.get_retriever(index_path,embedding,index_name,search_type=search_type,
+                                                            search_kwargs=search_kwargs)
+            self.cache_scope = (str(index_path), f"{index_name}:{search_type}:{sorted(search_kwargs.items())}")
+            self.cache_index_name = index_name
+            self.log.info("retriever loaded from FAISS successfully", faiss_path=index_path,
+                          cache=VECTORSTORE_CACHE.stats())
             self._build_chain()
             return self.retriever
         except Exception as e:
-            self.logger.error("loading retriever from FAISS failed", error=str(e))
+            self.log.error("loading retriever from FAISS failed", error=str(e))
             raise DocumentPortalException("error in loading retriever from faiss",sys)
     
     @staticmethod
@@ -57,7 +131,7 @@ class ConversationalRAG:
     
     def _load_llm(self):
         try:
-            llm =ModelLoader().load_llm()
+            llm =get_model_registry().load_llm()
             if not llm:
                 raise ValueError("llm could not loaded")
             self.log.info("llm loaded successfully",session_id=self.session_id)
@@ -66,46 +140,230 @@ class ConversationalRAG:
             self.log.error("loading LLM failed", error=str(e))
             raise DocumentPortalException("error in loading LLM", sys)
     
+    def _model_id(self) -> str:
+        return model_identity(self.llm)
+
+    def _rewrite_shortcut(self, inputs: Dict[str, Any]) -> Tuple[Optional[str], Optional[Tuple]]:
+        "the question to retrieve with if no LLM call is needed, else (None, cache key)"
+        question, history, timings = inputs["input"], inputs["chat_history"], inputs["timings"]
+        if not history:
+            timings["rewrite"] = "skipped_no_history"
+            return question, None
+        if REWRITE_STANDALONE_HEURISTIC and looks_standalone(question):
+            timings["rewrite"] = "skipped_standalone"
+            return question, None
+        key = RewriteCache.key(str(self._model_id()), history, question)
+        cached = REWRITE_CACHE.get(key)
+        if cached is not None:
+            timings["rewrite"] = "cached"
+            return cached, None
+        timings["rewrite"] = "llm"
+        return None, key
+
+    def _rewrite(self, inputs: Dict[str, Any]) -> str:
+        started = time.perf_counter()
+        question, key = self._rewrite_shortcut(inputs)
+        if question is None:
+            question = self.question_rewriter.invoke(inputs)
+            REWRITE_CACHE.put(key, question)
+        inputs["timings"]["rewrite_ms"] = round((time.perf_counter() - started) * 1000, 2)
+        return question
+
+    async def _arewrite(self, inputs: Dict[str, Any]) -> str:
+        started = time.perf_counter()
+        question, key = self._rewrite_shortcut(inputs)
+        if question is None:
+            question = await self.question_rewriter.ainvoke(inputs)
+            REWRITE_CACHE.put(key, question)
+        inputs["timings"]["rewrite_ms"] = round((time.perf_counter() - started) * 1000, 2)
+        return question
+
+    def _retrieve(self, inputs: Dict[str, Any]) -> str:
+        started = time.perf_counter()
+        # an answer-cache miss has already embedded the question, so search with that vector
+        if "question_vector" in inputs:
+            docs = retrieve_by_vector(self.retriever, inputs["question"], inputs["question_vector"])
+        else:
+            docs = self.retriever.invoke(inputs["question"])
+        inputs["timings"]["retrieve_ms"] = round((time.perf_counter() - started) * 1000, 2)
+        inputs["sources"] = [doc.metadata for doc in docs]
+        return self._format_documents(docs)
+
+    async def _aretrieve(self, inputs: Dict[str, Any]) -> str:
+        started = time.perf_counter()
+        if "question_vector" in inputs:
+            docs = await asyncio.to_thread(retrieve_by_vector, self.retriever, inputs["question"],
+                                           inputs["question_vector"])
+        else:
+            docs = await self.retriever.ainvoke(inputs["question"])
+        inputs["timings"]["retrieve_ms"] = round((time.perf_counter() - started) * 1000, 2)
+        inputs["sources"] = [doc.metadata for doc in docs]
+        return self._format_documents(docs)
+
+    def _lookup_done(self, inputs: Dict[str, Any], hit, started: float) -> Optional[str]:
+        inputs["timings"]["answer_cache"] = "hit" if hit else "miss"
+        record_cache("answer", hits=int(hit is not None), misses=int(hit is None))
+        inputs["timings"]["cache_ms"] = round((time.perf_counter() - started) * 1000, 2)
+        if hit is None:
+            return None
+        inputs["sources"] = hit[1].get("sources", [])
+        return hit[0]
+
+    def _cache_version(self, inputs: Dict[str, Any]) -> Dict[str, Any]:
+        return {"index_name": self.cache_index_name, "generation": inputs["cache_generation"]}
+
+    def _cached_answer(self, inputs: Dict[str, Any]) -> Optional[str]:
+        "answer to a (near-)identical standalone question already asked of this index, if any"
+        if self.answer_cache is None or self.cache_scope is None:
+            return None
+        started = time.perf_counter()
+        inputs["cache_generation"] = self.answer_cache.generation(self.cache_scope[0], self.cache_index_name)
+        # exact (normalized) text first, so a repeated question costs no embedding call
+        hit = self.answer_cache.lookup(*self.cache_scope, inputs["question"], **self._cache_version(inputs))
+        if hit is None:
+            inputs["question_vector"] = get_model_registry().load_embedding_model().embed_query(inputs["question"])
+            hit = self.answer_cache.lookup(*self.cache_scope, inputs["question"], inputs["question_vector"],
+                                           **self._cache_version(inputs))
+        return self._lookup_done(inputs, hit, started)
+
+    async def _acached_answer(self, inputs: Dict[str, Any]) -> Optional[str]:
+        if self.answer_cache is None or self.cache_scope is None:
+            return None
+        started = time.perf_counter()
+        inputs["cache_generation"] = self.answer_cache.generation(self.cache_scope[0], self.cache_index_name)
+        hit = self.answer_cache.lookup(*self.cache_scope, inputs["question"], **self._cache_version(inputs))
+        if hit is None:
+            embeddings = get_model_registry().load_embedding_model()
+            inputs["question_vector"] = await embeddings.aembed_query(inputs["question"])
+            hit = self.answer_cache.lookup(*self.cache_scope, inputs["question"], inputs["question_vector"],
+                                           **self._cache_version(inputs))
+        return self._lookup_done(inputs, hit, started)
+
+    def _store_answer(self, inputs: Dict[str, Any], answer: str):
+        if answer and "question_vector" in inputs:
+            self.answer_cache.store(*self.cache_scope, inputs["question"], inputs["question_vector"], answer,
+                                    {"sources": inputs.get("sources", [])}, **self._cache_version(inputs))
+
     def _build_chain(self):
         try:
             if self.retriever is None:
                 raise DocumentPortalException("No retriever set before building chain", sys)
-            question_rewriter = (
+            self.question_rewriter = (
                 {"input": itemgetter("input"),"chat_history": itemgetter("chat_history")}
                 | self.contextualize_prompt
                 | self.llm
                 | StrOutputParser()
             )
-            retrieve_docs=  question_rewriter | self.retriever | self._format_documents
-            self.chain = (
-                {
-                "context":retrieve_docs,
-                "input":itemgetter("input"),
-                "chat_history":itemgetter("chat_history"),
-            }
-            |self.qa_prompt
-            |self.llm
-            |StrOutputParser()
-            )
+            self.answer_chain = self.qa_prompt | self.llm | StrOutputParser()
+            # {"input", "chat_history"} -> answer; rewrite -> answer cache -> retrieve -> generate.
+            # invoke/ainvoke go through this runnable and astream shares its _aprepare stages
+            self.chain = RunnableLambda(self._run, afunc=self._arun)
             self.log.info("chain built successfully",session_id=self.session_id)
         except Exception as e:
             self.log.error("building chain failed", error=str(e))
             raise DocumentPortalException("error in building chain", sys)
-        
+
+    @staticmethod
+    def _payload(inputs: Dict[str, Any]) -> Dict[str, Any]:
+        return {"input": inputs["input"], "chat_history": inputs.get("chat_history") or [], "timings": {}}
+
+    def _prepare(self, payload: Dict[str, Any]) -> Optional[str]:
+        "rewrite, then the cached answer if there is one, else retrieve the context to generate from"
+        payload["question"] = self._rewrite(payload)
+        cached = self._cached_answer(payload)
+        if cached is None:
+            payload["context"] = self._retrieve(payload)
+        return cached
+
+    async def _aprepare(self, payload: Dict[str, Any]) -> Optional[str]:
+        payload["question"] = await self._arewrite(payload)
+        cached = await self._acached_answer(payload)
+        if cached is None:
+            payload["context"] = await self._aretrieve(payload)
+        return cached
+
+    def _run(self, inputs: Dict[str, Any], config: RunnableConfig) -> str:
+        payload, started = self._payload(inputs), time.perf_counter()
+        answer = self._prepare(payload)
+        if answer is None:
+            answer = self.answer_chain.invoke(payload, config)
+            self._store_answer(payload, answer)
+        self._record_timings(payload["timings"], started)
+        return answer
+
+    async def _arun(self, inputs: Dict[str, Any], config: RunnableConfig) -> str:
+        payload, started = self._payload(inputs), time.perf_counter()
+        answer = await self._aprepare(payload)
+        if answer is None:
+            answer = await self.answer_chain.ainvoke(payload, config)
+            self._store_answer(payload, answer)
+        self._record_timings(payload["timings"], started)
+        return answer
+
+    def _record_timings(self, timings: Dict[str, Any], started: float):
+        total_ms = round((time.perf_counter() - started) * 1000, 2)
+        spent = sum(timings.get(stage, 0) for stage in ("rewrite_ms", "cache_ms", "retrieve_ms"))
+        timings["generate_ms"] = round(total_ms - spent, 2)
+        timings["total_ms"] = total_ms
+        self.last_timings = timings
+        # skipped and cached stages are left out so the histograms describe real work
+        if timings.get("rewrite") == "llm":
+            observe_stage("rewrite", timings["rewrite_ms"] / 1000)
+        if "cache_ms" in timings:
+            observe_stage("answer_cache", timings["cache_ms"] / 1000)
+        if "retrieve_ms" in timings:
+            observe_stage("retrieve", timings["retrieve_ms"] / 1000)
+        if timings.get("answer_cache") != "hit":
+            observe_stage("generate", timings["generate_ms"] / 1000)
+        self.log.info("RAG stage timings", session_id=self.session_id, **timings)
+
+    def _answered(self, answer: str, user_input: str) -> str:
+        if not answer:
+            self.log.warning("no answer generated from RAG chain",user_input=user_input,session_id=self.session_id)
+            return "Sorry, I couldn't generate an answer."
+        self.log.info("RAG chain invoked successfully", user_input=user_input, session_id=self.session_id,answer_preview= answer[:200])
+        return answer
+
     def invoke(self,user_input:str,chat_history: Optional[List[BaseMessage]]= None)-> str:
         try:
-            chat_history = chat_history or []
-            payload = {"input": user_input, "chat_history": chat_history}
-            answer = self.chain.invoke(payload)
-            if not answer:
-                self.log.warning("no answer generated from RAG chain",user_input=user_input,session_id=self.session_id)
-                return "Sorry, I couldn't generate an answer."
-            self.log.info("RAG chain invoked successfully", user_input=user_input, session_id=self.session_id,answer_preview= answer[:200])
-            return answer
+            answer = self.chain.invoke({"input": user_input, "chat_history": chat_history or []})
+            return self._answered(answer, user_input)
         except Exception as e :
             self.log.error("RAG chain failed", error=str(e))
             raise DocumentPortalException("error in RAG chain", sys)
     
-        
+    async def ainvoke(self,user_input:str,chat_history: Optional[List[BaseMessage]]= None)-> str:
+        "async variant of invoke using the chain's native async LLM and retriever calls"
+        try:
+            answer = await self.chain.ainvoke({"input": user_input, "chat_history": chat_history or []})
+            return self._answered(answer, user_input)
+        except Exception as e :
+            self.log.error("RAG chain failed", error=str(e))
+            raise DocumentPortalException("error in RAG chain", sys)
 
-            
\ No newline at end of file
+    async def astream(self,user_input:str,chat_history: Optional[List[BaseMessage]]= None) -> AsyncIterator[Dict[str, Any]]:
+        """stream the answer as events: one "retrieval" event (rewritten question and source metadata)
+        as soon as retrieval finishes, a "token" event per answer chunk, then "done" with timings"""
+        try:
+            payload, started = self._payload({"input": user_input, "chat_history": chat_history}), time.perf_counter()
+            cached = await self._aprepare(payload)
+            yield {"event": "retrieval", "question": payload["question"], "sources": payload["sources"],
+                   "timings": dict(payload["timings"])}
+            parts: List[str] = []
+            tokens = self.answer_chain.astream(payload) if cached is None else _single(cached)
+            async for token in tokens:
+                if not parts:
+                    payload["timings"]["first_token_ms"] = round((time.perf_counter() - started) * 1000, 2)
+                parts.append(token)
+                yield {"event": "token", "text": token}
+            self._record_timings(payload["timings"], started)
+            answer = "".join(parts)
+            if cached is None:
+                self._store_answer(payload, answer)
+            answer = answer or "Sorry, I couldn't generate an answer."
+            self.log.info("RAG chain streamed successfully", user_input=user_input, session_id=self.session_id,
+                          answer_preview=answer[:200])
+            yield {"event": "done", "answer": answer, "timings": self.last_timings}
+        except Exception as e :
+            self.log.error("RAG stream failed", error=str(e))
+            raise DocumentPortalException("error in RAG chain", sys)
@@ -1,5 +1,5 @@
 import sys
-from dotenv import load_dotenv
+from typing import Any, Dict, List
 import pandas as pd
 from logger.custom_logger import CustomLogger
 from exception.custom_exception import DocumentPortalException
@@ -7,18 +7,25 @@ from model.models import SummaryResponse,PromptType
 from prompt.prompt_library import PROMPT_REGISTRY
 from langchain_core.output_parsers import JsonOutputParser
 from langchain.output_parsers import OutputFixingParser
-from utils.model_loader import ModelLoader
+from utils.model_loader import get_model_registry, model_identity
+from utils.page_diff import align_pages, diff_stats, format_changed_pairs, merge_rows
+from utils.token_counter import count_tokens_batch, pack_by_tokens
+from utils.result_cache import prompt_version
+from utils.metrics import timed_runnable
 
 class DocumentComparatorLLM:
     "Compares two documents using pretrained model"
     def __init__(self):
-        load_dotenv(override=True)
         self.log =CustomLogger().get_logger(__name__)
-        self.llm = ModelLoader().load_llm()
+        self.llm = get_model_registry().load_llm()
         self.parser = JsonOutputParser(pydantic_object=SummaryResponse)
         self.fixing_parser = OutputFixingParser.from_llm(parser=self.parser,llm=self.llm)
         self.prompt = PROMPT_REGISTRY[PromptType.document_comparison .value]
-        self.chain = self.prompt | self.llm |self.parser 
+        self.chain = self.prompt | self.llm | timed_runnable("output_parse", self.parser)
+        settings = get_model_registry().config.get("compare") or {}
+        self.group_tokens = int(settings.get("group_tokens", 8000))
+        self.max_concurrency = int(settings.get("max_concurrency", 4))
+        self.retries = int(settings.get("retries", 1))
         self.log.info("DocumentComparatorLLM initialized successfully")
     def compare_documents(self,combined_docs:str) ->pd.DataFrame:
         "compare two documents and highlight the differences"
@@ -26,20 +33,100 @@ class DocumentComparatorLLM:
             inputs = {
                 "combined_docs": combined_docs,
                 "format_instructions": self.parser.get_format_instructions()}
-            self.log.info("comparing documents",input_keys=inputs)
+            self.log.info("comparing documents",input_keys=list(inputs),chars=len(combined_docs))
             
             response = self.chain.invoke(inputs)
-            self.log.info("documents compared successfully",response=response)
+            self.log.info("documents compared successfully",rows=len(response))
             return self._format_response(response)
         except Exception as e:
             self.log.error("error in comparing documents",error=str(e))
             raise DocumentPortalException("error in comparing documents",e) from e
         
+    async def acompare_documents(self,combined_docs:str) ->pd.DataFrame:
+        "async variant of compare_documents"
+        try:
+            inputs = {
+                "combined_docs": combined_docs,
+                "format_instructions": self.parser.get_format_instructions()}
+            response = await self.chain.ainvoke(inputs)
+            self.log.info("documents compared successfully",rows=len(response))
+            return self._format_response(response)
+        except Exception as e:
+            self.log.error("error in comparing documents",error=str(e))
+            raise DocumentPortalException("error in comparing documents",sys) from e
+        
+    def cache_identity(self) -> Dict[str, Any]:
+        "everything besides the file bytes that shapes the result, for the /compare result cache"
+        return {"model": model_identity(self.llm), "prompt": prompt_version(self.prompt), "group_tokens": self.group_tokens}
+
+    def _plan_pages(self, reference_pages, actual_pages):
+        "align the documents locally; returns the slots and one prompt input per group of changed page pairs"
+        slots = align_pages(reference_pages, actual_pages)
+        changed = [slot for slot in slots if slot.status == "changed"]
+        format_instructions = self.parser.get_format_instructions()
+        groups = pack_by_tokens(count_tokens_batch([format_changed_pairs([slot]) for slot in changed]), self.group_tokens)
+        inputs = [{"combined_docs": format_changed_pairs([changed[i] for i in group]),
+                   "format_instructions": format_instructions} for group in groups]
+        self.log.info("pages aligned", **diff_stats(slots), llm_pages=len(changed), groups=len(inputs))
+        return slots, inputs
+
+    def _collect(self, results: List[Any], pending: List[int], responses: Dict[int, Any]) -> List[int]:
+        "store successful group results; returns the groups that failed"
+        failed = []
+        for i, result in zip(pending, results):
+            if isinstance(result, Exception):
+                self.log.warning("page group comparison failed", group=i, error=str(result))
+                failed.append(i)
+            else:
+                responses[i] = result
+        return failed
+
+    def _merge_groups(self, slots, responses: Dict[int, Any], failed: List[int]) -> pd.DataFrame:
+        if failed:
+            raise RuntimeError(f"comparison failed for page groups {failed} after {self.retries} retries")
+        rows = [row for i in sorted(responses) for row in responses[i]]
+        return self._format_response(merge_rows(slots, rows))
+
+    def compare_pages(self, reference_pages, actual_pages) -> pd.DataFrame:
+        "page-wise comparison where only changed page pairs are sent to the model, in concurrent page groups"
+        try:
+            slots, inputs = self._plan_pages(reference_pages, actual_pages)
+            responses: Dict[int, Any] = {}
+            pending = list(range(len(inputs)))
+            for _ in range(self.retries + 1):
+                if not pending:
+                    break
+                results = self.chain.batch([inputs[i] for i in pending], config={"max_concurrency": self.max_concurrency},
+                                           return_exceptions=True)
+                pending = self._collect(results, pending, responses)
+            return self._merge_groups(slots, responses, pending)
+        except Exception as e:
+            self.log.error("error in comparing documents",error=str(e))
+            raise DocumentPortalException("error in comparing documents",sys) from e
+
+    async def acompare_pages(self, reference_pages, actual_pages) -> pd.DataFrame:
+        "async variant of compare_pages"
+        try:
+            slots, inputs = self._plan_pages(reference_pages, actual_pages)
+            responses: Dict[int, Any] = {}
+            pending = list(range(len(inputs)))
+            for _ in range(self.retries + 1):
+                if not pending:
+                    break
+                results = await self.chain.abatch([inputs[i] for i in pending],
+                                                  config={"max_concurrency": self.max_concurrency},
+                                                  return_exceptions=True)
+                pending = self._collect(results, pending, responses)
+            return self._merge_groups(slots, responses, pending)
+        except Exception as e:
+            self.log.error("error in comparing documents",error=str(e))
+            raise DocumentPortalException("error in comparing documents",sys) from e
+
     def _format_response(self,response_parsed: list[dict]) -> pd.DataFrame:
         "format the response in required format"
         try:
             df = pd.DataFrame(response_parsed)
-            self.log.info("response formatted successfully",dataframe = df)
+            self.log.info("response formatted successfully",rows=len(df),columns=list(df.columns))
             return df
         except Exception as e:
             self.log.error("error in formatting response",error=str(e))
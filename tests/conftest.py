@@ -0,0 +1,40 @@
+"""Shared test setup.
+
+Module-level settings (cache paths, job database, ...) are read from the
+environment at import time, so they are pointed at a throwaway directory
+here, before any application module is imported. Logging is configured
+once per process, so the first CustomLogger call decides where logs go.
+"""
+import os
+import tempfile
+from pathlib import Path
+
+import pytest
+
+WORK_DIR = Path(tempfile.mkdtemp(prefix="docportal_tests_"))
+os.environ.update({
+    "EMBEDDING_CACHE_DIR": str(WORK_DIR / "embedding_cache"),
+    "RESULT_CACHE_DB": str(WORK_DIR / "result_cache" / "results.sqlite"),
+    "JOB_DB_PATH": str(WORK_DIR / "jobs" / "jobs.sqlite"),
+    "CHAT_SESSION_DB": str(WORK_DIR / "chat_sessions" / "sessions.sqlite"),
+    "FAISS_BASE": str(WORK_DIR / "faiss_index"),
+    "UPLOAD_BASE": str(WORK_DIR / "data"),
+    "DATA_STORAGE_PATH": str(WORK_DIR / "document_analysis"),
+    "DATA_COMPARE_PATH": str(WORK_DIR / "document_compare"),
+})
+
+from logger.custom_logger import CustomLogger  # noqa: E402
+
+CustomLogger(log_dir=str(WORK_DIR / "logs"))
+
+
+@pytest.fixture(scope="session")
+def stub_models():
+    "(llm, embeddings) stubs installed in the process-wide ModelRegistry"
+    from benchmarks.stubs import install_stub_models
+    return install_stub_models()
+
+
+@pytest.fixture
+def embeddings(stub_models):
+    return stub_models[1]
@@ -0,0 +1,65 @@
+import numpy as np
+from langchain.schema import Document
+from langchain_community.vectorstores import FAISS
+
+from utils.answer_cache import SemanticAnswerCache
+from utils.faiss_store import SegmentedFaissStore
+
+SETTINGS = "index:hybrid:[('k', 5)]"
+
+
+def unit(*values):
+    v = np.asarray(values, dtype=np.float32)
+    return (v / np.linalg.norm(v)).tolist()
+
+
+def test_answer_cache_exact_semantic_and_miss(tmp_path):
+    cache = SemanticAnswerCache(threshold=0.95)
+    cache.store(tmp_path, SETTINGS, "What are the payment terms?", unit(1, 0, 0), "30 days", {"sources": [1]})
+
+    # text lookups do not need a vector and a text-only miss is not counted
+    assert cache.lookup(tmp_path, SETTINGS, "what are the PAYMENT terms")[0] == "30 days"
+    assert cache.lookup(tmp_path, SETTINGS, "when is payment due?") is None
+    answer, extra, score = cache.lookup(tmp_path, SETTINGS, "when is payment due?", unit(1, 0.1, 0))
+    assert (answer, extra) == ("30 days", {"sources": [1]}) and score >= 0.95
+    assert cache.lookup(tmp_path, SETTINGS, "who is the supplier?", unit(0, 1, 0)) is None
+    assert cache.lookup(tmp_path, "index:mmr:[('k', 5)]", "what are the payment terms?", unit(1, 0, 0)) is None
+    assert (cache.stats()["hits"], cache.stats()["misses"]) == (2, 2)
+
+
+def test_answer_cache_invalidation_and_stale_store(tmp_path):
+    cache = SemanticAnswerCache()
+    cache.store(tmp_path, SETTINGS, "q", unit(1, 0), "old answer")
+    generation = cache.generation(tmp_path)
+
+    assert cache.invalidate(tmp_path) == 1
+    assert cache.lookup(tmp_path, SETTINGS, "q", unit(1, 0)) is None
+    # an answer generated against the old index is not stored after the index changed
+    cache.store(tmp_path, SETTINGS, "q", unit(1, 0), "late answer", generation=generation)
+    assert cache.lookup(tmp_path, SETTINGS, "q", unit(1, 0)) is None
+
+
+def test_answer_cache_sees_writes_by_other_processes(tmp_path, embeddings):
+    SegmentedFaissStore(tmp_path).create(FAISS.from_documents([Document(page_content="clause 1")], embeddings))
+    cache = SemanticAnswerCache()
+    cache.store(tmp_path, SETTINGS, "q", unit(1, 0), "old answer")
+    assert cache.lookup(tmp_path, SETTINGS, "q")[0] == "old answer"
+
+    # another worker: its own cache instance and store handle, so only the disk is shared
+    SegmentedFaissStore(tmp_path).append(embeddings.embed_documents(["clause 2"]), [Document(page_content="clause 2")])
+    SemanticAnswerCache().invalidate(tmp_path)
+
+    assert cache.lookup(tmp_path, SETTINGS, "q", unit(1, 0)) is None
+    assert cache.stats()["entries"] == 0
+
+
+def test_answer_cache_ttl_and_size(tmp_path):
+    expired = SemanticAnswerCache(ttl=-1)
+    expired.store(tmp_path, SETTINGS, "q", unit(1, 0), "a")
+    assert expired.lookup(tmp_path, SETTINGS, "q", unit(1, 0)) is None
+
+    small = SemanticAnswerCache(max_entries=2)
+    for i, q in enumerate(["first", "second", "third"]):
+        small.store(tmp_path, SETTINGS, q, unit(1, i), q)
+    assert small.lookup(tmp_path, SETTINGS, "first") is None
+    assert small.lookup(tmp_path, SETTINGS, "third")[0] == "third"
@@ -0,0 +1,106 @@
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+from benchmarks.corpus import make_pdf
+
+
+@pytest.fixture
+def pdf_bytes(tmp_path):
+    return make_pdf(tmp_path / "doc.pdf", pages=3, seed=7).read_bytes()
+
+
+@pytest.fixture
+def app(stub_models):
+    from api.main import app
+    return app
+
+
+def wait_for_job(client, status_url, timeout: float = 60.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        job = client.get(status_url).json()
+        if job["status"] in ("succeeded", "failed"):
+            return job
+        time.sleep(0.05)
+    raise AssertionError(f"job did not finish: {job}")
+
+
+def test_query_while_index_job_is_pending_is_a_conflict(app, pdf_bytes):
+    # without the startup events the job queue is not running, so the job stays queued
+    client = TestClient(app)
+    resp = client.post("/chat/index", files=[("files", ("doc.pdf", pdf_bytes, "application/pdf"))],
+                       data={"session_id": "pending_session"})
+    assert resp.status_code == 200 and resp.json()["status"] == "queued"
+
+    resp = client.post("/chat/query", data={"question": "what are the payment terms?",
+                                            "session_id": "pending_session"})
+    assert resp.status_code == 409
+
+
+def test_query_after_index_job_succeeds(app, pdf_bytes):
+    with TestClient(app) as client:
+        resp = client.post("/chat/index", files=[("files", ("doc.pdf", pdf_bytes, "application/pdf"))],
+                           data={"session_id": "ready_session"})
+        assert wait_for_job(client, resp.json()["status_url"])["status"] == "succeeded"
+
+        resp = client.post("/chat/query", data={"question": "what are the payment terms?",
+                                                "session_id": "ready_session"})
+        assert resp.status_code == 200
+        assert resp.json()["answer"].startswith("Stub answer")
+        assert resp.headers["x-request-id"]
+
+
+def test_unknown_session_is_not_found(app):
+    resp = TestClient(app).post("/chat/query", data={"question": "hello", "session_id": "no_such_session"})
+    assert resp.status_code == 404
+
+
+def test_startup_does_not_ping_and_shutdown_closes_clients(app, embeddings):
+    from utils.model_loader import get_model_registry
+    calls = embeddings.calls
+    with TestClient(app):
+        pass
+    registry = get_model_registry()
+    assert embeddings.calls == calls  # MODEL_WARMUP_PING is opt-in
+    assert registry.http_client.is_closed and registry.http_async_client.is_closed
+
+
+def metric_value(text: str, sample: str) -> float:
+    "value of one exposition line, by its full name and label set"
+    for line in text.splitlines():
+        if line.rsplit(" ", 1)[0] == sample:
+            return float(line.rsplit(" ", 1)[1])
+    raise AssertionError(f"{sample} not in /metrics output")
+
+
+def test_metrics_endpoint_reports_requests_and_stages(app, pdf_bytes):
+    client = TestClient(app)
+    assert client.post("/analyze", files={"file": ("doc.pdf", pdf_bytes, "application/pdf")}).status_code == 200
+
+    resp = client.get("/metrics")
+    assert resp.status_code == 200 and resp.headers["content-type"].startswith("text/plain; version=0.0.4")
+    text = resp.text
+    assert "# TYPE docportal_http_request_seconds histogram" in text
+    assert "# TYPE docportal_cache_events_total counter" in text
+
+    route = 'method="POST",route="/analyze",status="200"'
+    count = metric_value(text, f"docportal_http_request_seconds_count{{{route}}}")
+    assert count >= 1
+    assert metric_value(text, f'docportal_http_request_seconds_bucket{{{route},le="+Inf"}}') == count
+    assert metric_value(text, 'docportal_stage_seconds_count{stage="llm_call"}') >= 1
+    assert metric_value(text, 'docportal_cache_events_total{cache="result",result="miss"}') >= 1
+    assert metric_value(text, 'docportal_llm_tokens_total{model="stub-chat",kind="prompt"}') > 0
+
+
+def test_compare_cache_hit_gets_its_own_session(app, tmp_path):
+    files = [("reference", ("ref.pdf", make_pdf(tmp_path / "ref.pdf", pages=2, seed=41).read_bytes(), "application/pdf")),
+             ("actual", ("act.pdf", make_pdf(tmp_path / "act.pdf", pages=2, seed=42).read_bytes(), "application/pdf"))]
+    client = TestClient(app)
+    first = client.post("/compare", files=files).json()
+    second = client.post("/compare", files=files).json()
+
+    assert (first["cache"], second["cache"]) == ("miss", "hit")
+    assert second["rows"] == first["rows"]
+    assert second["session_id"] and second["session_id"] != first["session_id"]
@@ -0,0 +1,34 @@
+import threading
+
+from utils.chat_memory import ChatSessionStore
+
+
+def make_store(**kwargs):
+    return ChatSessionStore(token_budget=100_000, backend="memory", summarizer=object(), **kwargs)
+
+
+def test_concurrent_turns_are_all_recorded_and_locks_released():
+    store = make_store()
+    barrier = threading.Barrier(8)
+
+    def turns(n):
+        barrier.wait()
+        for i in range(10):
+            store.append("shared", f"question {n}.{i}", f"answer {n}.{i}")
+            store.append(f"own_{n}_{i}", "question", "answer")
+    threads = [threading.Thread(target=turns, args=(n,)) for n in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert len(store.history("shared")) == 8 * 10 * 2
+    assert store._locks == {}
+
+
+def test_clear_forgets_the_session():
+    store = make_store()
+    store.append("s1", "hello", "hi")
+    store.clear("s1")
+    assert store.history("s1") == []
+    assert store._locks == {}
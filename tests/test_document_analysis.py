@@ -0,0 +1,52 @@
+from src.document_analyzer.document_analysis import merge_metadata, plan_analysis, split_page_sections
+from utils.token_counter import count_tokens_batch
+
+
+def document(pages):
+    "text laid out the way DocHandler.read_files writes it"
+    return "".join(f"\n---Page {i}---\n{text}" for i, text in enumerate(pages, start=1))
+
+
+def test_short_document_is_analyzed_in_one_prompt():
+    text = document(["payment terms are thirty days", "delivery within two weeks"])
+    plan = plan_analysis(text, max_input_tokens=1000, window_tokens=200, overhead_tokens=50)
+    assert (plan.mode, plan.page_count, plan.windows) == ("single", 2, [text])
+
+
+def test_long_document_is_packed_into_page_windows():
+    pages = [f"clause {i} " + "covers the payment and delivery terms " * 10 for i in range(12)]
+    text = document(pages)
+    plan = plan_analysis(text, max_input_tokens=200, window_tokens=250, overhead_tokens=50)
+
+    assert plan.mode == "map_reduce" and plan.page_count == 12
+    assert len(plan.windows) > 1 and "".join(plan.windows) == text
+    for window in plan.windows:
+        assert window.startswith("\n---Page ")  # whole pages only
+        assert sum(count_tokens_batch(split_page_sections(window))) <= 200
+
+
+def test_oversized_page_is_sliced():
+    text = document(["short page", "word " * 2000])
+    plan = plan_analysis(text, max_input_tokens=100, window_tokens=150, overhead_tokens=50)
+    assert plan.mode == "map_reduce" and len(plan.windows) > 2
+    assert "".join(plan.windows) == text
+
+
+def test_merge_metadata_lists_and_scalars():
+    partials = [
+        {"summary": ["Sets payment terms.", "Names the parties."], "Title": "Supply Agreement",
+         "Author": "Not Available", "Language": "English", "SentimentTone": "Neutral"},
+        {"summary": ["Names the parties.", "Covers delivery."], "Title": "Annex B", "Author": "ACME Legal",
+         "Language": "German", "SentimentTone": "Formal"},
+        {"summary": ["Covers delivery.", "Lists penalties."], "Author": "someone else",
+         "Language": "German", "SentimentTone": "unknown"},
+    ]
+    merged = merge_metadata(partials, page_count=12)
+
+    assert merged["summary"] == ["Sets payment terms.", "Names the parties.", "Covers delivery.", "Lists penalties."]
+    assert merged["Title"] == "Supply Agreement"  # first window that knows it
+    assert merged["Author"] == "ACME Legal"  # unknown values are skipped
+    assert merged["Publisher"] == "Not Available"
+    assert merged["Language"] == "German"  # majority
+    assert merged["SentimentTone"] == "Neutral"  # tie goes to the earliest window
+    assert merged["PageCount"] == 12
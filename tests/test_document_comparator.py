@@ -0,0 +1,51 @@
+import asyncio
+import re
+
+import pytest
+from langchain_core.runnables import RunnableLambda
+
+from src.document_compare.document_comparator import DocumentComparatorLLM
+
+REFERENCE = [(1, "intro"), (2, "old terms"), (3, "annex"), (4, "old penalties"), (5, "old schedule")]
+ACTUAL = [(1, "intro"), (2, "new terms"), (3, "annex"), (4, "new penalties"), (5, "new schedule")]
+
+
+class FlakyComparison:
+    "stub chain: one row per changed page, failing the group holding `fail_page` on its first attempt"
+    def __init__(self, fail_page: int):
+        self.fail_page = fail_page
+        self.calls = []
+
+    def __call__(self, inputs):
+        page_numbers = [int(n) for n in re.findall(r"Actual document \(page (\d+)\)", inputs["combined_docs"])]
+        self.calls.append(page_numbers)
+        if self.fail_page in page_numbers and self.calls.count(page_numbers) == 1:
+            raise RuntimeError("model timed out")
+        return [{"page": f"Page {n}", "changes": f"page {n} changed"} for n in page_numbers]
+
+    async def acall(self, inputs):
+        return self(inputs)
+
+
+@pytest.fixture
+def comparator(stub_models):
+    comparator = DocumentComparatorLLM()
+    comparator.group_tokens = 1  # one changed page pair per group
+    comparator.retries = 1
+    return comparator
+
+
+@pytest.mark.parametrize("use_async", [False, True])
+def test_only_the_failed_group_is_resubmitted(comparator, use_async):
+    stub = FlakyComparison(fail_page=4)
+    comparator.chain = RunnableLambda(stub, afunc=stub.acall)
+
+    if use_async:
+        df = asyncio.run(comparator.acompare_pages(REFERENCE, ACTUAL))
+    else:
+        df = comparator.compare_pages(REFERENCE, ACTUAL)
+
+    assert sorted(stub.calls[:3]) == [[2], [4], [5]]
+    assert stub.calls[3:] == [[4]]
+    assert list(df["page"]) == ["1", "Page 2", "3", "Page 4", "Page 5"]
+    assert list(df["changes"])[3] == "page 4 changed"
@@ -0,0 +1,59 @@
+import numpy as np
+
+from benchmarks.stubs import HashingEmbeddings
+from utils.embedding_cache import CachedEmbeddings, EmbeddingCache, content_key
+
+TEXTS = ["payment is due in thirty days", "the supplier delivers on mondays", "either party may terminate"]
+
+
+def test_misses_go_to_the_model_and_hits_do_not(tmp_path):
+    model = HashingEmbeddings(size=32)
+    cached = CachedEmbeddings(model, "stub", cache_dir=str(tmp_path))
+
+    first = cached.embed_documents(TEXTS)
+    assert model.calls == 1 and cached.stats()["misses"] == 3
+
+    again = cached.embed_documents(TEXTS[1:] + ["a new clause about audits"])
+    assert model.calls == 2  # only the new text was sent
+    np.testing.assert_allclose(again[:2], first[1:], rtol=1e-6)
+    assert cached.stats()["hits"] == 2 and cached.stats()["cached_vectors"] == 4
+
+
+def test_wrappers_share_one_cache_per_model(tmp_path):
+    a = CachedEmbeddings(HashingEmbeddings(size=32), "stub", cache_dir=str(tmp_path))
+    b = CachedEmbeddings(HashingEmbeddings(size=32), "stub", cache_dir=str(tmp_path))
+    other = CachedEmbeddings(HashingEmbeddings(size=32), "other", cache_dir=str(tmp_path))
+    assert a.cache is b.cache
+    assert other.cache is not a.cache
+
+
+def test_rows_appended_elsewhere_are_read_incrementally(tmp_path):
+    model = HashingEmbeddings(size=32)
+    shared = CachedEmbeddings(model, "stub", cache_dir=str(tmp_path))
+    shared.embed_documents(TEXTS[:2])
+    offset = shared.cache._keys_offset
+
+    # another process appends through its own handle on the same files
+    writer = EmbeddingCache("stub", str(tmp_path))
+    writer.put_many([content_key(TEXTS[2])], model.embed_documents(TEXTS[2:]))
+
+    calls = model.calls
+    assert shared.cache.get_many([content_key(TEXTS[2])])[0] is not None
+    assert shared.cache._keys_offset > offset and len(shared.cache) == 3
+    shared.embed_documents(TEXTS)
+    assert model.calls == calls
+
+
+def test_interrupted_append_is_truncated(tmp_path):
+    model = HashingEmbeddings(size=32)
+    cache = EmbeddingCache("stub", str(tmp_path))
+    cache.put_many([content_key(TEXTS[0])], model.embed_documents(TEXTS[:1]))
+    with open(cache.vectors_path, "ab") as f:
+        f.write(b"\x00" * 40)  # half a row with no key line
+
+    cache.put_many([content_key(TEXTS[1])], model.embed_documents(TEXTS[1:2]))
+
+    reader = EmbeddingCache("stub", str(tmp_path))
+    assert len(reader) == 2
+    np.testing.assert_allclose(reader.get_many([content_key(TEXTS[1])])[0], model.embed_documents(TEXTS[1:2])[0],
+                               rtol=1e-6)
@@ -0,0 +1,75 @@
+import asyncio
+
+from langchain_core.embeddings import Embeddings
+
+from utils.embedding_pipeline import BatchedEmbeddings
+
+
+class RateLimited(Exception):
+    status_code = 429
+
+
+class TrackingEmbeddings(Embeddings):
+    "async stub that records its peak concurrency and raises 429 for the first `fail` calls"
+    def __init__(self, model: str, fail: int = 0):
+        self.model = model
+        self.fail = fail
+        self.active = 0
+        self.peak = 0
+        self.limiter = None
+        self.held = []  # limiter.in_flight seen by each call
+
+    def embed_documents(self, texts):
+        if self.limiter is not None:
+            self.held.append(self.limiter.in_flight)
+        return [[float(len(t)), 1.0] for t in texts]
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+    async def aembed_documents(self, texts):
+        self.active += 1
+        self.peak = max(self.peak, self.active)
+        try:
+            await asyncio.sleep(0.01)
+            if self.fail:
+                self.fail -= 1
+                raise RateLimited("429 too many requests")
+            return self.embed_documents(texts)
+        finally:
+            self.active -= 1
+
+
+def test_async_batches_hold_the_shared_limiter():
+    model = TrackingEmbeddings("async-limit")
+    batched = BatchedEmbeddings(model, batch_size=1, max_concurrency=2)
+    model.limiter = batched.limiter
+    texts = [f"text {i}" for i in range(8)]
+
+    vectors = asyncio.run(batched.aembed_documents(texts))
+
+    assert vectors == [[float(len(t)), 1.0] for t in texts]
+    assert model.peak == 2
+    assert min(model.held) >= 1 and max(model.held) == 2
+    assert batched.limiter.in_flight == 0
+    # a second wrapper for the same model draws from the same budget
+    assert BatchedEmbeddings(TrackingEmbeddings("async-limit"), max_concurrency=2).limiter is batched.limiter
+
+
+def test_async_rate_limit_backs_off_the_shared_limiter():
+    model = TrackingEmbeddings("async-429", fail=1)
+    batched = BatchedEmbeddings(model, max_concurrency=4, base_delay=0.0)
+
+    assert asyncio.run(batched.aembed_documents(["only batch"])) == model.embed_documents(["only batch"])
+    assert batched.limiter.limit == 2
+    assert batched.limiter.in_flight == 0
+
+
+def test_single_batch_holds_the_limiter():
+    model = TrackingEmbeddings("sync-single")
+    batched = BatchedEmbeddings(model, max_concurrency=2)
+    model.limiter = batched.limiter
+
+    assert batched.embed_documents(["one", "two"]) == [[3.0, 1.0], [3.0, 1.0]]
+    assert model.held == [1]
+    assert batched.limiter.in_flight == 0
@@ -0,0 +1,121 @@
+import json
+
+import numpy as np
+import pytest
+from langchain.schema import Document
+from langchain_community.vectorstores import FAISS
+
+from utils.faiss_store import INDEX_TYPES, SegmentedFaissStore, index_type_of, select_index_type
+
+TEXTS = [f"clause {i} covers payment terms for order {i} and the delivery schedule" for i in range(12)]
+
+
+def metadatas(source: str, n: int):
+    return [{"source": source, "row_id": i} for i in range(n)]
+
+
+def write_baseline_dir(path, embeddings):
+    "an index directory as the first release wrote it: save_local plus ingested_meta.json"
+    FAISS.from_texts(TEXTS, embeddings, metadatas=metadatas("a.pdf", len(TEXTS))).save_local(str(path))
+    rows = {f"a.pdf::{i}": True for i in range(len(TEXTS))}
+    (path / "ingested_meta.json").write_text(json.dumps({"rows": rows}), encoding="utf-8")
+
+
+def test_legacy_save_local_directory_is_migrated(tmp_path, embeddings):
+    write_baseline_dir(tmp_path, embeddings)
+
+    store = SegmentedFaissStore(tmp_path)
+    vs = store.load(embeddings)
+
+    assert not (tmp_path / "index.pkl").exists()
+    assert not (tmp_path / "ingested_meta.json").exists()
+    assert vs.index.ntotal == len(TEXTS)
+    assert vs.similarity_search(TEXTS[3], k=1)[0].page_content == TEXTS[3]
+    assert "a.pdf::0" in store.read_fingerprints()
+
+
+def test_migrated_index_accepts_appends(tmp_path, embeddings):
+    write_baseline_dir(tmp_path, embeddings)
+    store = SegmentedFaissStore(tmp_path)
+    extra = ["a brand new warranty clause about audits"]
+
+    store.append(embeddings.embed_documents(extra), [Document(page_content=t) for t in extra])
+
+    vs = SegmentedFaissStore(tmp_path).load(embeddings)
+    assert vs.index.ntotal == len(TEXTS) + 1
+    assert vs.similarity_search(extra[0], k=1)[0].page_content == extra[0]
+
+
+def corpus(n: int, offset: int = 0):
+    from benchmarks.corpus import make_paragraphs
+    return [make_paragraphs(offset + i, 1, words=20)[0] for i in range(n)]
+
+
+def create_store(path, embeddings, index_type: str, texts):
+    # small PQ codebooks so a few hundred vectors are enough to train
+    store = SegmentedFaissStore(path, index_config={"type": index_type, "pq_m": 16, "pq_nbits": 4})
+    vs = FAISS.from_embeddings(list(zip(texts, embeddings.embed_documents(texts))), embeddings,
+                               metadatas=metadatas("base.pdf", len(texts)))
+    store.create(vs, [f"base.pdf::{i}" for i in range(len(texts))])
+    return store
+
+
+@pytest.mark.parametrize("index_type", INDEX_TYPES)
+def test_append_load_compact_round_trip(tmp_path, embeddings, index_type):
+    base, delta = corpus(400), corpus(20, offset=10_000)
+    store = create_store(tmp_path, embeddings, index_type, base)
+    store.append(embeddings.embed_documents(delta[:10]), [Document(page_content=t) for t in delta[:10]])
+    store.append(embeddings.embed_documents(delta[10:]), [Document(page_content=t) for t in delta[10:]])
+    assert store.segment_count() == 2
+
+    # default load memory-maps the base; replaying segments must still work for every type
+    vs = SegmentedFaissStore(tmp_path).load(embeddings)
+    assert index_type_of(vs.index) == index_type
+    assert vs.index.ntotal == len(base) + len(delta)
+    assert delta[15] in [d.page_content for d in vs.similarity_search(delta[15], k=5)]
+
+    store.compact(embeddings)
+    assert store.segment_count() == 0
+    vs = SegmentedFaissStore(tmp_path).load(embeddings)
+    assert vs.index.ntotal == len(base) + len(delta)
+    assert delta[3] in [d.page_content for d in vs.similarity_search(delta[3], k=5)]
+
+
+@pytest.mark.parametrize("index_type", ["ivf_flat", "ivf_pq"])
+def test_writable_load_accepts_in_memory_adds(tmp_path, embeddings, index_type):
+    store = create_store(tmp_path, embeddings, index_type, corpus(400))
+    extra = corpus(5, offset=20_000)
+
+    vs = store.load(embeddings, writable=True)
+    vs.index.add(np.asarray(embeddings.embed_documents(extra), dtype=np.float32))
+
+    assert vs.index.ntotal == 405
+
+
+def test_select_index_type_thresholds():
+    assert select_index_type(199_999) == "flat"
+    assert select_index_type(200_000) == "ivf_pq"
+    auto_hnsw = {"auto_threshold": 100, "auto_type": "hnsw"}
+    assert select_index_type(99, auto_hnsw) == "flat"
+    assert select_index_type(100, auto_hnsw) == "hnsw"
+    # a fixed type ignores the corpus size
+    assert select_index_type(10, {"type": "ivf_flat"}) == "ivf_flat"
+    assert select_index_type(10_000_000, {"type": "flat"}) == "flat"
+
+
+@pytest.mark.parametrize("auto_type", ["ivf_flat", "hnsw"])
+def test_compaction_retypes_a_grown_flat_index(tmp_path, embeddings, auto_type):
+    config = {"type": "auto", "auto_threshold": 300, "auto_type": auto_type}
+    base, delta = corpus(250), corpus(60, offset=30_000)
+    store = SegmentedFaissStore(tmp_path, index_config=config)
+    store.create(FAISS.from_embeddings(list(zip(base, embeddings.embed_documents(base))), embeddings,
+                                       metadatas=metadatas("base.pdf", len(base))))
+    assert index_type_of(SegmentedFaissStore(tmp_path).load(embeddings).index) == "flat"
+
+    store.append(embeddings.embed_documents(delta), [Document(page_content=t) for t in delta])
+    store.compact(embeddings)
+
+    vs = SegmentedFaissStore(tmp_path).load(embeddings)
+    assert index_type_of(vs.index) == auto_type
+    assert vs.index.ntotal == len(base) + len(delta)
+    assert delta[7] in [d.page_content for d in vs.similarity_search(delta[7], k=5)]
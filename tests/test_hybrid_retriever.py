@@ -0,0 +1,35 @@
+from utils.hybrid_retriever import reciprocal_rank_fusion
+
+
+def test_items_in_both_rankings_outrank_single_list_hits():
+    dense, lexical = [10, 11, 12, 13], [20, 12, 21, 13]
+    fused = reciprocal_rank_fusion([dense, lexical], rrf_k=60)
+    # 12 and 13 appear in both lists, so they beat each list's top hit
+    assert fused[:2] == [12, 13]
+    assert set(fused) == set(dense) | set(lexical)
+
+
+def test_each_chunk_id_appears_once():
+    fused = reciprocal_rank_fusion([[1, 2, 3], [3, 2, 1], [2]])
+    assert sorted(fused) == [1, 2, 3]
+    assert fused[0] == 2
+
+
+def test_ties_keep_first_seen_order():
+    # mirrored ranks give every id the same score
+    assert reciprocal_rank_fusion([[7, 8], [8, 7]]) == [7, 8]
+    assert reciprocal_rank_fusion([[5], [6]]) == [5, 6]
+
+
+def test_weights_and_rrf_k():
+    assert reciprocal_rank_fusion([[1, 2], [2, 1]], weights=(2.0, 1.0)) == [1, 2]
+    assert reciprocal_rank_fusion([[1, 2], [2, 1]], weights=(1.0, 2.0)) == [2, 1]
+    # a small rrf_k lets a single top rank beat an id that is third in both lists
+    rankings = [[1, 5, 3], [2, 6, 3]]
+    assert reciprocal_rank_fusion(rankings, rrf_k=0)[0] == 1
+    assert reciprocal_rank_fusion(rankings, rrf_k=60)[0] == 3
+
+
+def test_empty_rankings():
+    assert reciprocal_rank_fusion([]) == []
+    assert reciprocal_rank_fusion([[], [4]]) == [4]
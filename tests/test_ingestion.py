@@ -0,0 +1,17 @@
+from benchmarks.corpus import make_pdf
+from src.data_ingestion.data_ingestion import ChatIngestor
+
+
+def test_progress_counts_only_embedded_chunks(tmp_path, stub_models):
+    pdf = make_pdf(tmp_path / "doc.pdf", pages=3, seed=7)
+    ci = ChatIngestor(temp_base=str(tmp_path / "data"), faiss_base=str(tmp_path / "faiss"), use_session_dirs=False)
+
+    reports = []
+    added = ci.index_paths([pdf], chunk_size=300, chunk_overlap=0, progress=lambda **c: reports.append(c))
+    assert added > 0 and reports[-1]["chunks_embedded"] == reports[-1]["vectors_written"] == added
+
+    # the same file again: every chunk is dropped as a duplicate, so nothing counts as embedded
+    reports.clear()
+    assert ci.index_paths([pdf], chunk_size=300, chunk_overlap=0, progress=lambda **c: reports.append(c)) == 0
+    assert reports[-1]["chunks_embedded"] == 0
+    assert reports[-1]["pages_parsed"] == 3
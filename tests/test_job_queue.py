@@ -0,0 +1,90 @@
+import time
+
+import pytest
+
+from utils.job_queue import FAILED, QUEUED, RUNNING, SUCCEEDED, JobLimitExceeded, JobQueue
+
+
+@pytest.fixture
+def db(tmp_path):
+    return str(tmp_path / "jobs.sqlite")
+
+
+def wait_for(queue, job_id, timeout: float = 10.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        job = queue.get(job_id)
+        if job["status"] in (SUCCEEDED, FAILED):
+            return job
+        time.sleep(0.02)
+    raise AssertionError(f"job did not finish: {queue.get(job_id)}")
+
+
+def test_claims_are_ordered_and_limited_per_session(db):
+    queue = JobQueue(db, session_concurrency=1)
+    first = queue.submit("index", "s1", {"n": 1})
+    second = queue.submit("index", "s1", {"n": 2})
+    other = queue.submit("index", "s2", {"n": 3})
+
+    assert queue._claim_next()["id"] == first
+    # s1 already has a running job, so its second job waits behind s2
+    assert queue._claim_next()["id"] == other
+    assert queue._claim_next() is None
+    assert queue.get(first)["status"] == RUNNING and queue.get(second)["status"] == QUEUED
+
+
+def test_pending_jobs_per_session_are_bounded(db):
+    queue = JobQueue(db, session_max_pending=2)
+    queue.submit("index", "s1", {})
+    queue.submit("index", "s1", {})
+    with pytest.raises(JobLimitExceeded):
+        queue.submit("index", "s1", {})
+    queue.submit("index", "s2", {})
+
+
+def test_expired_lease_is_requeued_and_claimed_again(db):
+    queue = JobQueue(db, lease_seconds=0.05)
+    job_id = queue.submit("index", "s1", {})
+    queue._claim_next()  # the claiming process dies here: no heartbeat, no finish
+
+    time.sleep(0.1)
+    queue._recover_stale()
+    assert queue.get(job_id)["status"] == QUEUED
+    assert queue._claim_next()["id"] == job_id
+    assert queue.get(job_id)["attempts"] == 2
+
+
+def test_heartbeat_keeps_the_lease(db):
+    queue = JobQueue(db, lease_seconds=0.2)
+    job_id = queue.submit("index", "s1", {})
+    queue._claim_next()
+    queue._active.add(job_id)
+
+    time.sleep(0.15)
+    queue._heartbeat()
+    time.sleep(0.1)
+    queue._recover_stale()
+    assert queue.get(job_id)["status"] == RUNNING
+
+
+def test_jobs_left_by_a_stopped_process_resume(db):
+    job_id = JobQueue(db).submit("index", "s1", {"n": 2})  # queued before a restart
+
+    def index(payload, report):
+        report(pages=payload["n"])
+        return {"doubled": payload["n"] * 2}
+
+    queue = JobQueue(db, poll_interval=0.05)
+    queue.register("index", index)
+    queue.register("broken", lambda payload, report: 1 / 0)
+    queue.start()
+    try:
+        resumed = wait_for(queue, job_id)
+        assert resumed["status"] == SUCCEEDED
+        assert resumed["result"] == {"doubled": 4} and resumed["progress"] == {"pages": 2}
+
+        failed = wait_for(queue, queue.submit("broken", "s2", {}))
+        assert failed["status"] == FAILED and "division by zero" in failed["error"]
+    finally:
+        queue.stop()
+
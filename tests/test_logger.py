@@ -0,0 +1,32 @@
+import json
+import logging
+import os
+import sys
+
+from benchmarks.corpus import make_pdf
+from logger.custom_logger import _state
+from utils.parsing_service import ParsingService
+
+
+def test_stdlib_record_keeps_its_traceback():
+    formatter = _state["listener"].handlers[0].formatter
+    try:
+        1 / 0
+    except ZeroDivisionError:
+        record = logging.getLogger("thirdparty").makeRecord("thirdparty", logging.ERROR, __file__, 1,
+                                                            "request failed", (), sys.exc_info())
+    rendered = json.loads(formatter.format(record))
+    assert rendered["event"] == "request failed" and rendered["level"] == "error"
+    assert "ZeroDivisionError" in rendered["exception"]
+
+
+def test_parse_workers_do_not_open_their_own_log_file(tmp_path, monkeypatch):
+    # a worker that configured logging like the server would create ./logs/<timestamp>.log
+    monkeypatch.chdir(tmp_path)
+    pdf = make_pdf(tmp_path / "doc.pdf", pages=4, seed=3)
+    service = ParsingService(max_workers=1, pages_per_task=2)
+    try:
+        assert len(list(service.iter_pdf_pages(pdf))) == 4
+    finally:
+        service.shutdown(wait=True)
+    assert not os.path.exists(tmp_path / "logs")
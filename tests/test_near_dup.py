@@ -0,0 +1,39 @@
+from benchmarks.corpus import make_paragraphs
+from utils.chunk_store import ChunkStore
+from utils.near_dup import NearDuplicateFilter, content_fingerprint
+
+BASE = make_paragraphs(1, 1, words=80)[0]
+OTHER = make_paragraphs(2, 1, words=80)[0]
+
+
+def near_copy(text: str) -> str:
+    "the same paragraph with one word changed near the end"
+    words = text.split()
+    words[-3] = "amended"
+    return " ".join(words)
+
+
+def test_exact_and_near_duplicates_within_a_batch(tmp_path):
+    dedup = NearDuplicateFilter(ChunkStore(tmp_path / "chunks.sqlite"))
+    texts = [BASE, BASE.upper().replace(" ", "  "), near_copy(BASE), OTHER]
+
+    keep, fingerprints, minhashes, stats = dedup.filter(texts, {})
+
+    assert keep == [0, 3]
+    assert fingerprints == [content_fingerprint(BASE), content_fingerprint(OTHER)]
+    assert len(minhashes) == 2
+    assert stats == {"exact_duplicates": 1, "near_duplicates": 1}
+
+
+def test_duplicates_of_indexed_chunks_are_skipped(tmp_path):
+    store = ChunkStore(tmp_path / "chunks.sqlite")
+    dedup = NearDuplicateFilter(store)
+    seen = {}
+    _, _, minhashes, _ = dedup.filter([BASE], seen)
+    with store.transaction() as conn:
+        ChunkStore.insert_minhashes(conn, 0, minhashes)
+
+    # a later upload: the fingerprints come from the index, the signatures from the chunk store
+    keep, _, _, stats = NearDuplicateFilter(store).filter([BASE, near_copy(BASE), OTHER], dict(seen))
+    assert keep == [2]
+    assert stats == {"exact_duplicates": 1, "near_duplicates": 1}
@@ -0,0 +1,33 @@
+from utils.page_diff import align_pages, diff_stats, format_changed_pairs, merge_rows
+
+
+def pages(*texts, start: int = 1):
+    return [(start + i, t) for i, t in enumerate(texts)]
+
+
+def statuses(slots):
+    return [(s.status, s.reference and s.reference[0], s.actual and s.actual[0]) for s in slots]
+
+
+def test_identical_documents_need_no_llm_pairs():
+    slots = align_pages(pages("a", "b", "c"), pages("a ", "b\n", "c"))
+    assert diff_stats(slots) == {"same": 3, "changed": 0, "inserted": 0, "deleted": 0}
+    assert format_changed_pairs([s for s in slots if s.status == "changed"]) == ""
+
+
+def test_inserted_page_keeps_later_pages_aligned():
+    slots = align_pages(pages("intro", "terms", "annex"), pages("intro", "NEW PAGE", "terms", "annex"))
+    assert statuses(slots) == [("same", 1, 1), ("inserted", None, 2), ("same", 2, 3), ("same", 3, 4)]
+
+
+def test_deleted_and_changed_pages():
+    slots = align_pages(pages("intro", "old terms", "gone", "annex"), pages("intro", "new terms", "annex"))
+    assert statuses(slots) == [("same", 1, 1), ("changed", 2, 2), ("deleted", 3, None), ("same", 4, 3)]
+
+
+def test_merge_rows_matches_llm_rows_on_page_number():
+    slots = align_pages(pages("intro", "old terms", "annex"), pages("intro", "new terms", "annex", "appendix"))
+    rows = merge_rows(slots, [{"page": "Page 2", "changes": "payment terms changed"}])
+    assert [r["page"] for r in rows] == ["1", "Page 2", "3", "4"]
+    assert rows[1]["changes"] == "payment terms changed"
+    assert rows[0]["changes"] == "No changes" and rows[3]["changes"].startswith("Page added")
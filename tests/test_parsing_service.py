@@ -0,0 +1,56 @@
+import time
+
+import pytest
+
+from benchmarks.corpus import make_pdf
+from utils.parsing_service import ParsingService, pdf_page_count
+
+
+@pytest.fixture
+def pdf(tmp_path):
+    return make_pdf(tmp_path / "doc.pdf", pages=4, seed=5)
+
+
+def test_pages_come_back_in_order(pdf):
+    service = ParsingService(max_workers=2, pages_per_task=1)
+    try:
+        assert [n for n, _ in service.iter_pdf_pages(pdf)] == [1, 2, 3, 4]
+    finally:
+        service.shutdown(wait=True)
+
+
+def test_timeout_recycles_the_pool(pdf):
+    service = ParsingService(max_workers=1, pages_per_task=1, timeout=0.0)
+    pool = service.executor
+    assert pool.submit(pdf_page_count, str(pdf)).result() == 4
+    workers = list(pool._processes.values())
+
+    with pytest.raises(TimeoutError):
+        list(service.iter_pdf_pages(pdf))
+
+    for proc in workers:
+        proc.join(timeout=10)
+        assert not proc.is_alive()
+    service.timeout = 60
+    try:
+        assert len(list(service.iter_pdf_pages(pdf))) == 4
+        assert service.executor is not pool
+    finally:
+        service.shutdown(wait=True)
+
+
+def test_slow_consumer_does_not_time_out(tmp_path):
+    pdf = make_pdf(tmp_path / "long.pdf", pages=8, seed=6)
+    service = ParsingService(max_workers=1, pages_per_task=1, timeout=1.0)
+    pool = service.executor
+    assert pool.submit(pdf_page_count, str(pdf)).result() == 8
+    try:
+        pages = []
+        for page_num, _ in service.iter_pdf_pages(pdf):
+            pages.append(page_num)
+            if page_num == 1:
+                time.sleep(1.5)  # the caller is busy (embedding, say) well past the parse timeout
+        assert pages == list(range(1, 9))
+        assert service.executor is pool
+    finally:
+        service.shutdown(wait=True)
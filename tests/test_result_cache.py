@@ -0,0 +1,26 @@
+from utils.result_cache import ResultCache, result_key
+
+
+def test_result_cache_hit_miss_and_keys(tmp_path):
+    cache = ResultCache(str(tmp_path / "results.sqlite"))
+    identity = {"model": "stub", "prompt": "abc"}
+    key = result_key("analyze", ["hash-a"], identity)
+
+    assert cache.get(key) is None
+    cache.put(key, "analyze", {"Title": "Stub"})
+    assert cache.get(key) == {"Title": "Stub"}
+    # another prompt version, file order or endpoint is a different result
+    assert key != result_key("analyze", ["hash-a"], {"model": "stub", "prompt": "def"})
+    assert result_key("compare", ["a", "b"], identity) != result_key("compare", ["b", "a"], identity)
+    assert (cache.stats()["hits"], cache.stats()["misses"]) == (1, 1)
+
+
+def test_result_cache_evicts_least_recently_read(tmp_path):
+    cache = ResultCache(str(tmp_path / "results.sqlite"), max_bytes=60)
+    cache.put("old", "analyze", "x" * 20)
+    cache.put("read", "analyze", "y" * 20)
+    cache.get("read")
+    cache.put("new", "analyze", "z" * 20)
+
+    assert cache.get("old") is None
+    assert cache.get("read") is not None and cache.get("new") is not None
@@ -0,0 +1,133 @@
+import asyncio
+import threading
+
+import pytest
+from langchain.schema import Document
+from langchain_community.vectorstores import FAISS
+from langchain_core.messages import AIMessage, HumanMessage
+from langchain_core.runnables import RunnableLambda
+
+from src.document_chat import retreival
+from src.document_chat.retreival import ConversationalRAG, looks_standalone
+from utils.faiss_store import SegmentedFaissStore
+
+TEXTS = [f"clause {i} covers payment terms for order {i} and the delivery schedule" for i in range(20)]
+
+
+@pytest.fixture
+def rag(tmp_path, embeddings):
+    vs = FAISS.from_documents([Document(page_content=t, metadata={"source": "a.pdf"}) for t in TEXTS], embeddings)
+    SegmentedFaissStore(tmp_path).create(vs, [f"a.pdf::{i}" for i in range(len(TEXTS))])
+    rag = ConversationalRAG(session_id="test_session")
+    rag.load_retriever_from_faiss(str(tmp_path), k=3)
+    return rag
+
+
+def test_chain_invoke_without_timings(rag):
+    history = [HumanMessage(content="hi"), AIMessage(content="hello")]
+    assert rag.chain.invoke({"input": "what does clause 3 cover?", "chat_history": []}).startswith("Stub answer")
+    assert rag.chain.invoke({"input": "and clause 4?", "chat_history": history}).startswith("Stub answer")
+    answer = asyncio.run(rag.chain.ainvoke({"input": "what does clause 5 cover?", "chat_history": []}))
+    assert answer.startswith("Stub answer")
+
+
+def test_entry_points_share_the_answer_cache(rag):
+    question = "which clause covers order 7?"
+    first = rag.invoke(question)
+    assert rag.last_timings["answer_cache"] == "miss"
+
+    assert asyncio.run(rag.ainvoke(question)) == first
+    assert rag.last_timings["answer_cache"] == "hit"
+
+    async def stream():
+        return [event async for event in rag.astream(question)]
+    events = asyncio.run(stream())
+    assert [e["event"] for e in events][0] == "retrieval"
+    assert events[-1]["answer"] == first and events[-1]["timings"]["answer_cache"] == "hit"
+
+
+def test_uncached_question_is_embedded_once(rag, embeddings):
+    # different enough that the second is not a semantic hit on the first
+    asks = [(rag.invoke, "what is the delivery schedule?"),
+            (lambda q: asyncio.run(rag.ainvoke(q)), "who pays for returned goods under clause nine")]
+    for ask, question in asks:
+        before = embeddings.calls
+        ask(question)
+        assert rag.last_timings["answer_cache"] == "miss"
+        assert embeddings.calls - before == 1
+
+
+def test_cache_lookup_is_its_own_stage(rag):
+    rag.invoke("what are the payment terms for order 2?")
+    timings = rag.last_timings
+    spent = timings["rewrite_ms"] + timings["cache_ms"] + timings["retrieve_ms"] + timings["generate_ms"]
+    assert spent == pytest.approx(timings["total_ms"], abs=0.05)
+
+
+def test_async_hybrid_search_runs_off_the_event_loop(rag, monkeypatch):
+    retriever = rag.retriever
+    search = type(retriever).search_by_vector
+    threads = []
+
+    def tracking(self, query, embedding):
+        threads.append(threading.get_ident())
+        return search(self, query, embedding)
+    monkeypatch.setattr(type(retriever), "search_by_vector", tracking)
+
+    async def run():
+        return threading.get_ident(), await retriever.ainvoke("payment terms for order 4")
+    loop_thread, docs = asyncio.run(run())
+    assert docs and threads and threads[0] != loop_thread
+
+
+def test_looks_standalone():
+    assert looks_standalone("what are the payment terms for order 7?")
+    assert looks_standalone("Which clause covers the delivery schedule")
+    assert not looks_standalone("and clause 4?")  # too short, and leans on the previous turn
+    assert not looks_standalone("what does it say about delivery?")
+    assert not looks_standalone("how about the delivery schedule then?")
+    assert not looks_standalone("what are those payment terms based on?")
+
+
+@pytest.fixture
+def rewriter(rag):
+    "stands in for the rewrite LLM chain and records the questions sent to it"
+    calls = []
+
+    def rewrite(inputs):
+        calls.append(inputs["input"])
+        return f"rewritten: {inputs['input']}"
+    rag.question_rewriter = RunnableLambda(rewrite)
+    return calls
+
+
+def test_rewrite_is_skipped_without_history(rag, rewriter):
+    rag.invoke("delivery schedule for order 3, please")
+    assert rag.last_timings["rewrite"] == "skipped_no_history"
+    assert rewriter == []
+
+
+def test_standalone_question_skips_the_rewrite_llm(rag, rewriter, monkeypatch):
+    history = [HumanMessage(content="what does clause 2 cover?"), AIMessage(content="payment terms")]
+    monkeypatch.setattr(retreival, "REWRITE_STANDALONE_HEURISTIC", True)
+
+    rag.invoke("which clause covers the delivery schedule for order 9?", history)
+    assert rag.last_timings["rewrite"] == "skipped_standalone"
+    rag.invoke("and what about its delivery schedule?", history)
+    assert rag.last_timings["rewrite"] == "llm"
+    assert rewriter == ["and what about its delivery schedule?"]
+
+
+def test_repeated_follow_up_is_served_from_the_rewrite_cache(rag, rewriter):
+    history = [HumanMessage(content="what does clause 5 cover?"), AIMessage(content="payment terms for order 5")]
+    follow_up = "and the delivery schedule for it?"
+
+    rag.invoke(follow_up, history)
+    assert rag.last_timings["rewrite"] == "llm"
+    asyncio.run(rag.ainvoke(follow_up, history))
+    assert rag.last_timings["rewrite"] == "cached"
+    assert rewriter == [follow_up]
+
+    # a different history is a different conversation, so it is rewritten again
+    rag.invoke(follow_up, history + [HumanMessage(content="thanks"), AIMessage(content="welcome")])
+    assert rag.last_timings["rewrite"] == "llm" and len(rewriter) == 2
@@ -0,0 +1,60 @@
+from langchain.schema import Document
+
+from utils.text_splitter import LayoutTokenSplitter, get_text_splitter
+from utils.token_counter import count_tokens
+
+HEADING = "4. Payment Terms and Conditions of Delivery"
+TABLE = "\n".join(f"SKU-{i:03d} | widget type {i} | {i * 3} units | EUR {i * 12}.00" for i in range(1, 7))
+
+
+def paragraph(i: int) -> str:
+    return f"Paragraph {i} explains how the supplier invoices order {i} and when the buyer must pay it."
+
+
+def page(number: int, body: str) -> Document:
+    return Document(page_content=body, metadata={"source": "a.pdf", "page": number})
+
+
+def test_chunks_stay_within_the_token_budget():
+    splitter = LayoutTokenSplitter(chunk_tokens=60, overlap_tokens=0)
+    text = "\n\n".join(paragraph(i) for i in range(20)) + "\n\n" + " ".join(paragraph(i) for i in range(20, 40))
+    chunks = splitter.split_text(text)
+    assert len(chunks) > 5
+    assert all(count_tokens(c) <= 60 for c in chunks)
+    # nothing is lost: every paragraph shows up in some chunk
+    assert all(any(paragraph(i) in c for c in chunks) for i in range(40))
+
+
+def test_tables_and_headings_are_not_cut():
+    splitter = LayoutTokenSplitter(chunk_tokens=120, overlap_tokens=0)
+    body = "\n\n".join([paragraph(1), paragraph(2), HEADING, TABLE, paragraph(3), paragraph(4)])
+    chunks = [d.page_content for d in splitter.split_documents([page(1, body)])]
+    assert len(chunks) > 1
+    assert any(TABLE in c for c in chunks)
+    assert any(HEADING in c for c in chunks)
+    assert all(c.count("SKU-") in (0, 6) for c in chunks)
+
+
+def test_chunks_never_cross_pages():
+    splitter = LayoutTokenSplitter(chunk_tokens=200, overlap_tokens=40)
+    docs = splitter.split_documents([page(1, paragraph(1)), page(2, paragraph(2))])
+    assert [(d.page_content, d.metadata["page"]) for d in docs] == [(paragraph(1), 1), (paragraph(2), 2)]
+
+
+def test_overlap_repeats_trailing_paragraphs():
+    splitter = LayoutTokenSplitter(chunk_tokens=80, overlap_tokens=30)
+    chunks = splitter.split_text("\n\n".join(paragraph(i) for i in range(10)))
+    assert len(chunks) > 2
+    for previous, current in zip(chunks, chunks[1:]):
+        assert current.split("\n\n")[0] == previous.split("\n\n")[-1]
+
+    no_overlap = LayoutTokenSplitter(chunk_tokens=80, overlap_tokens=0).split_text(
+        "\n\n".join(paragraph(i) for i in range(10)))
+    assert sum(c.count("Paragraph") for c in no_overlap) == 10
+
+
+def test_character_settings_convert_to_tokens():
+    splitter = get_text_splitter(chunk_size=1000, chunk_overlap=200)
+    assert isinstance(splitter, LayoutTokenSplitter)
+    assert (splitter.chunk_tokens, splitter.overlap_tokens) == (250, 50)
+    assert get_text_splitter(1000, 200) is splitter
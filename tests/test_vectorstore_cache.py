@@ -0,0 +1,60 @@
+import pytest
+from langchain.schema import Document
+from langchain_community.vectorstores import FAISS
+
+from utils.faiss_store import SegmentedFaissStore
+from utils.vectorstore_cache import VectorStoreCache
+
+TEXTS = [f"clause {i} covers payment terms for order {i}" for i in range(10)]
+
+
+def make_index(path, embeddings, texts=TEXTS):
+    vs = FAISS.from_documents([Document(page_content=t) for t in texts], embeddings)
+    SegmentedFaissStore(path).create(vs, [f"a.pdf::{i}" for i in range(len(texts))])
+
+
+@pytest.fixture
+def cache():
+    return VectorStoreCache(max_size=2)
+
+
+def test_hit_miss_and_eviction(tmp_path, embeddings, cache):
+    dirs = [tmp_path / name for name in ("a", "b", "c")]
+    for d in dirs:
+        make_index(d, embeddings)
+
+    first = cache.get_vectorstore(dirs[0], embeddings)
+    assert cache.get_vectorstore(dirs[0], embeddings) is first
+    assert cache.get_retriever(dirs[0], embeddings, search_kwargs={"k": 2}) is \
+        cache.get_retriever(dirs[0], embeddings, search_kwargs={"k": 2})
+    cache.get_vectorstore(dirs[1], embeddings)
+    cache.get_vectorstore(dirs[2], embeddings)
+
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["evictions"], stats["size"]) == (3, 3, 1, 2)
+    assert cache.get_vectorstore(dirs[0], embeddings) is not first
+
+
+def test_invalidate_drops_the_entry(tmp_path, embeddings, cache):
+    make_index(tmp_path, embeddings)
+    first = cache.get_vectorstore(tmp_path, embeddings)
+
+    assert cache.invalidate(tmp_path) == 1
+    assert cache.get_vectorstore(tmp_path, embeddings) is not first
+
+
+def test_write_from_another_process_is_picked_up(tmp_path, embeddings, cache):
+    make_index(tmp_path, embeddings)
+    first = cache.get_vectorstore(tmp_path, embeddings)
+
+    # a separate store handle stands in for an ingest job in another worker; nothing calls invalidate()
+    extra = ["a brand new warranty clause about audits"]
+    SegmentedFaissStore(tmp_path).append(embeddings.embed_documents(extra), [Document(page_content=extra[0])])
+
+    second = cache.get_vectorstore(tmp_path, embeddings)
+    assert second is not first and second.index.ntotal == len(TEXTS) + 1
+    assert cache.get_vectorstore(tmp_path, embeddings) is second
+
+    SegmentedFaissStore(tmp_path).compact(embeddings)
+    third = cache.get_vectorstore(tmp_path, embeddings)
+    assert third is not second and third.index.ntotal == len(TEXTS) + 1
@@ -0,0 +1,160 @@
+from __future__ import annotations
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, Optional, Sequence, Tuple
+
+import numpy as np
+
+from logger.custom_logger import CustomLogger
+from utils.faiss_store import SegmentedFaissStore
+
+log = CustomLogger().get_logger(__name__)
+
+ANSWER_CACHE_ENABLED = os.getenv("ANSWER_CACHE", "true").lower() == "true"
+ANSWER_CACHE_THRESHOLD = float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.95"))
+ANSWER_CACHE_SIZE = int(os.getenv("ANSWER_CACHE_SIZE", "256"))
+ANSWER_CACHE_TTL = float(os.getenv("ANSWER_CACHE_TTL", "3600"))
+ANSWER_CACHE_INDEXES = int(os.getenv("ANSWER_CACHE_INDEXES", "1024"))
+
+_PUNCT = re.compile(r"[^\w\s]")
+
+
+def normalize_question(question: str) -> str:
+    return " ".join(_PUNCT.sub(" ", question.lower()).split())
+
+
+class _Entry:
+    def __init__(self, question: str, vector: np.ndarray, answer: str, extra: Dict[str, Any], generation: Any):
+        self.question = question
+        self.vector = vector
+        self.answer = answer
+        self.extra = extra
+        self.generation = generation
+        self.created_at = time.time()
+
+
+class SemanticAnswerCache:
+    """Per-index cache of answers to (near-)identical standalone questions.
+
+    Entries are keyed by index directory + retrieval settings and stamped with
+    the index generation: a local counter that ``invalidate`` bumps whenever
+    this process adds documents, plus ``SegmentedFaissStore.generation()``
+    read from disk, so writes by other worker processes retire answers too.
+    A lookup first tries the normalized question text, then the
+    cosine similarity of the normalized question embedding against every live
+    entry of that index, serving the best one above ``threshold``. Each index
+    keeps at most ``max_entries`` answers (LRU) for at most ``ttl`` seconds,
+    and at most ``max_indexes`` index/settings buckets are kept (LRU).
+    """
+    def __init__(self, threshold: float = ANSWER_CACHE_THRESHOLD, max_entries: int = ANSWER_CACHE_SIZE,
+                 ttl: float = ANSWER_CACHE_TTL, max_indexes: int = ANSWER_CACHE_INDEXES):
+        self.threshold = threshold
+        self.max_entries = max(1, max_entries)
+        self.ttl = ttl
+        self.max_indexes = max(1, max_indexes)
+        self._entries: "OrderedDict[Tuple[str, str], OrderedDict[str, _Entry]]" = OrderedDict()
+        self._generations: Dict[str, int] = {}
+        self._stores: "OrderedDict[Tuple[str, str], SegmentedFaissStore]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _index_key(index_dir) -> str:
+        return str(Path(index_dir).resolve())
+
+    @staticmethod
+    def _unit(vector: Sequence[float]) -> np.ndarray:
+        arr = np.asarray(vector, dtype=np.float32)
+        norm = float(np.linalg.norm(arr))
+        return arr / norm if norm else arr
+
+    def _bucket(self, index_dir, settings: str) -> "OrderedDict[str, _Entry]":
+        key = (self._index_key(index_dir), settings)
+        bucket = self._entries.get(key)
+        if bucket is None:
+            bucket = self._entries[key] = OrderedDict()
+            while len(self._entries) > self.max_indexes:
+                self._entries.popitem(last=False)
+        self._entries.move_to_end(key)
+        return bucket
+
+    def lookup(self, index_dir, settings: str, question: str, vector: Optional[Sequence[float]] = None,
+               index_name: str = "index", generation: Any = None) -> Optional[Tuple[str, Dict[str, Any], float]]:
+        """(answer, extra, similarity) for a cached match, else None. Without a vector only the
+        normalized question text can match, and a miss is not counted so the caller can retry with one"""
+        text = normalize_question(question)
+        if generation is None:
+            generation = self.generation(index_dir, index_name)
+        with self._lock:
+            bucket = self._bucket(index_dir, settings)
+            cutoff = time.time() - self.ttl
+            for key in [k for k, e in bucket.items() if e.created_at < cutoff or e.generation != generation]:
+                del bucket[key]
+            entry, score = bucket.get(text), 1.0
+            if entry is None and vector is not None and bucket:
+                keys = list(bucket)
+                scores = np.stack([bucket[k].vector for k in keys]) @ self._unit(vector)
+                best = int(np.argmax(scores))
+                if scores[best] >= self.threshold:
+                    entry, score = bucket[keys[best]], float(scores[best])
+            if entry is None:
+                if vector is not None:
+                    self.misses += 1
+                return None
+            bucket.move_to_end(normalize_question(entry.question))
+            self.hits += 1
+        log.info("answer cache hit", index_dir=str(index_dir), similarity=round(score, 4))
+        return entry.answer, entry.extra, score
+
+    def store(self, index_dir, settings: str, question: str, vector: Sequence[float], answer: str,
+              extra: Optional[Dict[str, Any]] = None, generation: Any = None, index_name: str = "index"):
+        current = self.generation(index_dir, index_name)
+        if generation is not None and generation != current:
+            return  # the index changed while this answer was being generated
+        with self._lock:
+            bucket = self._bucket(index_dir, settings)
+            bucket[normalize_question(question)] = _Entry(question, self._unit(vector), answer, extra or {}, current)
+            while len(bucket) > self.max_entries:
+                bucket.popitem(last=False)
+
+    def generation(self, index_dir, index_name: str = "index") -> Tuple[int, Any]:
+        "(local invalidation count, on-disk generation) of an index; answers stored under another value are stale"
+        key = (self._index_key(index_dir), index_name)
+        with self._lock:
+            local = self._generations.get(key[0], 0)
+            store = self._stores.get(key)
+            if store is None:
+                store = self._stores[key] = SegmentedFaissStore(index_dir, index_name)
+                while len(self._stores) > self.max_indexes:
+                    self._stores.popitem(last=False)[1].chunks.close()
+            self._stores.move_to_end(key)
+        return local, store.generation()
+
+    def invalidate(self, index_dir) -> int:
+        "drop every answer cached for an index directory"
+        index = self._index_key(index_dir)
+        with self._lock:
+            self._generations[index] = self._generations.get(index, 0) + 1
+            stale = [k for k in self._entries if k[0] == index]
+            dropped = sum(len(self._entries.pop(k)) for k in stale)
+        if dropped:
+            log.info("answer cache invalidated", index_dir=index, entries=dropped)
+        return dropped
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "entries": sum(len(b) for b in self._entries.values()),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 4) if total else 0.0,
+            }
+
+
+ANSWER_CACHE = SemanticAnswerCache()
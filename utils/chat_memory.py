@@ -0,0 +1,265 @@
+from __future__ import annotations
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, SystemMessage, messages_from_dict, messages_to_dict
+from langchain_core.output_parsers import StrOutputParser
+
+from logger.custom_logger import CustomLogger
+from utils.token_counter import count_tokens
+
+log = CustomLogger().get_logger(__name__)
+
+CHAT_HISTORY_TOKEN_BUDGET = int(os.getenv("CHAT_HISTORY_TOKEN_BUDGET", "2000"))
+CHAT_KEEP_RECENT_MESSAGES = int(os.getenv("CHAT_KEEP_RECENT_MESSAGES", "4"))
+CHAT_SUMMARY_MAX_WORDS = int(os.getenv("CHAT_SUMMARY_MAX_WORDS", "200"))
+CHAT_SESSION_TTL = float(os.getenv("CHAT_SESSION_TTL", "3600"))
+CHAT_MAX_SESSIONS = int(os.getenv("CHAT_MAX_SESSIONS", "10000"))
+# memory | sqlite; memory is per process, so it is only correct with a single server worker
+CHAT_SESSION_BACKEND = os.getenv("CHAT_SESSION_BACKEND", "memory")
+CHAT_SESSION_DB = os.getenv("CHAT_SESSION_DB", os.path.join("chat_sessions", "sessions.sqlite"))
+
+
+def _empty_session() -> Dict[str, Any]:
+    return {"summary": "", "messages": [], "updated_at": time.time()}
+
+
+class _MemoryBackend:
+    "in-process LRU of session states"
+    def __init__(self, max_sessions: int):
+        self.max_sessions = max(1, max_sessions)
+        self._sessions: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, session_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            state = self._sessions.get(session_id)
+            if state is not None:
+                self._sessions.move_to_end(session_id)
+            return state
+
+    def put(self, session_id: str, state: Dict[str, Any]):
+        with self._lock:
+            self._sessions[session_id] = state
+            self._sessions.move_to_end(session_id)
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+
+    def delete(self, session_id: str):
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+    def evict(self, before: float) -> int:
+        with self._lock:
+            stale = [sid for sid, state in self._sessions.items() if state["updated_at"] < before]
+            for sid in stale:
+                del self._sessions[sid]
+            return len(stale)
+
+
+class _SQLiteBackend:
+    "session states in SQLite so they survive restarts and are shared between worker processes"
+    def __init__(self, db_path: str):
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("CREATE TABLE IF NOT EXISTS sessions (session_id TEXT PRIMARY KEY, summary TEXT NOT NULL, "
+                         "messages TEXT NOT NULL, updated_at REAL NOT NULL)")
+            conn.execute("CREATE INDEX IF NOT EXISTS sessions_updated ON sessions(updated_at)")
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(str(self.db_path), timeout=30, isolation_level=None)
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            yield conn
+        finally:
+            conn.close()
+
+    def get(self, session_id: str) -> Optional[Dict[str, Any]]:
+        with self._connect() as conn:
+            row = conn.execute("SELECT summary, messages, updated_at FROM sessions WHERE session_id=?",
+                               (session_id,)).fetchone()
+        if row is None:
+            return None
+        return {"summary": row[0], "messages": messages_from_dict(json.loads(row[1])), "updated_at": row[2]}
+
+    def put(self, session_id: str, state: Dict[str, Any]):
+        with self._connect() as conn:
+            conn.execute("INSERT OR REPLACE INTO sessions (session_id, summary, messages, updated_at) VALUES (?,?,?,?)",
+                         (session_id, state["summary"], json.dumps(messages_to_dict(state["messages"])),
+                          state["updated_at"]))
+
+    def delete(self, session_id: str):
+        with self._connect() as conn:
+            conn.execute("DELETE FROM sessions WHERE session_id=?", (session_id,))
+
+    def evict(self, before: float) -> int:
+        with self._connect() as conn:
+            return conn.execute("DELETE FROM sessions WHERE updated_at<?", (before,)).rowcount
+
+
+class ChatSessionStore:
+    """Server-side conversation memory keyed by session_id.
+
+    Each session keeps a running summary plus the most recent messages. When
+    summary + messages exceed ``token_budget`` tokens, every message except the
+    last ``keep_recent`` is folded into the summary by one LLM call, so the
+    history handed to the RAG prompts stays bounded however long the
+    conversation runs. Sessions idle for longer than ``ttl`` seconds are dropped.
+    """
+    def __init__(self, token_budget: int = CHAT_HISTORY_TOKEN_BUDGET, keep_recent: int = CHAT_KEEP_RECENT_MESSAGES,
+                 ttl: float = CHAT_SESSION_TTL, backend: str = CHAT_SESSION_BACKEND, db_path: str = CHAT_SESSION_DB,
+                 max_sessions: int = CHAT_MAX_SESSIONS, summarizer=None):
+        self.token_budget = token_budget
+        self.keep_recent = max(0, keep_recent)
+        self.ttl = ttl
+        self._backend = _SQLiteBackend(db_path) if backend == "sqlite" else _MemoryBackend(max_sessions)
+        self._summarizer = summarizer
+        # session_id -> [lock, holders and waiters]; an entry lives only while a turn is using it
+        self._locks: Dict[str, List[Any]] = {}
+        self._locks_guard = threading.Lock()
+        self._last_eviction = 0.0
+        self._tasks: set = set()
+        self._pending: set = set()
+
+    @contextmanager
+    def _session_lock(self, session_id: str):
+        with self._locks_guard:
+            entry = self._locks.setdefault(session_id, [threading.Lock(), 0])
+            entry[1] += 1
+        try:
+            with entry[0]:
+                yield
+        finally:
+            with self._locks_guard:
+                entry[1] -= 1
+                if not entry[1]:
+                    del self._locks[session_id]
+
+    @property
+    def summarizer(self):
+        if self._summarizer is None:
+            from prompt.prompt_library import PROMPT_REGISTRY
+            from model.models import PromptType
+            from utils.model_loader import get_model_registry
+            self._summarizer = (PROMPT_REGISTRY[PromptType.summarize_history.value]
+                                | get_model_registry().load_llm() | StrOutputParser())
+        return self._summarizer
+
+    def _load(self, session_id: str) -> Dict[str, Any]:
+        state = self._backend.get(session_id)
+        if state is None or state["updated_at"] < time.time() - self.ttl:
+            return _empty_session()
+        return state
+
+    def _evict_expired(self):
+        now = time.time()
+        if now - self._last_eviction < min(self.ttl, 60):
+            return
+        self._last_eviction = now
+        evicted = self._backend.evict(now - self.ttl)
+        if evicted:
+            log.info("chat sessions expired", count=evicted)
+
+    @staticmethod
+    def _tokens(state: Dict[str, Any]) -> int:
+        return count_tokens(state["summary"]) + sum(count_tokens(str(m.content)) for m in state["messages"])
+
+    def history(self, session_id: str) -> List[BaseMessage]:
+        "messages to pass as chat_history: the running summary (as a system message) followed by recent turns"
+        state = self._load(session_id)
+        prefix = [SystemMessage(f"Summary of the earlier conversation: {state['summary']}")] if state["summary"] else []
+        return prefix + list(state["messages"])
+
+    def _overflow(self, state: Dict[str, Any]) -> List[BaseMessage]:
+        "messages to fold into the summary, empty while the session is within budget"
+        if self._tokens(state) <= self.token_budget:
+            return []
+        cut = max(0, len(state["messages"]) - self.keep_recent)
+        return state["messages"][:cut]
+
+    def _summary_input(self, state: Dict[str, Any], overflow: List[BaseMessage]) -> Dict[str, Any]:
+        return {"summary": state["summary"] or "(none)", "messages": overflow, "max_words": CHAT_SUMMARY_MAX_WORDS}
+
+    def _apply_summary(self, session_id: str, overflow: List[BaseMessage], summary: str):
+        with self._session_lock(session_id):
+            state = self._load(session_id)
+            # another turn may have compacted first; only drop the messages this summary covers
+            if state["messages"][:len(overflow)] != overflow:
+                return
+            state["messages"] = state["messages"][len(overflow):]
+            state["summary"] = summary.strip()
+            state["updated_at"] = time.time()
+            self._backend.put(session_id, state)
+        log.info("chat history summarized", session_id=session_id, folded_messages=len(overflow),
+                 tokens=self._tokens(state))
+
+    def _append(self, session_id: str, question: str, answer: str):
+        self._evict_expired()
+        with self._session_lock(session_id):
+            state = self._load(session_id)
+            state["messages"] = list(state["messages"]) + [HumanMessage(question), AIMessage(answer)]
+            state["updated_at"] = time.time()
+            self._backend.put(session_id, state)
+            overflow = self._overflow(state)
+        return state, overflow
+
+    def append(self, session_id: str, question: str, answer: str):
+        "record one turn, summarizing older turns if the session is over budget"
+        state, overflow = self._append(session_id, question, answer)
+        if overflow:
+            self._apply_summary(session_id, overflow, self.summarizer.invoke(self._summary_input(state, overflow)))
+
+    async def _asummarize(self, session_id: str, state: Dict[str, Any], overflow: List[BaseMessage]):
+        from starlette.concurrency import run_in_threadpool
+
+        try:
+            summary = await self.summarizer.ainvoke(self._summary_input(state, overflow))
+            await run_in_threadpool(self._apply_summary, session_id, overflow, summary)
+        except Exception as e:
+            # the turn is already recorded; the next turn retries the summary
+            log.error("chat history summarization failed", session_id=session_id, error=str(e))
+
+    async def aappend(self, session_id: str, question: str, answer: str, wait: bool = True):
+        "async append; with wait=False the summarization runs as a background task after the turn is recorded"
+        from starlette.concurrency import run_in_threadpool
+
+        state, overflow = await run_in_threadpool(self._append, session_id, question, answer)
+        if not overflow:
+            return
+        if wait:
+            await self._asummarize(session_id, state, overflow)
+            return
+        if session_id in self._pending:
+            return  # one summary per session in flight; the next turn picks up whatever is left over
+        self._pending.add(session_id)
+        task = asyncio.get_running_loop().create_task(self._asummarize(session_id, state, overflow))
+        self._tasks.add(task)
+        task.add_done_callback(lambda t: (self._tasks.discard(t), self._pending.discard(session_id)))
+
+    def clear(self, session_id: str):
+        with self._session_lock(session_id):
+            self._backend.delete(session_id)
+
+
+_store: Optional[ChatSessionStore] = None
+_store_lock = threading.Lock()
+
+
+def get_chat_session_store() -> ChatSessionStore:
+    "return the process-wide ChatSessionStore"
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = ChatSessionStore()
+    return _store
@@ -0,0 +1,240 @@
+from __future__ import annotations
+import json
+import os
+import re
+import sqlite3
+import threading
+from collections.abc import MutableMapping
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Set, Tuple, Union
+
+from langchain.schema import Document
+from langchain_community.docstore.base import AddableMixin, Docstore
+
+CHUNK_STORE_MMAP_BYTES = int(os.getenv("CHUNK_STORE_MMAP_BYTES", str(256 * 1024 * 1024)))
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS chunks (
+    pos INTEGER PRIMARY KEY,
+    id TEXT NOT NULL UNIQUE,
+    text TEXT NOT NULL,
+    metadata TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS segments (
+    seq INTEGER PRIMARY KEY,
+    start INTEGER NOT NULL,
+    count INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS fingerprints (
+    key TEXT PRIMARY KEY
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS minhashes (
+    pos INTEGER PRIMARY KEY,
+    signature BLOB NOT NULL
+);
+CREATE TABLE IF NOT EXISTS minhash_bands (
+    band INTEGER NOT NULL,
+    bucket INTEGER NOT NULL,
+    pos INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS minhash_bands_bucket ON minhash_bands (band, bucket);
+CREATE VIRTUAL TABLE IF NOT EXISTS chunks_fts USING fts5(text, content='chunks', content_rowid='pos');
+CREATE TRIGGER IF NOT EXISTS chunks_fts_insert AFTER INSERT ON chunks BEGIN
+    INSERT INTO chunks_fts (rowid, text) VALUES (new.pos, new.text);
+END;
+CREATE TRIGGER IF NOT EXISTS chunks_fts_delete AFTER DELETE ON chunks BEGIN
+    INSERT INTO chunks_fts (chunks_fts, rowid, text) VALUES ('delete', old.pos, old.text);
+END;
+"""
+# bump when the schema gains derived data that existing files must backfill
+_SCHEMA_VERSION = 1
+
+# identifiers like "SKU-001-0042" or "4.2.1" stay together as one phrase query
+_TERM = re.compile(r"\w+(?:[-./]\w+)*")
+
+
+def fts_query(text: str) -> str:
+    "OR of the query's terms, each quoted so user text cannot inject FTS syntax"
+    phrases = []
+    for term in _TERM.findall(text):
+        parts = re.findall(r"\w+", term)
+        phrases.append('"' + " ".join(parts) + '"')
+    return " OR ".join(dict.fromkeys(phrases))
+
+
+class ChunkStore:
+    """SQLite file holding the chunk text/metadata of one FAISS index.
+
+    ``pos`` is the vector's position in the FAISS index, so a search hit maps
+    straight to a primary-key lookup. Nothing is read until a hit asks for it:
+    opening the store is constant time, and with ``mmap_size`` the pages are
+    served from the OS page cache, shared by every worker process.
+    """
+    def __init__(self, path):
+        self.path = Path(path)
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(str(self.path), timeout=30, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(f"PRAGMA mmap_size={CHUNK_STORE_MMAP_BYTES}")
+            conn.executescript(_SCHEMA)
+            if conn.execute("PRAGMA user_version").fetchone()[0] < _SCHEMA_VERSION:
+                # chunk files written before the lexical index existed
+                conn.execute("INSERT INTO chunks_fts (chunks_fts) VALUES ('rebuild')")
+                conn.execute(f"PRAGMA user_version={_SCHEMA_VERSION}")
+            self._conn = conn
+        return self._conn
+
+    @contextmanager
+    def transaction(self):
+        with self._lock:
+            conn = self._connection()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+
+    def _query(self, sql: str, params: Sequence = ()) -> List[tuple]:
+        with self._lock:
+            return self._connection().execute(sql, params).fetchall()
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    # ----------------------------- #
+    # chunks                        #
+    # ----------------------------- #
+    def count(self) -> int:
+        return self._query("SELECT COUNT(*) FROM chunks")[0][0]
+
+    def id_at(self, pos: int) -> Optional[str]:
+        rows = self._query("SELECT id FROM chunks WHERE pos=?", (pos,))
+        return rows[0][0] if rows else None
+
+    def get(self, doc_id: str) -> Optional[Document]:
+        rows = self._query("SELECT text, metadata FROM chunks WHERE id=?", (doc_id,))
+        if not rows:
+            return None
+        return Document(page_content=rows[0][0], metadata=json.loads(rows[0][1]))
+
+    def get_at(self, positions: Sequence[int]) -> Dict[int, Document]:
+        "documents for the given FAISS positions in one query"
+        if not positions:
+            return {}
+        marks = ",".join("?" * len(positions))
+        rows = self._query(f"SELECT pos, text, metadata FROM chunks WHERE pos IN ({marks})", [int(p) for p in positions])
+        return {pos: Document(page_content=text, metadata=json.loads(md)) for pos, text, md in rows}
+
+    def search_text(self, query: str, k: int) -> List[Tuple[int, float]]:
+        "BM25 top-k as (position, score); higher scores are better"
+        match = fts_query(query)
+        if not match:
+            return []
+        rows = self._query("SELECT rowid, rank FROM chunks_fts WHERE chunks_fts MATCH ? ORDER BY rank LIMIT ?",
+                           (match, k))
+        # rank is sqlite's bm25(), negated so that ascending order ranks best first
+        return [(pos, -score) for pos, score in rows]
+
+    def positions(self) -> List[int]:
+        return [r[0] for r in self._query("SELECT pos FROM chunks ORDER BY pos")]
+
+    @staticmethod
+    def insert_chunks(conn: sqlite3.Connection, start: int, ids: Sequence[str], docs: Sequence[Document]):
+        conn.executemany("INSERT INTO chunks (pos, id, text, metadata) VALUES (?,?,?,?)",
+                         ((start + j, i, d.page_content, json.dumps(d.metadata, ensure_ascii=False, default=str))
+                          for j, (i, d) in enumerate(zip(ids, docs))))
+
+    # ----------------------------- #
+    # delta segments                #
+    # ----------------------------- #
+    def segments(self) -> List[Tuple[int, int, int]]:
+        "(seq, start, count) of committed segments in write order"
+        return self._query("SELECT seq, start, count FROM segments ORDER BY seq")
+
+    def last_segment(self) -> int:
+        "seq of the newest committed segment, 0 when there is none"
+        return self._query("SELECT COALESCE(MAX(seq), 0) FROM segments")[0][0]
+
+    # ----------------------------- #
+    # ingest fingerprints           #
+    # ----------------------------- #
+    def fingerprints(self) -> Set[str]:
+        return {r[0] for r in self._query("SELECT key FROM fingerprints")}
+
+    @staticmethod
+    def insert_fingerprints(conn: sqlite3.Connection, keys: Iterable[str]):
+        conn.executemany("INSERT OR IGNORE INTO fingerprints (key) VALUES (?)", ((k,) for k in keys))
+
+
+    # ----------------------------- #
+    # near-duplicate signatures     #
+    # ----------------------------- #
+    def minhash_candidates(self, band_keys: Sequence[int]) -> List[bytes]:
+        "signatures of stored chunks that share at least one LSH band bucket"
+        if not band_keys:
+            return []
+        where = " OR ".join("(b.band=? AND b.bucket=?)" for _ in band_keys)
+        params = [v for band, key in enumerate(band_keys) for v in (band, key)]
+        rows = self._query("SELECT DISTINCT m.pos, m.signature FROM minhash_bands b "
+                           f"JOIN minhashes m ON m.pos=b.pos WHERE {where}", params)
+        return [r[1] for r in rows]
+
+    @staticmethod
+    def insert_minhashes(conn: sqlite3.Connection, start: int, minhashes: Sequence[Tuple[bytes, Sequence[int]]]):
+        "signature and band buckets of the chunks at start, start+1, ..."
+        conn.executemany("INSERT OR REPLACE INTO minhashes (pos, signature) VALUES (?,?)",
+                         ((start + j, sig) for j, (sig, _) in enumerate(minhashes)))
+        conn.executemany("INSERT INTO minhash_bands (band, bucket, pos) VALUES (?,?,?)",
+                         ((band, key, start + j) for j, (_, keys) in enumerate(minhashes)
+                          for band, key in enumerate(keys)))
+
+
+class ChunkDocstore(Docstore, AddableMixin):
+    "read-only LangChain docstore view over a ChunkStore; writes go through SegmentedFaissStore"
+    def __init__(self, store: ChunkStore):
+        self.store = store
+
+    def search(self, search: str) -> Union[str, Document]:
+        doc = self.store.get(search)
+        return doc if doc is not None else f"ID {search} not found."
+
+    def add(self, texts: Dict[str, Document]) -> None:
+        raise NotImplementedError("chunk store is append-only through SegmentedFaissStore.append")
+
+    def delete(self, ids: List) -> None:
+        raise NotImplementedError("chunk store does not support deletes")
+
+
+class ChunkIndexMap(MutableMapping):
+    "lazy FAISS position -> docstore id mapping backed by a ChunkStore"
+    def __init__(self, store: ChunkStore):
+        self.store = store
+
+    def __getitem__(self, pos: int) -> str:
+        doc_id = self.store.id_at(int(pos))
+        if doc_id is None:
+            raise KeyError(pos)
+        return doc_id
+
+    def __len__(self) -> int:
+        return self.store.count()
+
+    def __iter__(self) -> Iterator[int]:
+        return iter(self.store.positions())
+
+    def __setitem__(self, pos: int, doc_id: str):
+        raise NotImplementedError("chunk store is append-only through SegmentedFaissStore.append")
+
+    def __delitem__(self, pos: int):
+        raise NotImplementedError("chunk store does not support deletes")
@@ -5,35 +5,75 @@ from langchain.schema import Document
 from langchain_community.document_loaders import PyMuPDFLoader,Docx2txtLoader,TextLoader
 from logger.custom_logger import CustomLogger
 from exception.custom_exception import DocumentPortalException
-from typing import Iterable,Dict,List
+from typing import Iterable,Iterator,Dict,List,Tuple,TypeVar
+from itertools import islice, groupby
+from utils.parsing_service import get_parsing_service
 import sys
+import hashlib
 
 SUPPORTED_EXTENSIONS = {".pdf",".docx",".txt",".md"}
 
 log  = CustomLogger().get_logger(__name__)
 
-def load_documents(paths: Iterable[Path]) -> List[Document]:
-    "Load documents from paths"
-    docs: List[Document] = []
+T = TypeVar("T")
+
+def _loader_for(p: Path):
+    ext = p.suffix
+    if ext == ".pdf":
+        return PyMuPDFLoader(str(p))
+    elif ext == ".docx":
+        return Docx2txtLoader(str(p))
+    elif ext == ".txt":
+        return TextLoader(str(p),encoding = "utf-8")
+    return None
+
+def _iter_pdf_documents(paths: List[Path]) -> Iterator[Document]:
+    "PDF pages parsed on the process pool, split by file and page range"
+    for path, page_num, total, text in get_parsing_service().iter_pages(paths):
+        yield Document(page_content=text, metadata={"source": path, "file_path": path,
+                                                    "page": page_num - 1, "total_pages": total})
+
+def iter_documents(paths: Iterable[Path]) -> Iterator[Document]:
+    "Lazily yield documents from paths, one PDF page at a time"
     try:
-        for p in paths:
-            ext = p.suffix
-            if ext == ".pdf":
-                loader = PyMuPDFLoader(str(p))
-            elif ext == ".docx":
-                loader = Docx2txtLoader(str(p))
-            elif ext == ".txt":
-                loader = TextLoader(str(p),encoding = "utf-8")
-            else:
-                log.warning("Unsupported extensions skipped",path =str(p))
+        # consecutive PDFs are handed to the parsing pool together so files parse in parallel
+        for is_pdf, group in groupby(paths, key=lambda p: p.suffix == ".pdf"):
+            if is_pdf:
+                yield from _iter_pdf_documents(list(group))
                 continue
-            docs.extend(loader.load())
-        log.info("document loaded successfully", count =len(docs), path=str(p))
-        return docs
+            for p in group:
+                loader = _loader_for(p)
+                if loader is None:
+                    log.warning("Unsupported extensions skipped",path =str(p))
+                    continue
+                count = 0
+                for doc in loader.lazy_load():
+                    count += 1
+                    yield doc
+                log.info("document streamed successfully", pages=count, path=str(p))
     except Exception as e:
         log.error("failed to load documents", error=str(e))
         raise DocumentPortalException("failed to load documents", sys) from e
 
+def load_documents(paths: Iterable[Path]) -> List[Document]:
+    "Load documents from paths"
+    docs = list(iter_documents(paths))
+    log.info("document loaded successfully", count =len(docs))
+    return docs
+
+def iter_pdf_pages(pdf_path, skip_empty: bool = False) -> Iterator[Tuple[int,str]]:
+    "Yield (page_number, text) pairs without keeping earlier pages in memory"
+    yield from get_parsing_service().iter_pdf_pages(pdf_path, skip_empty=skip_empty)
+
+def batched(items: Iterable[T], size: int) -> Iterator[List[T]]:
+    "Yield lists of at most `size` items"
+    it = iter(items)
+    while True:
+        window = list(islice(it, max(1, size)))
+        if not window:
+            return
+        yield window
+
 def concat_for_analysis(docs: List[Document]) ->str:
     parts = []
     for d in docs:
@@ -54,6 +94,14 @@ class FastAPIFileAdaptor:
     def getbuffer(self):
         self._uf.file.seek(0)
         return self._uf.file.read()
+    def sha256(self) -> str:
+        "content hash of the upload, read in blocks so large files are not held twice"
+        digest = hashlib.sha256()
+        self._uf.file.seek(0)
+        for block in iter(lambda: self._uf.file.read(1024 * 1024), b""):
+            digest.update(block)
+        self._uf.file.seek(0)
+        return digest.hexdigest()
 def read_pdf_via_handler(handler,path: str) ->str:
     if hasattr(handler, "read_files"):
         return handler.read_files(path)
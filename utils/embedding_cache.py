@@ -0,0 +1,202 @@
+from __future__ import annotations
+import hashlib
+import json
+import os
+import re
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from logger.custom_logger import CustomLogger
+from utils.metrics import record_cache
+
+try:
+    import fcntl
+except ImportError:  # windows: fall back to the in-process lock only
+    fcntl = None
+
+log = CustomLogger().get_logger(__name__)
+
+EMBEDDING_CACHE_DIR = os.getenv("EMBEDDING_CACHE_DIR", "embedding_cache")
+
+
+def content_key(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    """Persistent, content-addressed embedding store for one embedding model.
+
+    Vectors live in a raw float32 file that is read through ``np.memmap`` and
+    row ``i`` belongs to line ``i`` of ``keys.txt``. Both files are append-only,
+    so a reader only trusts rows that are complete in both.
+    """
+    def __init__(self, model_name: str, cache_dir: str = EMBEDDING_CACHE_DIR):
+        slug = re.sub(r"[^a-zA-Z0-9_.\-]", "_", model_name or "unknown")
+        self.model_name = model_name
+        self.dir = Path(cache_dir) / slug
+        self.dir.mkdir(parents=True, exist_ok=True)
+        self.keys_path = self.dir / "keys.txt"
+        self.vectors_path = self.dir / "vectors.f32"
+        self.meta_path = self.dir / "meta.json"
+        self.lock_path = self.dir / ".lock"
+        self._lock = threading.RLock()
+        self._index: Dict[str, int] = {}
+        self._matrix: Optional[np.memmap] = None
+        self._rows = 0
+        self._keys_offset = 0
+        self.dim: Optional[int] = None
+        if self.meta_path.exists():
+            self.dim = int(json.loads(self.meta_path.read_text(encoding="utf-8"))["dim"])
+        self._refresh()
+
+    def _refresh(self):
+        "pick up rows appended since the last read (possibly by another process)"
+        if self.dim is None or not self.vectors_path.exists() or not self.keys_path.exists():
+            return
+        rows = self.vectors_path.stat().st_size // (self.dim * 4)
+        if rows == self._rows and self._matrix is not None:
+            return
+        with open(self.keys_path, "r", encoding="utf-8") as f:
+            f.seek(self._keys_offset)
+            row = len(self._index)
+            while row < rows:
+                line = f.readline()
+                if not line.endswith("\n"):
+                    break
+                self._keys_offset += len(line.encode("utf-8"))
+                self._index.setdefault(line.strip(), row)
+                row += 1
+        self._rows = row
+        self._matrix = np.memmap(self.vectors_path, dtype=np.float32, mode="r", shape=(row, self.dim)) if row else None
+
+    def _truncate_partial_writes(self):
+        "drop vector rows or key bytes left behind by an interrupted append"
+        if self.vectors_path.exists() and self.vectors_path.stat().st_size > self._rows * self.dim * 4:
+            os.truncate(self.vectors_path, self._rows * self.dim * 4)
+        if self.keys_path.exists() and self.keys_path.stat().st_size > self._keys_offset:
+            os.truncate(self.keys_path, self._keys_offset)
+
+    def __len__(self) -> int:
+        return self._rows
+
+    def get_many(self, keys: Sequence[str]) -> List[Optional[List[float]]]:
+        "return cached vectors (None for misses) in the order of keys"
+        with self._lock:
+            if any(k not in self._index for k in keys):
+                self._refresh()
+            out: List[Optional[List[float]]] = []
+            for k in keys:
+                row = self._index.get(k)
+                if row is None or self._matrix is None or row >= self._rows:
+                    out.append(None)
+                else:
+                    out.append(self._matrix[row].tolist())
+            return out
+
+    def put_many(self, keys: Sequence[str], vectors: Sequence[Sequence[float]]):
+        "append new vectors; keys that are already cached are skipped"
+        if not keys:
+            return
+        arr = np.asarray(vectors, dtype=np.float32)
+        with self._lock:
+            if self.dim is None:
+                self.dim = int(arr.shape[1])
+                self.meta_path.write_text(json.dumps({"model": self.model_name, "dim": self.dim}), encoding="utf-8")
+            if arr.shape[1] != self.dim:
+                log.warning("embedding dimension changed, cache write skipped", expected=self.dim, got=int(arr.shape[1]))
+                return
+            with open(self.lock_path, "a") as lock_file:
+                if fcntl is not None:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    self._refresh()
+                    self._truncate_partial_writes()
+                    fresh = [i for i, k in enumerate(keys) if k not in self._index]
+                    fresh = list({keys[i]: i for i in fresh}.values())
+                    if not fresh:
+                        return
+                    with open(self.vectors_path, "ab") as f:
+                        f.write(arr[fresh].tobytes())
+                    with open(self.keys_path, "a", encoding="utf-8") as f:
+                        f.write("".join(f"{keys[i]}\n" for i in fresh))
+                    self._refresh()
+                finally:
+                    if fcntl is not None:
+                        fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+_CACHES: Dict[Tuple[str, str], EmbeddingCache] = {}
+_CACHES_LOCK = threading.Lock()
+
+
+def get_embedding_cache(model_name: str, cache_dir: str = EMBEDDING_CACHE_DIR) -> EmbeddingCache:
+    "one cache per model and directory in the process, so keys.txt is indexed once and then read incrementally"
+    key = (model_name, str(Path(cache_dir).resolve()))
+    with _CACHES_LOCK:
+        if key not in _CACHES:
+            _CACHES[key] = EmbeddingCache(model_name, cache_dir)
+        return _CACHES[key]
+
+
+class CachedEmbeddings(Embeddings):
+    "Embeddings wrapper that only sends cache misses to the underlying model"
+    def __init__(self, underlying: Embeddings, model_name: Optional[str] = None,
+                 cache_dir: str = EMBEDDING_CACHE_DIR):
+        self.underlying = underlying
+        self.model_name = model_name or getattr(underlying, "model", None) or type(underlying).__name__
+        self.cache = get_embedding_cache(self.model_name, cache_dir)
+        self.hits = 0
+        self.misses = 0
+
+    def _lookup(self, texts: List[str]):
+        keys = [content_key(t) for t in texts]
+        vectors = self.cache.get_many(keys)
+        missing: Dict[str, int] = {}
+        for i, v in enumerate(vectors):
+            if v is None:
+                missing.setdefault(keys[i], i)
+        hits = sum(1 for v in vectors if v is not None)
+        self.hits += hits
+        self.misses += len(missing)
+        record_cache("embedding", hits=hits, misses=len(missing))
+        return keys, vectors, missing
+
+    @staticmethod
+    def _fill(keys, vectors, missing, computed):
+        by_key = dict(zip(missing.keys(), computed))
+        return [v if v is not None else list(by_key[k]) for k, v in zip(keys, vectors)]
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        keys, vectors, missing = self._lookup(texts)
+        computed: List[List[float]] = []
+        if missing:
+            computed = self.underlying.embed_documents([texts[i] for i in missing.values()])
+            self.cache.put_many(list(missing.keys()), computed)
+        return self._fill(keys, vectors, missing, computed)
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        keys, vectors, missing = self._lookup(texts)
+        computed: List[List[float]] = []
+        if missing:
+            computed = await self.underlying.aembed_documents([texts[i] for i in missing.values()])
+            self.cache.put_many(list(missing.keys()), computed)
+        return self._fill(keys, vectors, missing, computed)
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.underlying.embed_query(text)
+
+    async def aembed_query(self, text: str) -> List[float]:
+        return await self.underlying.aembed_query(text)
+
+    def stats(self) -> Dict[str, float]:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+            "cached_vectors": len(self.cache),
+        }
@@ -0,0 +1,230 @@
+from __future__ import annotations
+import asyncio
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Any, Dict, List, Optional, Tuple
+
+from langchain_core.embeddings import Embeddings
+
+from logger.custom_logger import CustomLogger
+from utils.token_counter import count_tokens_batch
+
+log = CustomLogger().get_logger(__name__)
+
+_EXECUTOR: Optional[ThreadPoolExecutor] = None
+_EXECUTOR_LOCK = threading.Lock()
+
+
+def _executor() -> ThreadPoolExecutor:
+    global _EXECUTOR
+    if _EXECUTOR is None:
+        with _EXECUTOR_LOCK:
+            if _EXECUTOR is None:
+                _EXECUTOR = ThreadPoolExecutor(max_workers=int(os.getenv("EMBEDDING_POOL_SIZE", "16")),
+                                               thread_name_prefix="embed")
+    return _EXECUTOR
+
+
+def is_rate_limit_error(e: BaseException) -> bool:
+    if getattr(e, "status_code", None) == 429 or getattr(getattr(e, "response", None), "status_code", None) == 429:
+        return True
+    msg = f"{type(e).__name__} {e}".lower()
+    return "ratelimit" in msg or "rate limit" in msg or "429" in msg
+
+
+def _retry_after(e: BaseException) -> Optional[float]:
+    headers = getattr(getattr(e, "response", None), "headers", None) or {}
+    try:
+        value = headers.get("retry-after")
+        return float(value) if value is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+class AdaptiveLimiter:
+    """Bounds in-flight embedding batches for one provider model.
+
+    The limit is halved on every 429 and grows back by one after a run of
+    successful batches (AIMD), so concurrency settles just under the
+    provider's rate limit.
+    """
+    def __init__(self, max_concurrency: int):
+        self.max_concurrency = max(1, max_concurrency)
+        self.limit = self.max_concurrency
+        self.in_flight = 0
+        self._successes = 0
+        self._cond = threading.Condition()
+
+    def acquire(self):
+        with self._cond:
+            while self.in_flight >= self.limit:
+                self._cond.wait()
+            self.in_flight += 1
+
+    def try_acquire(self) -> bool:
+        with self._cond:
+            if self.in_flight >= self.limit:
+                return False
+            self.in_flight += 1
+            return True
+
+    async def aacquire(self, poll: float = 0.01):
+        "acquire from a coroutine; polls so the event loop is never blocked on the condition"
+        while not self.try_acquire():
+            await asyncio.sleep(poll)
+
+    def release(self):
+        with self._cond:
+            self.in_flight -= 1
+            self._cond.notify_all()
+
+    def on_success(self):
+        with self._cond:
+            self._successes += 1
+            if self.limit < self.max_concurrency and self._successes >= self.limit * 2:
+                self.limit += 1
+                self._successes = 0
+                self._cond.notify_all()
+
+    def on_rate_limit(self):
+        with self._cond:
+            self.limit = max(1, self.limit // 2)
+            self._successes = 0
+        log.warning("embedding rate limited, reducing concurrency", limit=self.limit)
+
+
+_LIMITERS: Dict[Tuple[str, int], AdaptiveLimiter] = {}
+
+
+def get_limiter(model_name: str, max_concurrency: int) -> AdaptiveLimiter:
+    "one limiter per provider model, shared by every request in the process"
+    key = (model_name, max_concurrency)
+    with _EXECUTOR_LOCK:
+        if key not in _LIMITERS:
+            _LIMITERS[key] = AdaptiveLimiter(max_concurrency)
+        return _LIMITERS[key]
+
+
+class BatchedEmbeddings(Embeddings):
+    "Embeddings wrapper that sends bounded, concurrent batches and backs off on rate limits"
+    def __init__(self, underlying: Embeddings, batch_size: int = 256, max_batch_tokens: int = 200_000,
+                 max_concurrency: int = 4, max_retries: int = 6, base_delay: float = 1.0, max_delay: float = 60.0):
+        self.underlying = underlying
+        self.model = getattr(underlying, "model", None) or type(underlying).__name__
+        self.batch_size = max(1, batch_size)
+        self.max_batch_tokens = max(1, max_batch_tokens)
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.limiter = get_limiter(self.model, max_concurrency)
+
+    @classmethod
+    def from_config(cls, underlying: Embeddings, config: Optional[Dict[str, Any]] = None) -> "BatchedEmbeddings":
+        "build from the `embedding_pipeline` block of config.yaml"
+        return cls(underlying, **(config or {}))
+
+    def plan_batches(self, texts: List[str]) -> List[Tuple[int, int]]:
+        "contiguous [start, end) ranges capped by text count and token budget"
+        batches: List[Tuple[int, int]] = []
+        start, tokens = 0, 0
+        for i, n in enumerate(count_tokens_batch(texts)):
+            if i > start and (i - start >= self.batch_size or tokens + n > self.max_batch_tokens):
+                batches.append((start, i))
+                start, tokens = i, 0
+            tokens += n
+        if start < len(texts):
+            batches.append((start, len(texts)))
+        return batches
+
+    def _delay(self, attempt: int, e: BaseException) -> float:
+        retry_after = _retry_after(e)
+        if retry_after is not None:
+            return min(self.max_delay, retry_after)
+        return min(self.max_delay, self.base_delay * (2 ** attempt)) * random.uniform(0.5, 1.0)
+
+    def _embed_batch(self, texts: List[str]) -> List[List[float]]:
+        for attempt in range(self.max_retries + 1):
+            try:
+                vectors = self.underlying.embed_documents(texts)
+                self.limiter.on_success()
+                return vectors
+            except Exception as e:
+                if not is_rate_limit_error(e) or attempt == self.max_retries:
+                    raise
+                self.limiter.on_rate_limit()
+                time.sleep(self._delay(attempt, e))
+        raise RuntimeError("unreachable")
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        if not texts:
+            return []
+        batches = self.plan_batches(texts)
+        if len(batches) == 1:
+            # no pool hop for a single batch, but it still counts against the shared budget
+            self.limiter.acquire()
+            try:
+                return self._embed_batch(texts)
+            finally:
+                self.limiter.release()
+        results: List[Optional[List[List[float]]]] = [None] * len(batches)
+        pending = {}
+        started = time.perf_counter()
+        try:
+            for i, (s, e) in enumerate(batches):
+                self.limiter.acquire()
+                fut = _executor().submit(self._embed_batch, texts[s:e])
+                fut.add_done_callback(lambda _f: self.limiter.release())
+                pending[fut] = i
+                # surface failures early instead of queueing the whole document
+                done = [f for f in pending if f.done()]
+                for f in done:
+                    results[pending.pop(f)] = f.result()
+            while pending:
+                done, _ = wait(list(pending), return_when=FIRST_COMPLETED)
+                for f in done:
+                    results[pending.pop(f)] = f.result()
+        except Exception:
+            for f in pending:
+                f.cancel()
+            raise
+        log.info("embedded documents in batches", texts=len(texts), batches=len(batches),
+                 concurrency=self.limiter.limit, seconds=round(time.perf_counter() - started, 3))
+        return [v for batch in results for v in batch]  # type: ignore[union-attr]
+
+    async def _aembed_batch(self, texts: List[str]) -> List[List[float]]:
+        for attempt in range(self.max_retries + 1):
+            try:
+                vectors = await self.underlying.aembed_documents(texts)
+                self.limiter.on_success()
+                return vectors
+            except Exception as e:
+                if not is_rate_limit_error(e) or attempt == self.max_retries:
+                    raise
+                self.limiter.on_rate_limit()
+                await asyncio.sleep(self._delay(attempt, e))
+        raise RuntimeError("unreachable")
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        if not texts:
+            return []
+        batches = self.plan_batches(texts)
+
+        # same limiter as the sync path, so async and threaded callers share one budget and its backoff
+        async def run(s: int, e: int):
+            await self.limiter.aacquire()
+            try:
+                return await self._aembed_batch(texts[s:e])
+            finally:
+                self.limiter.release()
+
+        results = await asyncio.gather(*(run(s, e) for s, e in batches))
+        return [v for batch in results for v in batch]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.underlying.embed_query(text)
+
+    async def aembed_query(self, text: str) -> List[float]:
+        return await self.underlying.aembed_query(text)
@@ -0,0 +1,372 @@
+from __future__ import annotations
+import json
+import os
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+import faiss
+import numpy as np
+from langchain.schema import Document
+from langchain_community.vectorstores import FAISS
+
+from logger.custom_logger import CustomLogger
+from utils.chunk_store import ChunkDocstore, ChunkIndexMap, ChunkStore
+from utils.metrics import timed
+
+try:
+    import fcntl
+except ImportError:  # windows: fall back to the in-process lock only
+    fcntl = None
+
+log = CustomLogger().get_logger(__name__)
+
+FAISS_COMPACT_SEGMENTS = int(os.getenv("FAISS_COMPACT_SEGMENTS", "16"))
+FAISS_MMAP = os.getenv("FAISS_MMAP", "true").lower() == "true"
+
+_DIR_LOCKS: Dict[str, threading.RLock] = {}
+_DIR_LOCKS_GUARD = threading.Lock()
+_COMPACTOR = ThreadPoolExecutor(max_workers=1, thread_name_prefix="faiss-compact")
+_SCHEDULED: Set[str] = set()
+
+INDEX_TYPES = ("flat", "ivf_flat", "ivf_pq", "hnsw")
+DEFAULT_INDEX_CONFIG: Dict[str, Any] = {
+    "type": "auto",
+    "auto_threshold": 200_000,
+    "auto_type": "ivf_pq",
+    "nlist": 0,
+    "nprobe": 16,
+    "pq_m": 16,
+    "pq_nbits": 8,
+    "hnsw_m": 32,
+    "ef_construction": 200,
+    "ef_search": 64,
+}
+
+
+def index_settings(config: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    return {**DEFAULT_INDEX_CONFIG, **(config or {})}
+
+
+def select_index_type(n_vectors: int, config: Optional[Dict[str, Any]] = None) -> str:
+    "flat below the corpus-size threshold, the configured approximate type above it (type: auto)"
+    cfg = index_settings(config)
+    if cfg["type"] != "auto":
+        return cfg["type"]
+    return cfg["auto_type"] if n_vectors >= cfg["auto_threshold"] else "flat"
+
+
+def build_index(vectors: np.ndarray, index_type: str, config: Optional[Dict[str, Any]] = None) -> faiss.Index:
+    "build (and train, for IVF types) an L2 index of the given type holding `vectors`"
+    cfg = index_settings(config)
+    n, dim = vectors.shape
+    if index_type == "flat":
+        index = faiss.IndexFlatL2(dim)
+    elif index_type == "hnsw":
+        index = faiss.IndexHNSWFlat(dim, int(cfg["hnsw_m"]))
+        index.hnsw.efConstruction = int(cfg["ef_construction"])
+    elif index_type in ("ivf_flat", "ivf_pq"):
+        # ~39 training points per centroid keeps k-means well conditioned
+        nlist = int(cfg["nlist"]) or int(4 * np.sqrt(n))
+        nlist = max(1, min(nlist, n // 39 or 1))
+        quantizer = faiss.IndexFlatL2(dim)
+        if index_type == "ivf_flat":
+            index = faiss.IndexIVFFlat(quantizer, dim, nlist)
+        else:
+            pq_m = int(cfg["pq_m"])
+            if dim % pq_m:
+                raise ValueError(f"pq_m={pq_m} must divide the embedding dimension {dim}")
+            index = faiss.IndexIVFPQ(quantizer, dim, nlist, pq_m, int(cfg["pq_nbits"]))
+        index.train(vectors)
+    else:
+        raise ValueError(f"unsupported faiss index type {index_type}, expected one of {INDEX_TYPES}")
+    index.add(vectors)
+    apply_search_params(index, cfg)
+    return index
+
+
+def apply_search_params(index: faiss.Index, config: Optional[Dict[str, Any]] = None):
+    "set query-time knobs (nprobe / efSearch) on a loaded or freshly built index"
+    cfg = index_settings(config)
+    try:
+        faiss.extract_index_ivf(index).nprobe = int(cfg["nprobe"])
+    except RuntimeError:
+        pass
+    if isinstance(index, faiss.IndexHNSW):
+        index.hnsw.efSearch = int(cfg["ef_search"])
+
+
+def index_vectors(index: faiss.Index) -> np.ndarray:
+    "stored vectors of an index (approximations for PQ, which does not keep the originals)"
+    try:
+        faiss.extract_index_ivf(index).make_direct_map()
+    except RuntimeError:
+        pass
+    return index.reconstruct_n(0, index.ntotal)
+
+
+def index_type_of(index: faiss.Index) -> str:
+    if isinstance(index, faiss.IndexHNSW):
+        return "hnsw"
+    if isinstance(index, faiss.IndexIVFPQ):
+        return "ivf_pq"
+    if isinstance(index, faiss.IndexIVFFlat):
+        return "ivf_flat"
+    return "flat"
+
+
+class SegmentedFaissStore:
+    """Append-friendly on-disk layout for one FAISS index directory.
+
+    * ``index.faiss`` is the base vector index (``faiss.write_index``), opened
+      memory-mapped where the index type allows it
+    * ``chunks.sqlite`` (:class:`ChunkStore`) holds chunk text and metadata
+      keyed by FAISS position, the delta segment table and ingest fingerprints
+    * ``segments/<seq>.npy`` holds vectors added after the base was written;
+      a segment counts once its row is committed in ``chunks.sqlite``
+
+    Writing a delta therefore costs O(delta), and nothing is unpickled: a load
+    reads the vector index and replays segments, while documents are fetched
+    per search hit. ``compact`` folds segments back into a fresh base in the
+    background once there are too many.
+    """
+    def __init__(self, index_dir, index_name: str = "index", index_config: Optional[Dict[str, Any]] = None):
+        self.index_dir = Path(index_dir)
+        self.index_name = index_name
+        self.index_path = self.index_dir / f"{index_name}.faiss"
+        self.index_config_path = self.index_dir / f"{index_name}.config.json"
+        if index_config is None and self.index_config_path.exists():
+            index_config = json.loads(self.index_config_path.read_text(encoding="utf-8"))
+        self.index_config = index_settings(index_config)
+        self.segments_dir = self.index_dir / "segments"
+        self.chunks = ChunkStore(self.index_dir / f"{index_name}.chunks.sqlite")
+        self.lock_path = self.index_dir / ".lock"
+        key = str(self.index_dir.resolve())
+        with _DIR_LOCKS_GUARD:
+            self._thread_lock = _DIR_LOCKS.setdefault(key, threading.RLock())
+        if (self.index_dir / f"{index_name}.pkl").exists():
+            self._migrate_legacy()
+
+    def exists(self) -> bool:
+        return self.index_path.exists()
+
+    @contextmanager
+    def lock(self, shared: bool = False):
+        "shared lock for readers, exclusive for writers and compaction (cross-process via flock)"
+        self.index_dir.mkdir(parents=True, exist_ok=True)
+        with self._thread_lock:
+            with open(self.lock_path, "a") as lock_file:
+                if fcntl is not None:
+                    fcntl.flock(lock_file, fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    if fcntl is not None:
+                        fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _segment_path(self, seq: int) -> Path:
+        return self.segments_dir / f"{seq:08d}.npy"
+
+    def segment_count(self) -> int:
+        return len(self.chunks.segments())
+
+    def generation(self) -> Optional[Tuple[int, int, int, int]]:
+        "changes whenever a base index is written or a delta segment is committed, by any process"
+        try:
+            st = os.stat(self.index_path)
+        except FileNotFoundError:
+            return None
+        return (st.st_ino, st.st_mtime_ns, st.st_size, self.chunks.last_segment())
+
+    # ----------------------------- #
+    # fingerprints                  #
+    # ----------------------------- #
+    def read_fingerprints(self) -> Set[str]:
+        return self.chunks.fingerprints()
+
+    def append_fingerprints(self, keys: Iterable[str]):
+        with self.chunks.transaction() as conn:
+            ChunkStore.insert_fingerprints(conn, keys)
+
+    # ----------------------------- #
+    # read path                     #
+    # ----------------------------- #
+    def _read_index(self, mmap: bool = FAISS_MMAP) -> faiss.Index:
+        if mmap:
+            try:
+                return faiss.read_index(str(self.index_path), faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY)
+            except RuntimeError:
+                pass  # index type without mmap support
+        return faiss.read_index(str(self.index_path))
+
+    @staticmethod
+    def _accepts_adds(index: faiss.Index) -> bool:
+        "memory-mapped IVF lists are read-only on-disk storage: add() raises (ivf_pq) or aborts the process (ivf_flat)"
+        return index_type_of(index) not in ("ivf_flat", "ivf_pq")
+
+    def _vectorstore(self, embeddings, index: faiss.Index) -> FAISS:
+        return FAISS(embeddings, index, ChunkDocstore(self.chunks), ChunkIndexMap(self.chunks))
+
+    def load(self, embeddings, writable: bool = False) -> FAISS:
+        """open the base index and replay every committed delta segment onto it;
+        writable=True when the caller will add vectors to the returned index"""
+        with self.lock(shared=True), timed("index_load"):
+            return self._load(embeddings, writable)
+
+    def _load(self, embeddings, writable: bool = False) -> FAISS:
+        index = self._read_index(FAISS_MMAP and not writable)
+        # segments already folded into the base by an interrupted compaction are skipped
+        pending = [seq for seq, start, count in self.chunks.segments() if start + count > index.ntotal]
+        if pending and not self._accepts_adds(index):
+            index = self._read_index(mmap=False)
+        apply_search_params(index, self.index_config)
+        for seq in pending:
+            index.add(np.load(self._segment_path(seq)))
+        if pending:
+            log.info("faiss delta segments replayed", index_dir=str(self.index_dir), segments=len(pending))
+        return self._vectorstore(embeddings, index)
+
+    # ----------------------------- #
+    # write path                    #
+    # ----------------------------- #
+    def _maybe_retype(self, vs: FAISS):
+        "swap a flat index for the configured approximate type once the corpus crosses the threshold"
+        current = index_type_of(vs.index)
+        target = select_index_type(vs.index.ntotal, self.index_config)
+        if target == current or current != "flat":
+            # approximate indexes are already trained and absorb new vectors; only flat is rebuilt
+            return
+        vs.index = build_index(index_vectors(vs.index), target, self.index_config)
+        log.info("faiss index type changed", index_dir=str(self.index_dir), from_type=current, to_type=target,
+                 vectors=vs.index.ntotal)
+
+    def _write_base(self, vs: FAISS):
+        "write the vector index to a temp file, then swap it in"
+        self._maybe_retype(vs)
+        tmp_config = self.index_config_path.with_suffix(".tmp")
+        tmp_config.write_text(json.dumps(self.index_config), encoding="utf-8")
+        os.replace(tmp_config, self.index_config_path)
+        tmp_index = self.index_dir / f".{self.index_name}.faiss.tmp"
+        faiss.write_index(vs.index, str(tmp_index))
+        os.replace(tmp_index, self.index_path)
+
+    def create(self, vs: FAISS, fingerprints: Iterable[str] = (), minhashes: Sequence[Tuple[bytes, Sequence[int]]] = ()):
+        "persist a freshly built in-memory vectorstore and switch it over to the chunk store"
+        ids = [vs.index_to_docstore_id[i] for i in range(vs.index.ntotal)]
+        docs = [vs.docstore.search(i) for i in ids]
+        with self.lock(), timed("index_save"):
+            with self.chunks.transaction() as conn:
+                # clear leftovers of a create that died before index.faiss was written
+                conn.execute("DELETE FROM chunks")
+                conn.execute("DELETE FROM segments")
+                conn.execute("DELETE FROM minhashes")
+                conn.execute("DELETE FROM minhash_bands")
+                ChunkStore.insert_chunks(conn, 0, ids, docs)
+                ChunkStore.insert_fingerprints(conn, fingerprints)
+                ChunkStore.insert_minhashes(conn, 0, minhashes)
+            self._write_base(vs)
+        vs.docstore = ChunkDocstore(self.chunks)
+        vs.index_to_docstore_id = ChunkIndexMap(self.chunks)
+
+    def append(self, vectors: Sequence[Sequence[float]], docs: Sequence[Document], ids: Optional[List[str]] = None,
+               fingerprints: Iterable[str] = (), minhashes: Sequence[Tuple[bytes, Sequence[int]]] = ()) -> List[str]:
+        "persist a delta: vectors as a new segment, documents, fingerprints and minhashes in one chunk store transaction"
+        ids = ids or [str(uuid.uuid4()) for _ in docs]
+        arr = np.asarray(vectors, dtype=np.float32)
+        with self.lock(), timed("index_save"):
+            self.segments_dir.mkdir(parents=True, exist_ok=True)
+            with self.chunks.transaction() as conn:
+                start = conn.execute("SELECT COUNT(*) FROM chunks").fetchone()[0]
+                seq = conn.execute("SELECT COALESCE(MAX(seq), 0) + 1 FROM segments").fetchone()[0]
+                # the vectors land first; the segment row committed below is what makes them visible
+                np.save(self._segment_path(seq), arr)
+                ChunkStore.insert_chunks(conn, start, ids, docs)
+                conn.execute("INSERT INTO segments (seq, start, count) VALUES (?,?,?)", (seq, start, len(ids)))
+                ChunkStore.insert_fingerprints(conn, fingerprints)
+                ChunkStore.insert_minhashes(conn, start, minhashes)
+        return ids
+
+    def compact(self, embeddings, rebuild: bool = False) -> Optional[FAISS]:
+        "fold all delta segments into a new base; rebuild=True also rebuilds the index from scratch"
+        with self.lock(), timed("index_compact"):
+            segments = self.chunks.segments()
+            if not segments and not rebuild:
+                return None
+            vs = self._load(embeddings, writable=True)
+            if rebuild:
+                vs.index = build_index(index_vectors(vs.index), select_index_type(vs.index.ntotal, self.index_config),
+                                       self.index_config)
+            self._write_base(vs)
+            with self.chunks.transaction() as conn:
+                conn.execute("DELETE FROM segments")
+            for seq, _, _ in segments:
+                self._segment_path(seq).unlink(missing_ok=True)
+        log.info("faiss index compacted", index_dir=str(self.index_dir), segments=len(segments),
+                 vectors=vs.index.ntotal, index_type=index_type_of(vs.index))
+        return vs
+
+    def _migrate_legacy(self):
+        "one-time conversion of a save_local (index.pkl) directory written by older releases"
+        import pickle
+
+        pkl = self.index_dir / f"{self.index_name}.pkl"
+        with self.lock():
+            if not pkl.exists():
+                return
+            index = faiss.read_index(str(self.index_path))
+            with open(pkl, "rb") as f:
+                docstore, index_to_id = pickle.load(f)  # trusted: written by this service
+            ids = [index_to_id[i] for i in range(index.ntotal)]
+            docs = [docstore.search(i) for i in ids]
+            meta_path = self.index_dir / "ingested_meta.json"
+            fingerprints: Set[str] = set()
+            if meta_path.exists():
+                fingerprints.update((json.loads(meta_path.read_text(encoding="utf-8")) or {}).get("rows", {}))
+
+            with self.chunks.transaction() as conn:
+                conn.execute("DELETE FROM chunks")
+                conn.execute("DELETE FROM segments")
+                conn.execute("DELETE FROM minhashes")
+                conn.execute("DELETE FROM minhash_bands")
+                ChunkStore.insert_chunks(conn, 0, ids, docs)
+                # legacy chunks have no MinHash signatures; only chunks indexed from now on are near-dup candidates
+                ChunkStore.insert_fingerprints(conn, fingerprints)
+            for path in (meta_path, pkl):
+                path.unlink(missing_ok=True)
+        log.info("legacy faiss index migrated to chunk store", index_dir=str(self.index_dir), vectors=len(ids))
+
+    def maybe_schedule_compaction(self, embeddings, on_done=None, threshold: int = FAISS_COMPACT_SEGMENTS):
+        "queue a background compaction once the segment count reaches the threshold"
+        key = str(self.index_dir.resolve())
+        if self.segment_count() < threshold:
+            return
+        with _DIR_LOCKS_GUARD:
+            if key in _SCHEDULED:
+                return
+            _SCHEDULED.add(key)
+
+        def run():
+            try:
+                self.compact(embeddings)
+                if on_done is not None:
+                    on_done()
+            except Exception as e:
+                log.error("faiss compaction failed", index_dir=key, error=str(e))
+            finally:
+                with _DIR_LOCKS_GUARD:
+                    _SCHEDULED.discard(key)
+
+        _COMPACTOR.submit(run)
+
+
+def load_faiss_index(index_dir, embeddings, index_name: str = "index") -> FAISS:
+    "load a FAISS index directory including any delta segments"
+    return SegmentedFaissStore(index_dir, index_name).load(embeddings)
+
+
+def rebuild_index(index_dir, embeddings, index_config: Dict[str, Any], index_name: str = "index") -> FAISS:
+    "rebuild an existing index directory with a new index type / parameters (folds pending segments too)"
+    return SegmentedFaissStore(index_dir, index_name, index_config).compact(embeddings, rebuild=True)
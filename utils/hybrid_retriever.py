@@ -0,0 +1,68 @@
+from __future__ import annotations
+import asyncio
+from typing import Dict, List, Sequence
+
+import numpy as np
+from langchain.schema import Document
+from langchain_community.vectorstores import FAISS
+from langchain_core.callbacks import AsyncCallbackManagerForRetrieverRun, CallbackManagerForRetrieverRun
+from langchain_core.retrievers import BaseRetriever
+from pydantic import ConfigDict
+
+from utils.chunk_store import ChunkDocstore, ChunkStore
+
+
+def reciprocal_rank_fusion(rankings: Sequence[Sequence[int]], rrf_k: int = 60,
+                           weights: Sequence[float] = ()) -> List[int]:
+    "fuse ranked id lists by sum(weight / (rrf_k + rank)); ties keep first-seen order"
+    scores: Dict[int, float] = {}
+    for i, ranking in enumerate(rankings):
+        weight = weights[i] if i < len(weights) else 1.0
+        for rank, item in enumerate(ranking, start=1):
+            scores[item] = scores.get(item, 0.0) + weight / (rrf_k + rank)
+    return sorted(scores, key=lambda item: -scores[item])
+
+
+class HybridRetriever(BaseRetriever):
+    """BM25 + dense retrieval over one index directory, fused with reciprocal-rank fusion.
+
+    Both rankers return ``fetch_k`` candidates as FAISS positions. The lexical
+    side is the FTS5 index kept in the same chunk store, so exact identifiers
+    (clause numbers, SKUs, names) surface even when their embedding is not
+    close. Only the fused top ``k`` documents are read from the store.
+    """
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    vectorstore: FAISS
+    chunks: ChunkStore
+    k: int = 5
+    # deeper candidate lists let weak matches that appear in both rankings outvote a strong single-list hit
+    fetch_k: int = 10
+    rrf_k: int = 60
+    dense_weight: float = 1.0
+    lexical_weight: float = 1.0
+
+    @classmethod
+    def from_vectorstore(cls, vectorstore: FAISS, k: int = 5, fetch_k: int = 0, **kwargs) -> "HybridRetriever":
+        if not isinstance(vectorstore.docstore, ChunkDocstore):
+            raise ValueError("hybrid retrieval needs a vectorstore loaded through SegmentedFaissStore")
+        return cls(vectorstore=vectorstore, chunks=vectorstore.docstore.store, k=k,
+                   fetch_k=fetch_k or max(2 * k, 10), **kwargs)
+
+    def search_by_vector(self, query: str, embedding: List[float]) -> List[Document]:
+        "fused results for a query whose embedding the caller already has"
+        _, found = self.vectorstore.index.search(np.asarray([embedding], dtype=np.float32), self.fetch_k)
+        dense = [int(p) for p in found[0] if p != -1]
+        lexical = [pos for pos, _ in self.chunks.search_text(query, self.fetch_k)]
+        top = reciprocal_rank_fusion([dense, lexical], self.rrf_k, (self.dense_weight, self.lexical_weight))[:self.k]
+        docs = self.chunks.get_at(top)
+        return [docs[p] for p in top if p in docs]
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> List[Document]:
+        return self.search_by_vector(query, self.vectorstore.embeddings.embed_query(query))
+
+    async def _aget_relevant_documents(self, query: str, *,
+                                       run_manager: AsyncCallbackManagerForRetrieverRun) -> List[Document]:
+        embedding = await self.vectorstore.embeddings.aembed_query(query)
+        # FAISS search and the FTS5 query are blocking; keep them off the event loop
+        return await asyncio.to_thread(self.search_by_vector, query, embedding)
@@ -0,0 +1,242 @@
+from __future__ import annotations
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional
+
+from logger.custom_logger import CustomLogger
+
+log = CustomLogger().get_logger(__name__)
+
+JOB_DB_PATH = os.getenv("JOB_DB_PATH", os.path.join("jobs", "jobs.sqlite"))
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+JOB_SESSION_CONCURRENCY = int(os.getenv("JOB_SESSION_CONCURRENCY", "1"))
+JOB_SESSION_MAX_PENDING = int(os.getenv("JOB_SESSION_MAX_PENDING", "10"))
+JOB_LEASE_SECONDS = float(os.getenv("JOB_LEASE_SECONDS", "300"))
+
+QUEUED, RUNNING, SUCCEEDED, FAILED = "queued", "running", "succeeded", "failed"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    session_id TEXT NOT NULL,
+    status TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    progress TEXT NOT NULL DEFAULT '{}',
+    result TEXT,
+    error TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS jobs_status ON jobs(status, created_at);
+CREATE INDEX IF NOT EXISTS jobs_session ON jobs(session_id, status);
+"""
+
+
+class JobLimitExceeded(Exception):
+    "raised when a session already has too many pending jobs"
+
+
+class JobQueue:
+    """Persistent background job queue backed by SQLite.
+
+    Jobs survive restarts: queued rows are picked up again, and running rows
+    whose heartbeat is older than the lease are re-queued. Claiming a job is
+    a conditional UPDATE, so several server processes can share one database.
+    At most ``session_concurrency`` jobs run per session at a time, which
+    serialises writes to a session's index directory.
+    """
+    def __init__(self, db_path: str = JOB_DB_PATH, workers: int = JOB_WORKERS,
+                 session_concurrency: int = JOB_SESSION_CONCURRENCY,
+                 session_max_pending: int = JOB_SESSION_MAX_PENDING,
+                 lease_seconds: float = JOB_LEASE_SECONDS, poll_interval: float = 1.0):
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.workers = max(1, workers)
+        self.session_concurrency = max(1, session_concurrency)
+        self.session_max_pending = max(1, session_max_pending)
+        self.lease_seconds = lease_seconds
+        self.poll_interval = poll_interval
+        self._handlers: Dict[str, Callable[[Dict[str, Any], Callable[..., None]], Any]] = {}
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._dispatcher: Optional[threading.Thread] = None
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._running = 0
+        self._active: set = set()
+        self._lock = threading.Lock()
+        with self._connect() as conn:
+            conn.executescript(_SCHEMA)
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(str(self.db_path), timeout=30, isolation_level=None)
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.row_factory = sqlite3.Row
+            yield conn
+        finally:
+            conn.close()
+
+    def register(self, kind: str, handler: Callable[[Dict[str, Any], Callable[..., None]], Any]):
+        "handler(payload, report) runs the job; report(**progress) records progress"
+        self._handlers[kind] = handler
+
+    def submit(self, kind: str, session_id: str, payload: Dict[str, Any]) -> str:
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            pending = conn.execute("SELECT COUNT(*) FROM jobs WHERE session_id=? AND status IN (?,?)",
+                                   (session_id, QUEUED, RUNNING)).fetchone()[0]
+            if pending >= self.session_max_pending:
+                conn.execute("ROLLBACK")
+                raise JobLimitExceeded(f"session {session_id} already has {pending} pending jobs")
+            conn.execute("INSERT INTO jobs (id, kind, session_id, status, payload, created_at, updated_at) "
+                         "VALUES (?,?,?,?,?,?,?)", (job_id, kind, session_id, QUEUED, json.dumps(payload), now, now))
+            conn.execute("COMMIT")
+        log.info("job queued", job_id=job_id, kind=kind, session_id=session_id)
+        self._wake.set()
+        return job_id
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._connect() as conn:
+            row = conn.execute("SELECT * FROM jobs WHERE id=?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        return {
+            "job_id": row["id"],
+            "kind": row["kind"],
+            "session_id": row["session_id"],
+            "status": row["status"],
+            "progress": json.loads(row["progress"] or "{}"),
+            "result": json.loads(row["result"]) if row["result"] else None,
+            "error": row["error"],
+            "attempts": row["attempts"],
+            "created_at": row["created_at"],
+            "updated_at": row["updated_at"],
+        }
+
+    def _report(self, job_id: str, progress: Dict[str, Any]):
+        with self._connect() as conn:
+            conn.execute("UPDATE jobs SET progress=?, updated_at=? WHERE id=?",
+                         (json.dumps(progress), time.time(), job_id))
+
+    def _finish(self, job_id: str, status: str, result: Any = None, error: Optional[str] = None):
+        with self._connect() as conn:
+            conn.execute("UPDATE jobs SET status=?, result=?, error=?, updated_at=? WHERE id=?",
+                         (status, json.dumps(result) if result is not None else None, error, time.time(), job_id))
+
+    def _heartbeat(self):
+        "keep the lease on jobs this process is running"
+        with self._lock:
+            active = list(self._active)
+        if active:
+            with self._connect() as conn:
+                conn.executemany("UPDATE jobs SET updated_at=? WHERE id=? AND status=?",
+                                 [(time.time(), job_id, RUNNING) for job_id in active])
+
+    def _recover_stale(self):
+        "re-queue running jobs whose worker stopped heartbeating (e.g. the process died)"
+        with self._connect() as conn:
+            cur = conn.execute("UPDATE jobs SET status=? WHERE status=? AND updated_at<?",
+                               (QUEUED, RUNNING, time.time() - self.lease_seconds))
+            if cur.rowcount:
+                log.warning("stale jobs re-queued", count=cur.rowcount)
+
+    def _claim_next(self) -> Optional[sqlite3.Row]:
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute(
+                "SELECT * FROM jobs j WHERE status=? AND "
+                "(SELECT COUNT(*) FROM jobs r WHERE r.session_id=j.session_id AND r.status=?) < ? "
+                "ORDER BY created_at LIMIT 1", (QUEUED, RUNNING, self.session_concurrency)).fetchone()
+            if row is not None:
+                conn.execute("UPDATE jobs SET status=?, attempts=attempts+1, updated_at=? WHERE id=?",
+                             (RUNNING, time.time(), row["id"]))
+            conn.execute("COMMIT")
+            return row
+
+    def _run(self, row: sqlite3.Row):
+        job_id = row["id"]
+        progress: Dict[str, Any] = json.loads(row["progress"] or "{}")
+
+        def report(**fields):
+            progress.update(fields)
+            self._report(job_id, progress)
+
+        try:
+            handler = self._handlers[row["kind"]]
+            result = handler(json.loads(row["payload"]), report)
+            self._finish(job_id, SUCCEEDED, result=result)
+            log.info("job succeeded", job_id=job_id, kind=row["kind"])
+        except Exception as e:
+            self._finish(job_id, FAILED, error=str(e))
+            log.error("job failed", job_id=job_id, kind=row["kind"], error=str(e))
+        finally:
+            with self._lock:
+                self._running -= 1
+                self._active.discard(job_id)
+            self._wake.set()
+
+    def _dispatch_loop(self):
+        last_recovery = 0.0
+        while not self._stop.is_set():
+            if time.monotonic() - last_recovery > self.lease_seconds / 3:
+                self._heartbeat()
+                self._recover_stale()
+                last_recovery = time.monotonic()
+            while True:
+                with self._lock:
+                    if self._running >= self.workers:
+                        break
+                row = self._claim_next()
+                if row is None:
+                    break
+                with self._lock:
+                    self._running += 1
+                    self._active.add(row["id"])
+                self._executor.submit(self._run, row)
+            self._wake.wait(self.poll_interval)
+            self._wake.clear()
+
+    def start(self):
+        if self._dispatcher is not None:
+            return
+        self._stop.clear()
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="job")
+        self._dispatcher = threading.Thread(target=self._dispatch_loop, name="job-dispatcher", daemon=True)
+        self._dispatcher.start()
+        log.info("job queue started", db_path=str(self.db_path), workers=self.workers)
+
+    def stop(self, wait: bool = True):
+        self._stop.set()
+        self._wake.set()
+        if self._dispatcher is not None:
+            self._dispatcher.join(timeout=5)
+            self._dispatcher = None
+        if self._executor is not None:
+            self._executor.shutdown(wait=wait)
+            self._executor = None
+
+
+_queue: Optional[JobQueue] = None
+_queue_lock = threading.Lock()
+
+
+def get_job_queue() -> JobQueue:
+    "return the process-wide JobQueue"
+    global _queue
+    if _queue is None:
+        with _queue_lock:
+            if _queue is None:
+                _queue = JobQueue()
+    return _queue
@@ -0,0 +1,366 @@
+from __future__ import annotations
+import bisect
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+import structlog
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.runnables import RunnableLambda
+
+from logger.custom_logger import CustomLogger
+from utils.token_counter import count_tokens
+
+log = CustomLogger().get_logger(__name__)
+
+METRICS_ENABLED = os.getenv("METRICS", "true").lower() == "true"
+# upper bounds in seconds; stages range from sub-millisecond cache lookups to minute-long LLM calls
+STAGE_BUCKETS: Tuple[float, ...] = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+                                    30.0, 60.0, 120.0)
+# routes whose requests are timed but not logged; scrapers and probes would drown the request log
+QUIET_ROUTES = {"/metrics", "/health", "/static"}
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+LabelKey = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values: Dict[LabelKey, Any] = {}
+
+    def _key(self, labels: Dict[str, Any]) -> LabelKey:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def _labels(self, key: LabelKey, extra: Sequence[Tuple[str, str]] = ()) -> str:
+        pairs = list(zip(self.labelnames, key)) + list(extra)
+        if not pairs:
+            return ""
+        return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {_escape(self.documentation)}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            items = sorted(self._values.items())
+            lines.extend(self._sample_lines(key, value) for key, value in items)
+        return lines
+
+    def _sample_lines(self, key: LabelKey, value: Any) -> str:
+        if self.kind == "histogram":
+            # value is [counts per bucket and +Inf, sum, count]; buckets are cumulative in the exposition
+            counts, total, count = value
+            lines = []
+            cumulative = 0
+            for bound, n in zip(self.buckets + (float("inf"),), counts):
+                cumulative += n
+                lines.append(f"{self.name}_bucket{self._labels(key, [('le', _format_value(bound))])} {cumulative}")
+            lines.append(f"{self.name}_sum{self._labels(key)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{self._labels(key)} {count}")
+            return "\n".join(lines)
+        # counters (and untyped gauges) are one sample per label set
+        return f"{self.name}{self._labels(key)} {_format_value(value)}"
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1.0, **labels):
+        if not METRICS_ENABLED or not amount:
+            return
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0.0)
+
+
+class Histogram(_Metric):
+    """Fixed-bucket latency histogram.
+
+    Each label set keeps per-bucket counts plus sum and count; buckets are
+    made cumulative only when rendered, so ``observe`` is one bisect and three
+    additions under the lock.
+    """
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = STAGE_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels):
+        if not METRICS_ENABLED:
+            return
+        key = self._key(labels)
+        slot = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                # [counts per bucket and +Inf, sum, count]
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][slot] += 1
+            state[1] += value
+            state[2] += 1
+
+    def snapshot(self, **labels) -> Dict[str, float]:
+        "count and sum for one label set"
+        with self._lock:
+            state = self._values.get(self._key(labels))
+            return {"count": state[2], "sum": state[1]} if state else {"count": 0, "sum": 0.0}
+
+
+class MetricsRegistry:
+    "named metrics of this process, rendered in the Prometheus text format"
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metrics: Dict[str, _Metric] = {}
+
+    def _register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            return self._metrics.setdefault(metric.name, metric)
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = STAGE_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return "\n".join(line for metric in metrics for line in metric.render()) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+STAGE_SECONDS = REGISTRY.histogram("docportal_stage_seconds", "Time spent in one pipeline stage", ("stage",))
+HTTP_REQUEST_SECONDS = REGISTRY.histogram("docportal_http_request_seconds", "HTTP request latency",
+                                          ("method", "route", "status"))
+LLM_TOKENS = REGISTRY.counter("docportal_llm_tokens_total", "LLM tokens by model and kind (prompt/completion)",
+                              ("model", "kind"))
+LLM_ERRORS = REGISTRY.counter("docportal_llm_errors_total", "LLM calls that raised", ("model",))
+CACHE_EVENTS = REGISTRY.counter("docportal_cache_events_total", "Cache lookups by cache and result (hit/miss)",
+                                ("cache", "result"))
+
+# per-request stage totals in milliseconds, logged with the request line; set by RequestContextMiddleware
+_span: ContextVar[Optional[Dict[str, float]]] = ContextVar("metrics_span", default=None)
+
+
+def render_metrics() -> str:
+    return REGISTRY.render()
+
+
+def observe_stage(stage: str, seconds: float):
+    "record one stage duration in the histogram and in the current request's span"
+    STAGE_SECONDS.observe(seconds, stage=stage)
+    span = _span.get()
+    if span is not None:
+        span[stage] = round(span.get(stage, 0.0) + seconds * 1000, 2)
+
+
+@contextmanager
+def timed(stage: str):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe_stage(stage, time.perf_counter() - started)
+
+
+def timed_iter(stage: str, items: Iterable[Any]) -> Iterator[Any]:
+    "pass items through, recording the time spent producing them as one observation once exhausted"
+    spent = 0.0
+    iterator = iter(items)
+    try:
+        while True:
+            started = time.perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+            finally:
+                spent += time.perf_counter() - started
+            yield item
+    finally:
+        observe_stage(stage, spent)
+
+
+def timed_runnable(stage: str, runnable):
+    "wrap a runnable (e.g. an output parser) so each call is recorded under ``stage``"
+    def run(value, config):
+        with timed(stage):
+            return runnable.invoke(value, config)
+
+    async def arun(value, config):
+        with timed(stage):
+            return await runnable.ainvoke(value, config)
+
+    return RunnableLambda(run, afunc=arun, name=f"timed_{stage}")
+
+
+def record_cache(cache: str, hits: int = 0, misses: int = 0):
+    CACHE_EVENTS.inc(hits, cache=cache, result="hit")
+    CACHE_EVENTS.inc(misses, cache=cache, result="miss")
+
+
+# ----------------------------- #
+# LLM calls                     #
+# ----------------------------- #
+def _message_text(messages) -> str:
+    return "\n".join(str(getattr(m, "content", m)) for m in messages)
+
+
+def _usage(response) -> Tuple[Optional[int], Optional[int]]:
+    "(prompt, completion) tokens reported by the provider, if it reported any"
+    usage = (response.llm_output or {}).get("token_usage") or (response.llm_output or {}).get("usage")
+    if usage:
+        return usage.get("prompt_tokens"), usage.get("completion_tokens")
+    prompt = completion = None
+    for generations in response.generations:
+        for generation in generations:
+            metadata = getattr(getattr(generation, "message", None), "usage_metadata", None)
+            if metadata:
+                prompt = (prompt or 0) + metadata.get("input_tokens", 0)
+                completion = (completion or 0) + metadata.get("output_tokens", 0)
+    return prompt, completion
+
+
+class LLMMetricsHandler(BaseCallbackHandler):
+    """Times every chat model call and counts its tokens.
+
+    Token counts come from the provider's usage report; clients that report
+    none (local stubs, some streaming modes) are counted with the local
+    tokenizer instead. ``run_inline`` keeps the handler on the calling task,
+    so the request span sees the call.
+    """
+    run_inline = True
+
+    def __init__(self):
+        self._runs: Dict[uuid.UUID, Tuple[float, str, str]] = {}
+
+    @staticmethod
+    def _model(kwargs: Dict[str, Any]) -> str:
+        params = kwargs.get("invocation_params") or {}
+        return str(params.get("model_name") or params.get("model") or
+                   (kwargs.get("metadata") or {}).get("ls_model_name") or params.get("_type") or "unknown")
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs):
+        self._runs[run_id] = (time.perf_counter(), self._model(kwargs),
+                              "\n".join(_message_text(batch) for batch in messages))
+
+    def on_llm_start(self, serialized, prompts, *, run_id, **kwargs):
+        self._runs[run_id] = (time.perf_counter(), self._model(kwargs), "\n".join(prompts))
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        run = self._runs.pop(run_id, None)
+        if run is None:
+            return
+        started, model, prompt_text = run
+        observe_stage("llm_call", time.perf_counter() - started)
+        prompt_tokens, completion_tokens = _usage(response)
+        if prompt_tokens is None:
+            prompt_tokens = count_tokens(prompt_text)
+        if completion_tokens is None:
+            completion_tokens = count_tokens("".join(g.text for gens in response.generations for g in gens))
+        LLM_TOKENS.inc(prompt_tokens, model=model, kind="prompt")
+        LLM_TOKENS.inc(completion_tokens, model=model, kind="completion")
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        run = self._runs.pop(run_id, None)
+        if run is not None:
+            observe_stage("llm_call", time.perf_counter() - run[0])
+            LLM_ERRORS.inc(model=run[1])
+
+
+LLM_METRICS_HANDLER = LLMMetricsHandler()
+
+
+def instrument_llm(llm):
+    "attach the shared LLMMetricsHandler to a chat client's own callbacks, once"
+    if not METRICS_ENABLED or not hasattr(llm, "callbacks"):
+        return llm
+    callbacks = llm.callbacks
+    if callbacks is None or isinstance(callbacks, list):
+        if not any(isinstance(c, LLMMetricsHandler) for c in callbacks or []):
+            llm.callbacks = [*(callbacks or []), LLM_METRICS_HANDLER]
+    else:
+        callbacks.add_handler(LLM_METRICS_HANDLER, inherit=True)
+    return llm
+
+
+# ----------------------------- #
+# HTTP requests                 #
+# ----------------------------- #
+def _route_label(scope) -> str:
+    "path template of the matched route, so ids in URLs do not become label values"
+    endpoint, router = scope.get("endpoint"), scope.get("router")
+    if endpoint is not None and router is not None:
+        for route in router.routes:
+            if getattr(route, "endpoint", None) is endpoint or getattr(route, "app", None) is endpoint:
+                return route.path
+    return "unmatched"
+
+
+class RequestContextMiddleware:
+    """Gives every HTTP request an id and a timing span.
+
+    The id is taken from an incoming ``X-Request-ID`` header or generated,
+    bound into structlog's context variables so every log line written while
+    handling the request carries it, and echoed back in the response headers.
+    Stage timings recorded during the request are summed into the span and
+    logged with the request's latency once the response (including a
+    streamed body) is complete.
+    """
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        incoming = dict(scope.get("headers") or []).get(b"x-request-id", b"").decode("latin-1").strip()
+        request_id = incoming[:64] or uuid.uuid4().hex
+        span: Dict[str, float] = {}
+        span_token = _span.set(span)
+        log_tokens = structlog.contextvars.bind_contextvars(request_id=request_id)
+        status = {"code": 500}
+
+        async def send_with_id(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+                message["headers"] = [*message.get("headers", []), (b"x-request-id", request_id.encode("latin-1"))]
+            await send(message)
+
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            elapsed = time.perf_counter() - started
+            route = _route_label(scope)
+            HTTP_REQUEST_SECONDS.observe(elapsed, method=scope["method"], route=route, status=str(status["code"]))
+            if route not in QUIET_ROUTES:
+                log.info("request completed", method=scope["method"], route=route, status=status["code"],
+                         duration_ms=round(elapsed * 1000, 2), stages=span)
+            structlog.contextvars.reset_contextvars(**log_tokens)
+            _span.reset(span_token)
@@ -7,18 +7,28 @@ from logger.custom_logger import CustomLogger
 from exception.custom_exception import DocumentPortalException
 from dotenv import load_dotenv
 from utils.config_loader import load_config
+from utils.metrics import instrument_llm
+import httpx
+import openai
 import os
 import sys
+import threading
 
 #define logger
 log=CustomLogger().get_logger(__name__)
 
+#a real embedding request at startup opens the provider connection early, but costs a billable call per worker
+MODEL_WARMUP_PING=os.getenv("MODEL_WARMUP_PING","false").lower()=="true"
+
 class ModelLoader:
-    def __init__(self):
+    def __init__(self,http_client=None,http_async_client=None):
         #load credentials
         load_dotenv(override=True)
         self.validate_env()
         self.config=load_config("config/config.yaml")
+        #optional shared connection pools, handed out by ModelRegistry
+        self.http_client=http_client
+        self.http_async_client=http_async_client
         log.info("load configration successfully",config_keys=list(self.config.keys()))
     
     def validate_env(self):
@@ -36,16 +46,24 @@ class ModelLoader:
         try:
             log.info("load Embedding model...")
             model_name=self.config['embedding_model']['model_name']
+            if self.http_client is not None:
+                api_key=self.api_keys['OPENAI_API_KEY']
+                return OpenAIEmbeddings(
+                    model=model_name,
+                    openai_api_key=api_key,
+                    client=openai.OpenAI(api_key=api_key,http_client=self.http_client).embeddings,
+                    async_client=openai.AsyncOpenAI(api_key=api_key,http_client=self.http_async_client).embeddings
+                )
             return OpenAIEmbeddings(model=model_name)
         except Exception as e:
             log.error("error in loading embedding model",error=str(e))
 
-    def load_llm(self):
+    def load_llm(self,provider_key=None):
         "load and return the model"
         llm_block = self.config["llm"]
 
         # set default provider
-        provider_key = os.getenv("LLM_PROVIDER", "openai")
+        provider_key = provider_key or os.getenv("LLM_PROVIDER", "openai")
 
         if provider_key not in llm_block:
             log.error("LLM provider not found in config", provider_key=provider_key)
@@ -80,7 +98,9 @@ class ModelLoader:
                 model=model_name,
                 api_key=self.api_keys['OPENAI_API_KEY'],
                 temperature=temperature,
-                max_tokens=max_output_tokens
+                max_tokens=max_output_tokens,
+                http_client=self.http_client,
+                http_async_client=self.http_async_client
             )
 
         else:
@@ -88,6 +108,101 @@ class ModelLoader:
             raise ValueError(f"Unsupported llm provider {provider}")
 
 
+def model_identity(llm) -> str:
+    "provider model name of a chat client, for keys of caches that hold model output"
+    return getattr(llm, "model_name", None) or getattr(llm, "model", None) or type(llm).__name__
+
+
+class ModelRegistry:
+    """Process-wide registry of model clients.
+
+    Environment and config are read once, and every LLM / embedding client is
+    built once per provider and reused, so requests share the same HTTP
+    connection pool instead of paying client construction and TLS setup.
+    """
+    def __init__(self):
+        self._lock=threading.RLock()
+        self._loader=None
+        self._llms={}
+        self._embedding_model=None
+        limits=httpx.Limits(
+            max_connections=int(os.getenv("MODEL_HTTP_MAX_CONNECTIONS","100")),
+            max_keepalive_connections=int(os.getenv("MODEL_HTTP_MAX_KEEPALIVE","20"))
+        )
+        timeout=httpx.Timeout(float(os.getenv("MODEL_HTTP_TIMEOUT","60")))
+        self.http_client=httpx.Client(limits=limits,timeout=timeout)
+        self.http_async_client=httpx.AsyncClient(limits=limits,timeout=timeout)
+
+    @property
+    def loader(self) -> ModelLoader:
+        with self._lock:
+            if self._loader is None:
+                self._loader=ModelLoader(http_client=self.http_client,http_async_client=self.http_async_client)
+            return self._loader
+
+    @property
+    def config(self) -> dict:
+        return self.loader.config
+
+    def load_llm(self,provider_key=None):
+        "return the shared LLM client for a provider (LLM_PROVIDER by default)"
+        provider_key=provider_key or os.getenv("LLM_PROVIDER","openai")
+        with self._lock:
+            llm=self._llms.get(provider_key)
+            if llm is None:
+                llm=instrument_llm(self.loader.load_llm(provider_key))
+                self._llms[provider_key]=llm
+            return llm
+
+    def load_embedding_model(self):
+        "return the shared embedding client"
+        with self._lock:
+            if self._embedding_model is None:
+                self._embedding_model=self.loader.load_embedding_model()
+            return self._embedding_model
+
+    def register_llm(self,llm,provider_key=None):
+        "install a prebuilt LLM client (e.g. a local stub) for a provider"
+        with self._lock:
+            self._llms[provider_key or os.getenv("LLM_PROVIDER","openai")]=instrument_llm(llm)
+
+    def register_embedding_model(self,embedding_model):
+        "install a prebuilt embedding client"
+        with self._lock:
+            self._embedding_model=embedding_model
+
+    def warmup(self,ping: bool=MODEL_WARMUP_PING):
+        "build the default clients up front and optionally open the connection pool"
+        llm=self.load_llm()
+        embedding_model=self.load_embedding_model()
+        if ping and embedding_model is not None:
+            try:
+                #one tiny request opens the TLS connection the LLM client shares
+                embedding_model.embed_query("warmup")
+            except Exception as e:
+                log.warning("model warmup ping failed",error=str(e))
+        log.info("model registry warmed up",llm=type(llm).__name__,embedding=type(embedding_model).__name__)
+
+    async def aclose(self):
+        "close both shared HTTP clients; run from the server's shutdown handler"
+        self.http_client.close()
+        await self.http_async_client.aclose()
+        log.info("model http clients closed")
+
+
+_registry=None
+_registry_lock=threading.Lock()
+
+def get_model_registry() -> ModelRegistry:
+    "return the process-wide ModelRegistry"
+    global _registry
+    if _registry is None:
+        with _registry_lock:
+            if _registry is None:
+                _registry=ModelRegistry()
+    return _registry
+
+
 #if __name__=="__main__":
  #  ModelLoader().validate_env()
  #  embedding_model=ModelLoader().load_embedding_model()
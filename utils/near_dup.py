@@ -0,0 +1,128 @@
+from __future__ import annotations
+import hashlib
+import os
+import re
+from typing import Dict, List, Sequence, Tuple
+
+import numpy as np
+
+from logger.custom_logger import CustomLogger
+
+log = CustomLogger().get_logger(__name__)
+
+NEAR_DUP_ENABLED = os.getenv("NEAR_DUP", "true").lower() == "true"
+NEAR_DUP_THRESHOLD = float(os.getenv("NEAR_DUP_THRESHOLD", "0.85"))
+NEAR_DUP_PERMUTATIONS = int(os.getenv("NEAR_DUP_PERMUTATIONS", "64"))
+NEAR_DUP_BANDS = int(os.getenv("NEAR_DUP_BANDS", "16"))
+NEAR_DUP_SHINGLE = int(os.getenv("NEAR_DUP_SHINGLE", "5"))
+
+_WORD = re.compile(r"\w+")
+_MASK63 = (1 << 63) - 1
+
+
+def _normalized_words(text: str) -> List[str]:
+    return _WORD.findall(text.lower())
+
+
+def content_fingerprint(text: str) -> str:
+    "exact-duplicate key: hash of the chunk's words, so case, punctuation and spacing do not matter"
+    digest = hashlib.sha256(" ".join(_normalized_words(text)).encode("utf-8")).hexdigest()
+    return f"content:{digest}"
+
+
+def _hash64(data: bytes) -> int:
+    return int.from_bytes(hashlib.blake2b(data, digest_size=8).digest(), "little")
+
+
+class MinHasher:
+    """MinHash signatures over word shingles.
+
+    Each of the ``num_perm`` hash functions is ``x * a + b (mod 2**64)`` with
+    an odd ``a``, a bijection on 64-bit shingle hashes, so one vectorized
+    multiply-add per shingle gives the whole signature. The fraction of equal
+    signature slots estimates the Jaccard similarity of two shingle sets.
+    """
+    def __init__(self, num_perm: int = NEAR_DUP_PERMUTATIONS, shingle_size: int = NEAR_DUP_SHINGLE, seed: int = 1):
+        rng = np.random.default_rng(seed)
+        self.num_perm = num_perm
+        self.shingle_size = max(1, shingle_size)
+        self._a = rng.integers(1, 2 ** 63, size=num_perm, dtype=np.uint64) * np.uint64(2) + np.uint64(1)
+        self._b = rng.integers(0, 2 ** 63, size=num_perm, dtype=np.uint64)
+
+    def shingles(self, text: str) -> np.ndarray:
+        words = _normalized_words(text)
+        n = self.shingle_size
+        grams = {" ".join(words[i:i + n]) for i in range(max(1, len(words) - n + 1))}
+        return np.fromiter((_hash64(g.encode("utf-8")) for g in grams), dtype=np.uint64, count=len(grams))
+
+    def signature(self, text: str) -> np.ndarray:
+        values = self.shingles(text)
+        with np.errstate(over="ignore"):
+            return (values[:, None] * self._a + self._b).min(axis=0)
+
+
+def band_keys(signature: np.ndarray, bands: int = NEAR_DUP_BANDS) -> List[int]:
+    "one LSH bucket per band; documents sharing any bucket become candidates"
+    rows = len(signature) // bands
+    return [_hash64(bytes([band]) + signature[band * rows:(band + 1) * rows].tobytes()) & _MASK63
+            for band in range(bands)]
+
+
+def similarity(a: np.ndarray, b: np.ndarray) -> float:
+    return float(np.mean(a == b))
+
+
+class NearDuplicateFilter:
+    """Content-based dedup for one index.
+
+    A chunk is skipped when its normalized text was already indexed
+    (``content:`` fingerprint) or when its MinHash signature matches an
+    indexed chunk, or an earlier chunk of the same batch, at
+    ``threshold`` or above. Candidates come from the LSH bands persisted in
+    the index's chunk store, so the check costs a few indexed lookups
+    instead of a scan over every stored chunk.
+    """
+    def __init__(self, chunks, threshold: float = NEAR_DUP_THRESHOLD, num_perm: int = NEAR_DUP_PERMUTATIONS,
+                 bands: int = NEAR_DUP_BANDS, shingle_size: int = NEAR_DUP_SHINGLE):
+        if num_perm % bands:
+            raise ValueError(f"num_perm ({num_perm}) must be a multiple of bands ({bands})")
+        self.chunks = chunks
+        self.threshold = threshold
+        self.bands = bands
+        self.hasher = MinHasher(num_perm, shingle_size)
+
+    def _near_match(self, signature: np.ndarray, keys: List[int], batch: List[np.ndarray],
+                    buckets: Dict[Tuple[int, int], List[int]]) -> bool:
+        candidates = {j for band, key in enumerate(keys) for j in buckets.get((band, key), ())}
+        if any(similarity(signature, batch[j]) >= self.threshold for j in candidates):
+            return True
+        return any(similarity(signature, np.frombuffer(stored, dtype=np.uint64)) >= self.threshold
+                   for stored in self.chunks.minhash_candidates(keys))
+
+    def filter(self, texts: Sequence[str], seen: Dict[str, bool]):
+        """indices of the texts to keep, their content fingerprints and (signature bytes, band keys),
+        plus skip counters; ``seen`` holds the index's fingerprints and is updated in place"""
+        keep: List[int] = []
+        fingerprints: List[str] = []
+        minhashes: List[Tuple[bytes, List[int]]] = []
+        batch: List[np.ndarray] = []
+        buckets: Dict[Tuple[int, int], List[int]] = {}
+        stats = {"exact_duplicates": 0, "near_duplicates": 0}
+        for i, text in enumerate(texts):
+            key = content_fingerprint(text)
+            if key in seen:
+                stats["exact_duplicates"] += 1
+                continue
+            signature = self.hasher.signature(text)
+            keys = band_keys(signature, self.bands)
+            if self._near_match(signature, keys, batch, buckets):
+                stats["near_duplicates"] += 1
+                continue
+            seen[key] = True
+            keep.append(i)
+            fingerprints.append(key)
+            minhashes.append((signature.tobytes(), keys))
+            for band, bucket in enumerate(keys):
+                buckets.setdefault((band, bucket), []).append(len(batch))
+            batch.append(signature)
+        return keep, fingerprints, minhashes, stats
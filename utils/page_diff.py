@@ -0,0 +1,107 @@
+from __future__ import annotations
+import hashlib
+import re
+import unicodedata
+from dataclasses import dataclass
+from difflib import SequenceMatcher
+from typing import Any, Dict, List, Optional, Tuple
+
+Page = Tuple[int, str]
+
+NO_CHANGES = "No changes"
+_WHITESPACE = re.compile(r"\s+")
+_FIRST_NUMBER = re.compile(r"\d+")
+
+
+def normalize_page(text: str) -> str:
+    "page text with unicode forms and whitespace normalized, so re-extraction noise does not count as a change"
+    return _WHITESPACE.sub(" ", unicodedata.normalize("NFKC", text)).strip()
+
+
+def page_hash(text: str) -> str:
+    return hashlib.sha256(normalize_page(text).encode("utf-8")).hexdigest()
+
+
+@dataclass
+class PageSlot:
+    "one aligned position: same, changed (a page pair for the LLM), inserted (actual only) or deleted (reference only)"
+    status: str
+    reference: Optional[Page] = None
+    actual: Optional[Page] = None
+
+    @property
+    def label(self) -> str:
+        return str(self.actual[0]) if self.actual else f"{self.reference[0]} (reference)"
+
+    def local_row(self) -> Optional[Dict[str, str]]:
+        "the comparison row for slots that need no LLM call"
+        if self.status == "same":
+            return {"page": self.label, "changes": NO_CHANGES}
+        if self.status == "inserted":
+            return {"page": self.label, "changes": "Page added; it has no counterpart in the reference document."}
+        if self.status == "deleted":
+            return {"page": self.label, "changes": "Page removed; it has no counterpart in the actual document."}
+        return None
+
+
+def align_pages(reference: List[Page], actual: List[Page]) -> List[PageSlot]:
+    """Align two documents page by page on normalized-text hashes.
+
+    Runs of identical pages are matched even when pages were inserted or
+    deleted in between; the pages left over in a differing region are paired
+    in order as changed pages and any surplus becomes inserted/deleted pages.
+    """
+    matcher = SequenceMatcher(None, [page_hash(t) for _, t in reference], [page_hash(t) for _, t in actual],
+                              autojunk=False)
+    slots: List[PageSlot] = []
+    for op, i1, i2, j1, j2 in matcher.get_opcodes():
+        ref, act = reference[i1:i2], actual[j1:j2]
+        if op == "equal":
+            slots.extend(PageSlot("same", r, a) for r, a in zip(ref, act))
+            continue
+        paired = min(len(ref), len(act))
+        slots.extend(PageSlot("changed", r, a) for r, a in zip(ref[:paired], act[:paired]))
+        slots.extend(PageSlot("deleted", reference=r) for r in ref[paired:])
+        slots.extend(PageSlot("inserted", actual=a) for a in act[paired:])
+    return slots
+
+
+def format_changed_pairs(slots: List[PageSlot]) -> str:
+    "the combined_docs text for the comparison prompt, holding only changed page pairs"
+    parts = []
+    for slot in slots:
+        parts.append(f"---Page {slot.label}---\n"
+                     f"Reference document (page {slot.reference[0]}):\n{slot.reference[1]}\n\n"
+                     f"Actual document (page {slot.actual[0]}):\n{slot.actual[1]}")
+    return "\n\n".join(parts)
+
+
+def _page_number(value: Any) -> Optional[int]:
+    match = _FIRST_NUMBER.search(str(value))
+    return int(match.group()) if match else None
+
+
+def merge_rows(slots: List[PageSlot], llm_rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Comparison rows in alignment order: local rows for unchanged/inserted/deleted
+    pages, LLM rows (matched on page number) for changed ones"""
+    by_page: Dict[Optional[int], List[Dict[str, Any]]] = {}
+    for row in llm_rows:
+        by_page.setdefault(_page_number(row.get("page", row.get("Page", ""))), []).append(row)
+    rows: List[Dict[str, Any]] = []
+    for slot in slots:
+        row = slot.local_row()
+        if row is not None:
+            rows.append(row)
+            continue
+        matched = by_page.pop(slot.actual[0], None)
+        rows.extend(matched or [{"page": slot.label, "changes": f"Content differs from reference page {slot.reference[0]}."}])
+    # rows the model labelled with a page we did not send are kept rather than dropped
+    rows.extend(row for key in by_page for row in by_page[key])
+    return rows
+
+
+def diff_stats(slots: List[PageSlot]) -> Dict[str, int]:
+    stats = {"same": 0, "changed": 0, "inserted": 0, "deleted": 0}
+    for slot in slots:
+        stats[slot.status] += 1
+    return stats
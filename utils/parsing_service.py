@@ -0,0 +1,165 @@
+from __future__ import annotations
+import multiprocessing
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeout
+from concurrent.futures.process import BrokenProcessPool
+from typing import Deque, Iterable, Iterator, List, Optional, Tuple
+
+import fitz
+
+from logger.custom_logger import CustomLogger, configure_worker_logging
+
+log = CustomLogger().get_logger(__name__)
+
+PARSE_WORKERS = int(os.getenv("PARSE_WORKERS", str(os.cpu_count() or 1)))
+PARSE_PAGES_PER_TASK = int(os.getenv("PARSE_PAGES_PER_TASK", "25"))
+PARSE_TIMEOUT = float(os.getenv("PARSE_TIMEOUT", "120"))
+
+
+def pdf_page_count(pdf_path) -> int:
+    with fitz.open(pdf_path) as doc:
+        if doc.is_encrypted:
+            raise ValueError("Encrypted PDFs are not supported")
+        return doc.page_count
+
+
+def page_text(page) -> str:
+    "page text with a blank line between PyMuPDF text blocks, so paragraph layout survives for the splitter"
+    return "\n\n".join(block[4].strip() for block in page.get_text("blocks") if block[6] == 0 and block[4].strip())
+
+
+def extract_page_range(pdf_path: str, start: int, end: int) -> List[Tuple[int, str]]:
+    "extract text for pages [start, end); runs inside a worker process"
+    with fitz.open(pdf_path) as doc:
+        return [(page_num + 1, page_text(doc.load_page(page_num))) for page_num in range(start, min(end, doc.page_count))]
+
+
+class ParsingService:
+    """Parses PDFs on a process pool.
+
+    Every file is cut into page ranges of ``pages_per_task`` pages. The ranges
+    are fanned out across the pool and the results are yielded back in
+    (file, page) order. Only a bounded number of ranges are in flight at a
+    time, so memory stays bounded for very large uploads.
+    """
+    def __init__(self, max_workers: int = PARSE_WORKERS, pages_per_task: int = PARSE_PAGES_PER_TASK,
+                 timeout: float = PARSE_TIMEOUT):
+        self.max_workers = max_workers
+        self.pages_per_task = max(1, pages_per_task)
+        self.timeout = timeout
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+
+    @property
+    def executor(self) -> Optional[ProcessPoolExecutor]:
+        if self.max_workers <= 0:
+            return None
+        with self._lock:
+            if self._executor is None:
+                # spawn keeps worker processes independent of the server's threads and sockets
+                self._executor = ProcessPoolExecutor(max_workers=self.max_workers,
+                                                     mp_context=multiprocessing.get_context("spawn"),
+                                                     initializer=configure_worker_logging)
+                log.info("parsing pool started", workers=self.max_workers)
+            return self._executor
+
+    def _tasks(self, paths: Iterable) -> Iterator[Tuple[str, int, int, int]]:
+        for path in paths:
+            path = str(path)
+            total = pdf_page_count(path)
+            for start in range(0, total, self.pages_per_task):
+                yield path, start, start + self.pages_per_task, total
+
+    def iter_pages(self, paths: Iterable, skip_empty: bool = False) -> Iterator[Tuple[str, int, int, str]]:
+        "yield (path, page_number, total_pages, text) in file and page order"
+        executor = self.executor
+        tasks = self._tasks(paths)
+        if executor is None:
+            for path, start, end, total in tasks:
+                for page_num, text in extract_page_range(path, start, end):
+                    if not (skip_empty and not text.strip()):
+                        yield path, page_num, total, text
+            return
+
+        max_in_flight = self.max_workers * 2
+        in_flight: Deque = deque()
+        files = set()
+        started = time.perf_counter()
+
+        def submit_next() -> bool:
+            task = next(tasks, None)
+            if task is None:
+                return False
+            files.add(task[0])
+            in_flight.append((task, executor.submit(extract_page_range, *task[:3])))
+            return True
+
+        try:
+            while len(in_flight) < max_in_flight and submit_next():
+                pass
+            while in_flight:
+                task, fut = in_flight.popleft()
+                path, start, end, total = task
+                try:
+                    # only time spent blocked on this range counts; a slow consumer does not eat into it
+                    pages = fut.result(timeout=self.timeout)
+                except FutureTimeout:
+                    # cancel() cannot stop a running task, so the stuck worker would keep its slot for good
+                    self._recycle(executor, reason="timeout")
+                    raise TimeoutError(f"parsing {path} pages {start + 1}-{min(end, total)} exceeded {self.timeout}s")
+                except BrokenProcessPool:
+                    if self._executor is executor:
+                        self._recycle(executor, reason="broken")
+                        raise
+                    # another call recycled the shared pool under us; rerun this page range on the new one
+                    executor = self.executor
+                    in_flight.appendleft((task, executor.submit(extract_page_range, *task[:3])))
+                    continue
+                submit_next()
+                for page_num, text in pages:
+                    if not (skip_empty and not text.strip()):
+                        yield path, page_num, total, text
+        finally:
+            for _, fut in in_flight:
+                fut.cancel()
+        log.info("PDF pages parsed on process pool", files=len(files),
+                 seconds=round(time.perf_counter() - started, 3))
+
+    def iter_pdf_pages(self, pdf_path, skip_empty: bool = False) -> Iterator[Tuple[int, str]]:
+        "yield (page_number, text) for one PDF"
+        for _, page_num, _, text in self.iter_pages([pdf_path], skip_empty=skip_empty):
+            yield page_num, text
+
+    def _recycle(self, executor: ProcessPoolExecutor, reason: str):
+        "stop a pool's workers and let the next call start a fresh pool"
+        with self._lock:
+            if self._executor is executor:
+                self._executor = None
+        # ProcessPoolExecutor has no public way to stop a running task; end its worker processes directly
+        for proc in list((getattr(executor, "_processes", None) or {}).values()):
+            proc.terminate()
+        executor.shutdown(wait=False, cancel_futures=True)
+        log.warning("parsing pool recycled", reason=reason, workers=self.max_workers)
+
+    def shutdown(self, wait: bool = False):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=wait, cancel_futures=True)
+                self._executor = None
+
+
+_service: Optional[ParsingService] = None
+_service_lock = threading.Lock()
+
+
+def get_parsing_service() -> ParsingService:
+    "return the process-wide ParsingService"
+    global _service
+    if _service is None:
+        with _service_lock:
+            if _service is None:
+                _service = ParsingService()
+    return _service
@@ -0,0 +1,120 @@
+from __future__ import annotations
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Optional, Sequence
+
+from logger.custom_logger import CustomLogger
+from utils.metrics import record_cache
+
+log = CustomLogger().get_logger(__name__)
+
+RESULT_CACHE_ENABLED = os.getenv("RESULT_CACHE", "true").lower() == "true"
+RESULT_CACHE_DB = os.getenv("RESULT_CACHE_DB", os.path.join("result_cache", "results.sqlite"))
+RESULT_CACHE_MAX_BYTES = int(os.getenv("RESULT_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+
+
+def prompt_version(prompt) -> str:
+    "short hash of a prompt template, so editing a prompt retires the results it produced"
+    text = prompt.pretty_repr() if hasattr(prompt, "pretty_repr") else repr(prompt)
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()[:16]
+
+
+def result_key(kind: str, file_hashes: Sequence[str], identity: Dict[str, Any]) -> str:
+    "cache key of one request: endpoint kind, SHA-256 of each uploaded file in order, model/prompt/settings"
+    payload = json.dumps({"kind": kind, "files": list(file_hashes), "identity": identity}, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ResultCache:
+    """Persistent cache of /analyze and /compare results.
+
+    Results are JSON rows in SQLite keyed by ``result_key``, so they survive
+    restarts and are shared between worker processes. Once the stored JSON
+    exceeds ``max_bytes`` the least recently read results are evicted.
+    """
+    def __init__(self, db_path: str = RESULT_CACHE_DB, max_bytes: int = RESULT_CACHE_MAX_BYTES):
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        with self._connect() as conn:
+            conn.execute("CREATE TABLE IF NOT EXISTS results (key TEXT PRIMARY KEY, kind TEXT NOT NULL, "
+                         "value TEXT NOT NULL, size INTEGER NOT NULL, created_at REAL NOT NULL, "
+                         "accessed_at REAL NOT NULL)")
+            conn.execute("CREATE INDEX IF NOT EXISTS results_accessed ON results(accessed_at)")
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(str(self.db_path), timeout=30, isolation_level=None)
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            yield conn
+        finally:
+            conn.close()
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._connect() as conn:
+            row = conn.execute("SELECT value FROM results WHERE key=?", (key,)).fetchone()
+            if row is not None:
+                conn.execute("UPDATE results SET accessed_at=? WHERE key=?", (time.time(), key))
+        if row is None:
+            self.misses += 1
+            record_cache("result", misses=1)
+            return None
+        self.hits += 1
+        record_cache("result", hits=1)
+        return json.loads(row[0])
+
+    def put(self, key: str, kind: str, value: Any):
+        data = json.dumps(value, default=str)
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute("INSERT OR REPLACE INTO results (key, kind, value, size, created_at, accessed_at) "
+                         "VALUES (?,?,?,?,?,?)", (key, kind, data, len(data), now, now))
+            self._evict(conn)
+
+    def _evict(self, conn):
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM results").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        evicted = 0
+        for key, size in conn.execute("SELECT key, size FROM results ORDER BY accessed_at").fetchall():
+            if total <= self.max_bytes:
+                break
+            conn.execute("DELETE FROM results WHERE key=?", (key,))
+            total -= size
+            evicted += 1
+        log.info("result cache evicted", entries=evicted, bytes=total)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._connect() as conn:
+            entries, size = conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM results").fetchone()
+        total = self.hits + self.misses
+        return {
+            "entries": entries,
+            "bytes": size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+        }
+
+
+_cache: Optional[ResultCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_result_cache() -> ResultCache:
+    "return the process-wide ResultCache"
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = ResultCache()
+    return _cache
@@ -0,0 +1,173 @@
+from __future__ import annotations
+import os
+import re
+from functools import lru_cache
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from langchain.schema import Document
+from langchain.text_splitter import RecursiveCharacterTextSplitter
+
+from logger.custom_logger import CustomLogger
+from utils.metrics import timed
+from utils.token_counter import TOKEN_ENCODING, count_tokens_batch, get_encoding
+
+log = CustomLogger().get_logger(__name__)
+
+SPLIT_BATCH_PAGES = int(os.getenv("SPLIT_BATCH_PAGES", "64"))
+
+DEFAULT_SPLITTER_CONFIG: Dict[str, Any] = {
+    "kind": "layout",
+    "chars_per_token": 4,
+    "max_tokens": 8191,
+    "encoding": TOKEN_ENCODING,
+}
+
+_PARAGRAPH_BREAK = re.compile(r"\n\s*\n")
+_SENTENCE_END = re.compile(r"(?<=[.!?;:])\s+|\n")
+
+# (text, tokens, separator placed before it when it is not the first unit of a chunk)
+Unit = Tuple[str, int, str]
+
+
+class _Tokenizer:
+    "tiktoken when available; otherwise 4-character pieces stand in for tokens, matching count_tokens"
+    def __init__(self, encoding: str):
+        self.enc = get_encoding(encoding)
+
+    def encode_batch(self, texts: List[str]) -> List[List[Any]]:
+        if self.enc is None:
+            return [[t[i:i + 4] for i in range(0, len(t), 4)] for t in texts]
+        return self.enc.encode_batch(texts, disallowed_special=())
+
+    def decode(self, tokens: List[Any]) -> str:
+        if self.enc is None:
+            return "".join(tokens)
+        return self.enc.decode(tokens)
+
+
+class LayoutTokenSplitter:
+    """Token-sized chunks packed from paragraph blocks.
+
+    PDF pages come out of the parser with a blank line between PyMuPDF text
+    blocks, so a page splits into paragraphs without any regex recursion. The
+    paragraphs of a whole batch of pages are tokenized in one ``encode_batch``
+    call on tiktoken's native thread pool, then packed greedily into chunks of
+    at most ``chunk_tokens`` tokens, repeating trailing paragraphs up to
+    ``overlap_tokens`` as overlap. Paragraphs longer than a chunk are cut at
+    sentence ends, and at token boundaries as a last resort. Chunks never
+    cross a page, so page metadata stays exact.
+    """
+    def __init__(self, chunk_tokens: int = 250, overlap_tokens: int = 50, encoding: str = TOKEN_ENCODING,
+                 batch_pages: int = SPLIT_BATCH_PAGES):
+        self.chunk_tokens = max(1, chunk_tokens)
+        self.overlap_tokens = max(0, min(overlap_tokens, self.chunk_tokens // 2))
+        self.batch_pages = max(1, batch_pages)
+        self.encoding = encoding
+        self.tokenizer = _Tokenizer(encoding)
+
+    def _oversized(self, paragraph: str) -> List[Unit]:
+        "units of a paragraph that does not fit one chunk: sentences, then token slices"
+        sentences = [s for s in _SENTENCE_END.split(paragraph) if s.strip()]
+        units: List[Unit] = []
+        for i, (sentence, tokens) in enumerate(zip(sentences, self.tokenizer.encode_batch(sentences))):
+            sep = "\n\n" if i == 0 else " "
+            if len(tokens) <= self.chunk_tokens:
+                units.append((sentence, len(tokens), sep))
+                continue
+            step = self.chunk_tokens - self.overlap_tokens
+            for start in range(0, len(tokens), step):
+                piece = tokens[start:start + self.chunk_tokens]
+                units.append((self.tokenizer.decode(piece), len(piece), sep if start == 0 else ""))
+                if start + self.chunk_tokens >= len(tokens):
+                    break
+        return units
+
+    def _pack(self, units: List[Unit]) -> List[str]:
+        chunks: List[str] = []
+        current: List[Unit] = []
+        used = 0
+        for unit in units:
+            # the separator joining a unit to the one before it is charged one token
+            if current and used + unit[1] + 1 > self.chunk_tokens:
+                chunks.append(self._join(current))
+                # carry trailing units as overlap, never so many that the next unit no longer fits
+                carried: List[Unit] = []
+                budget = min(self.overlap_tokens, self.chunk_tokens - unit[1] - 1)
+                kept = 0
+                for prev in reversed(current):
+                    if kept + prev[1] + 1 > budget:
+                        break
+                    carried.insert(0, prev)
+                    kept += prev[1] + 1
+                current, used = carried, kept
+            used += unit[1] + (1 if current else 0)
+            current.append(unit)
+        if current:
+            chunks.append(self._join(current))
+        return chunks
+
+    @staticmethod
+    def _join(units: List[Unit]) -> str:
+        return "".join(text if i == 0 else sep + text for i, (text, _, sep) in enumerate(units)).strip()
+
+    def _split_batch(self, docs: List[Document]) -> Iterator[Document]:
+        paragraphs = [[p.strip() for p in _PARAGRAPH_BREAK.split(d.page_content) if p.strip()] for d in docs]
+        flat = [p for page in paragraphs for p in page]
+        counts = iter(count_tokens_batch(flat, self.encoding))
+        for doc, page in zip(docs, paragraphs):
+            units: List[Unit] = []
+            for paragraph in page:
+                n = next(counts)
+                units.extend([(paragraph, n, "\n\n")] if n <= self.chunk_tokens else self._oversized(paragraph))
+            for text in self._pack(units):
+                yield Document(page_content=text, metadata=dict(doc.metadata))
+
+    def iter_split(self, docs: Iterable[Document]) -> Iterator[Document]:
+        "lazily split documents, tokenizing ``batch_pages`` pages at a time"
+        batch: List[Document] = []
+        for doc in docs:
+            batch.append(doc)
+            if len(batch) >= self.batch_pages:
+                yield from self._timed_split(batch)
+                batch = []
+        if batch:
+            yield from self._timed_split(batch)
+
+    def _timed_split(self, batch: List[Document]) -> List[Document]:
+        # split eagerly so the "split" stage excludes the parsing that feeds the batch
+        with timed("split"):
+            return list(self._split_batch(batch))
+
+    def split_documents(self, docs: Iterable[Document]) -> List[Document]:
+        return list(self.iter_split(docs))
+
+    def split_text(self, text: str) -> List[str]:
+        return [d.page_content for d in self._split_batch([Document(page_content=text)])]
+
+
+class _RecursiveSplitter(RecursiveCharacterTextSplitter):
+    "the character-based LangChain splitter behind the same iter_split interface"
+    def iter_split(self, docs: Iterable[Document]) -> Iterator[Document]:
+        for doc in docs:
+            with timed("split"):
+                chunks = self.split_documents([doc])
+            yield from chunks
+
+
+@lru_cache(maxsize=32)
+def _cached_splitter(kind: str, chunk_size: int, chunk_overlap: int, chars_per_token: float, max_tokens: int,
+                     encoding: str):
+    if kind == "recursive":
+        return _RecursiveSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+    if kind != "layout":
+        raise ValueError(f"unknown text splitter kind: {kind}")
+    chunk_tokens = min(max_tokens, max(1, int(chunk_size / chars_per_token)))
+    return LayoutTokenSplitter(chunk_tokens, int(chunk_overlap / chars_per_token), encoding)
+
+
+def get_text_splitter(chunk_size: int = 1000, chunk_overlap: int = 200, config: Optional[Dict[str, Any]] = None):
+    """shared splitter for the given sizes; chunk_size/chunk_overlap are characters, as the API takes them,
+    and the layout splitter converts them to tokens at ``chars_per_token``"""
+    settings = {**DEFAULT_SPLITTER_CONFIG, **(config or {})}
+    return _cached_splitter(str(settings["kind"]), int(chunk_size), int(chunk_overlap),
+                            float(settings["chars_per_token"]), int(settings["max_tokens"]), str(settings["encoding"]))
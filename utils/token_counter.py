@@ -0,0 +1,53 @@
+from __future__ import annotations
+import os
+from functools import lru_cache
+from typing import List, Optional
+
+from logger.custom_logger import CustomLogger
+
+log = CustomLogger().get_logger(__name__)
+
+TOKEN_ENCODING = os.getenv("TOKEN_ENCODING", "cl100k_base")
+
+
+@lru_cache(maxsize=4)
+def get_encoding(name: str = TOKEN_ENCODING):
+    "return a cached tiktoken encoding, or None when tiktoken/its data is unavailable"
+    try:
+        import tiktoken
+        return tiktoken.get_encoding(name)
+    except Exception as e:
+        log.warning("tiktoken unavailable, falling back to approximate token counts", error=str(e))
+        return None
+
+
+def count_tokens(text: str, encoding: Optional[str] = None) -> int:
+    "count tokens with tiktoken when possible, otherwise approximate 4 characters per token"
+    enc = get_encoding(encoding or TOKEN_ENCODING)
+    if enc is None:
+        return max(1, len(text) // 4) if text else 0
+    return len(enc.encode(text, disallowed_special=()))
+
+
+def count_tokens_batch(texts: List[str], encoding: Optional[str] = None) -> List[int]:
+    "token counts for many texts; tiktoken encodes the batch on its native thread pool"
+    enc = get_encoding(encoding or TOKEN_ENCODING)
+    if enc is None:
+        return [max(1, len(t) // 4) if t else 0 for t in texts]
+    return [len(ids) for ids in enc.encode_batch(texts, disallowed_special=())]
+
+
+def pack_by_tokens(token_counts: List[int], budget: int) -> List[List[int]]:
+    "greedily group consecutive item indices so each group stays within `budget` tokens (an oversized item gets its own group)"
+    groups: List[List[int]] = []
+    current: List[int] = []
+    used = 0
+    for i, n in enumerate(token_counts):
+        if current and used + n > budget:
+            groups.append(current)
+            current, used = [], 0
+        current.append(i)
+        used += n
+    if current:
+        groups.append(current)
+    return groups
@@ -0,0 +1,162 @@
+from __future__ import annotations
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from langchain.schema import Document
+from langchain_community.vectorstores import FAISS
+from langchain_core.vectorstores import VectorStoreRetriever
+
+from logger.custom_logger import CustomLogger
+from utils.faiss_store import SegmentedFaissStore
+from utils.hybrid_retriever import HybridRetriever
+from utils.metrics import record_cache
+
+log = CustomLogger().get_logger(__name__)
+
+
+def make_retriever(vectorstore: FAISS, search_type: str, search_kwargs: Dict[str, Any]):
+    "vectorstore retriever, or the BM25 + dense HybridRetriever for search_type='hybrid'"
+    if search_type == "hybrid":
+        return HybridRetriever.from_vectorstore(vectorstore, **search_kwargs)
+    return vectorstore.as_retriever(search_type=search_type, search_kwargs=search_kwargs)
+
+
+def retrieve_by_vector(retriever, query: str, embedding: List[float]) -> List[Document]:
+    "run a retriever from make_retriever with an already computed query embedding"
+    if isinstance(retriever, HybridRetriever):
+        return retriever.search_by_vector(query, embedding)
+    if isinstance(retriever, VectorStoreRetriever) and retriever.search_type in ("similarity", "mmr"):
+        search = (retriever.vectorstore.similarity_search_by_vector if retriever.search_type == "similarity"
+                  else retriever.vectorstore.max_marginal_relevance_search_by_vector)
+        return search(embedding, **retriever.search_kwargs)
+    # score-threshold and foreign retrievers embed the query themselves
+    return retriever.invoke(query)
+
+
+class _CacheEntry:
+    "Loaded vectorstore plus the retrievers built on top of it"
+    def __init__(self, vectorstore: FAISS, store: Optional[SegmentedFaissStore] = None, disk_generation=None):
+        self.vectorstore = vectorstore
+        self.retrievers: Dict[Tuple[str, str], Any] = {}
+        self.store = store
+        self.disk_generation = disk_generation
+
+    def is_current(self) -> bool:
+        "False once the directory on disk has moved past this copy, e.g. after a write by another worker process"
+        return self.store is None or self.store.generation() == self.disk_generation
+
+
+class VectorStoreCache:
+    "Process-wide, size-bounded LRU cache of loaded FAISS vectorstores keyed by index directory"
+    def __init__(self, max_size: int = 16):
+        self.max_size = max(1, max_size)
+        self._entries: "OrderedDict[Tuple[str, str], _CacheEntry]" = OrderedDict()
+        self._lock = threading.RLock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._generations: Dict[Tuple[str, str], int] = {}
+
+    @staticmethod
+    def _key(index_dir, index_name: str = "index") -> Tuple[str, str]:
+        return (str(Path(index_dir).resolve()), index_name)
+
+    def get_vectorstore(self, index_dir, embeddings, index_name: str = "index",
+                        loader: Optional[Callable[[], FAISS]] = None) -> FAISS:
+        "return cached vectorstore or load it from disk on a miss"
+        key = self._key(index_dir, index_name)
+        with self._lock:
+            entry = self._entries.get(key)
+        # invalidate() only reaches this process, so each hit also compares against the directory itself
+        current = entry is not None and entry.is_current()
+        with self._lock:
+            if current and self._entries.get(key) is entry:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                record_cache("vectorstore", hits=1)
+                log.info("vectorstore cache hit", index_dir=key[0], hits=self.hits, misses=self.misses)
+                return entry.vectorstore
+            if entry is not None and self._entries.get(key) is entry:
+                del self._entries[key]
+                log.info("vectorstore cache entry stale", index_dir=key[0])
+            self.misses += 1
+            record_cache("vectorstore", misses=1)
+            generation = self._generations.setdefault(key, 0)
+
+        # load outside the lock so one slow disk read does not block other sessions
+        store, disk_generation = None, None
+        if loader is None:
+            store = SegmentedFaissStore(index_dir, index_name)
+            # read before loading: a write that lands during the load makes the next lookup reload
+            disk_generation = store.generation()
+            vectorstore = store.load(embeddings)
+        else:
+            vectorstore = loader()
+
+        with self._lock:
+            if self._generations.get(key, 0) != generation:
+                # the index changed while we were reading it; serve this copy but do not cache it
+                return vectorstore
+            entry = self._entries.get(key)
+            if entry is None:
+                entry = _CacheEntry(vectorstore, store, disk_generation)
+                self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                evicted, _ = self._entries.popitem(last=False)
+                self.evictions += 1
+                log.info("vectorstore cache eviction", index_dir=evicted[0])
+        log.info("vectorstore cache miss", index_dir=key[0], hits=self.hits, misses=self.misses)
+        return entry.vectorstore
+
+    def get_retriever(self, index_dir, embeddings, index_name: str = "index", search_type: str = "similarity",
+                      search_kwargs: Optional[Dict[str, Any]] = None):
+        "return a cached retriever for the given search settings"
+        search_kwargs = search_kwargs or {}
+        vectorstore = self.get_vectorstore(index_dir, embeddings, index_name)
+        rkey = (search_type, repr(sorted(search_kwargs.items())))
+        key = self._key(index_dir, index_name)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry.vectorstore is not vectorstore:
+                # invalidated while we were loading, hand out an uncached retriever
+                return make_retriever(vectorstore, search_type, search_kwargs)
+            retriever = entry.retrievers.get(rkey)
+            if retriever is None:
+                retriever = make_retriever(vectorstore, search_type, search_kwargs)
+                entry.retrievers[rkey] = retriever
+            return retriever
+
+    def invalidate(self, index_dir, index_name: Optional[str] = None) -> int:
+        "drop cached entries for an index directory (all index names when index_name is None)"
+        path = str(Path(index_dir).resolve())
+        with self._lock:
+            for k in self._generations:
+                if k[0] == path and (index_name is None or k[1] == index_name):
+                    self._generations[k] += 1
+            keys = [k for k in self._entries if k[0] == path and (index_name is None or k[1] == index_name)]
+            for k in keys:
+                del self._entries[k]
+        if keys:
+            log.info("vectorstore cache invalidated", index_dir=path, entries=len(keys))
+        return len(keys)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+
+VECTORSTORE_CACHE = VectorStoreCache(max_size=int(os.getenv("FAISS_CACHE_SIZE", "16")))